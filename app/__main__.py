@@ -1,18 +1,9 @@
 import sys
-from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from loguru import logger
 from telegram import Update
 
 from app.config import settings
-from app.bot.handlers import start_command, help_command, handle_message, stats_command
-from app.stats.service import StatsService
-
-
-async def post_init(application: Application) -> None:
-    """Initialize services after application creation."""
-    stats_service = StatsService()
-    await stats_service.initialize()
-    logger.info("Statistics service initialized")
+from app.bot.application import build_application
 
 
 def main() -> None:
@@ -20,17 +11,24 @@ def main() -> None:
     logger.info("Launching a Telegram bot for exchange rates")
 
     try:
-        application = Application.builder().token(settings.telegram_token).post_init(post_init).build()
-
-        application.add_handler(CommandHandler("start", start_command))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("stats", stats_command))
-
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+        application = build_application()
 
         logger.info("The bot has been successfully launched and is ready to work")
 
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if settings.bot_mode == "webhook":
+            if not settings.webhook_url:
+                raise ValueError("WEBHOOK_URL is required when BOT_MODE is 'webhook'")
+
+            application.run_webhook(
+                listen=settings.webhook_listen,
+                port=settings.webhook_port,
+                url_path=settings.webhook_path,
+                webhook_url=f"{settings.webhook_url.rstrip('/')}/{settings.webhook_path}",
+                secret_token=settings.webhook_secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        else:
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
 
     except Exception as exc:
         logger.exception(f"Critical error while starting the bot: {exc}")
@@ -1,69 +1,640 @@
+import asyncio
+import json
+import os
+import random
+import time
 import httpx
 import xml.etree.ElementTree as ET
-from typing import Dict, Optional, Any
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Any, Sequence, Set, Tuple, Union
 from loguru import logger
 
+from app.api.parser import parse_daily, parse_daily_json
+from app.api.rates import CurrencyRate, RatesTable
+from app.api.sources import JSON, XML, RatesSource
 from app.config import settings
+from app import metrics
+
+# The CBR publishes rates in Moscow time, which has no DST since 2014
+MSK = timezone(timedelta(hours=3), "MSK")
+
+CBR_REQUEST_SECONDS = metrics.histogram(
+    "cbr_request_duration_seconds", "Duration of requests to the CBR API by script", ("script",)
+)
+CBR_PARSE_SECONDS = metrics.histogram(
+    "cbr_parse_duration_seconds", "Duration of parsing a CBR daily rates document by parser", ("parser",)
+)
+CBR_ERRORS = metrics.counter("cbr_errors_total", "Failed CBR API requests and documents by error type", ("type",))
+CBR_RETRIES = metrics.counter("cbr_retries_total", "Repeated requests to a rates source by source", ("source",))
+CBR_HEDGES = metrics.counter(
+    "cbr_hedged_requests_total", "Requests to a rates source sent because the previous one was slow", ("source",)
+)
+
+# Statuses worth another attempt: rate limiting and server errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Outcomes of a request attempt without a usable response
+RETRY = "retry"
+STOP = "stop"
+
+# Bumped whenever the layout of the persisted snapshot changes; files of other formats are ignored
+SNAPSHOT_FORMAT = 1
+
+
+class CacheStats:
+    """Counters describing how the rates snapshot cache is used."""
+
+    __slots__ = ("hits", "misses", "stale", "refreshes", "not_modified", "errors")
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        # Requests answered from an expired snapshot because the refresh failed or took too long
+        self.stale = 0
+        self.refreshes = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """Returns the counters as a dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RatesSnapshot:
+    """Rates parsed from a single CBR document."""
+
+    __slots__ = ("version", "table", "fetched_at", "expires_at", "etag", "last_modified", "source")
+
+    def __init__(
+        self,
+        version: int,
+        table: RatesTable,
+        fetched_at: float,
+        expires_at: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        source: Optional[str] = None,
+    ):
+        self.version = version
+        self.table = table
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+        # Name of the source the document came from; its validators are only meaningful to that source
+        self.source = source
+
+    @property
+    def date(self) -> Optional[str]:
+        """The date the rates are set for, as published by the CBR."""
+        return self.table.date
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        """Checks whether the snapshot can still be served without a refresh."""
+        return (time.time() if now is None else now) < self.expires_at
+
+    def dump(self) -> bytes:
+        """Serializes the snapshot as compact JSON with one array per currency."""
+        return json.dumps(
+            {
+                "format": SNAPSHOT_FORMAT,
+                "date": self.table.date,
+                "fetched_at": self.fetched_at,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "source": self.source,
+                "records": [list(record) for record in self.table],
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode()
+
+    @classmethod
+    def load(cls, data: bytes, version: int, max_ttl: float) -> "RatesSnapshot":
+        """Restores a snapshot saved by `dump`; its expiry is computed anew from the time it was fetched."""
+        document = json.loads(data)
+        if document.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported snapshot format {document.get('format')!r}")
+
+        fetched_at = float(document["fetched_at"])
+        return cls(
+            version=version,
+            table=RatesTable(document["date"], (CurrencyRate(*record) for record in document["records"])),
+            fetched_at=fetched_at,
+            expires_at=snapshot_expiry(fetched_at, max_ttl),
+            etag=document.get("etag"),
+            last_modified=document.get("last_modified"),
+            source=document.get("source"),
+        )
+
+
+def next_publication_time(now: datetime) -> datetime:
+    """Returns the next moment the CBR is expected to publish new rates (business days only)."""
+    now = now.astimezone(MSK)
+    candidate = datetime.combine(now.date(), settings.cbr_publication_time, tzinfo=MSK)
+
+    if candidate <= now:
+        candidate += timedelta(days=1)
+
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+
+    return candidate
+
+
+class Fetched(NamedTuple):
+    """Successful answer of a rates source; without a table the source confirmed the current snapshot."""
+
+    source: RatesSource
+    response: httpx.Response
+    table: Optional[RatesTable]
+
+
+def snapshot_expiry(fetched_at: float, max_ttl: float) -> float:
+    """Computes when a snapshot fetched at the given time has to be refreshed."""
+    publication = next_publication_time(datetime.fromtimestamp(fetched_at, tz=timezone.utc))
+    return min(publication.timestamp(), fetched_at + max_ttl)
 
 
 class CBRClient:
-    """Class for interacting with the Central Bank of Russia (CBR) API."""
+    """Class for interacting with the Central Bank of Russia (CBR) API.
+
+    Expired snapshots are served stale while they are revalidated: a request waits at most `revalidate_wait`
+    seconds for the refresh and is then answered from the previous snapshot, so a slow or unavailable CBR never
+    costs more than that. With a `snapshot_path` every new snapshot is saved to disk and can be loaded at startup.
 
-    def __init__(self, api_url: str = settings.cbr_api_url):
+    The daily rates come from the official script first and from the `mirrors` after it. Failed requests are
+    retried with exponential backoff, a source that does not answer within its p95 latency is hedged with the next
+    one, and a source failing repeatedly is skipped by its circuit breaker for a while.
+    """
+
+    def __init__(
+        self,
+        api_url: str = settings.cbr_api_url,
+        max_ttl: float = settings.cbr_cache_max_ttl,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        snapshot_path: Optional[Path] = None,
+        revalidate_wait: float = settings.cbr_revalidate_wait,
+        mirrors: Sequence[str] = (),
+        retries: int = settings.cbr_retries,
+        retry_backoff: float = settings.cbr_retry_backoff,
+        hedge_delay: float = settings.cbr_hedge_delay,
+    ):
         """Initializes the CBRClient with the API URL."""
-        self.api_url = api_url
+        breaker = {"failure_threshold": settings.cbr_breaker_threshold, "reset_timeout": settings.cbr_breaker_reset}
+        self.official = RatesSource(api_url, name="cbr", **breaker)
+        self.sources = [self.official, *(RatesSource.from_spec(mirror, **breaker) for mirror in mirrors)]
+        # Past rates for /history and /all have a breaker and latencies of their own: multi-year documents must not
+        # inflate the hedge delay of the daily rates, nor their failures pause the daily rates
+        self.archive = RatesSource(settings.cbr_dynamic_url, name="cbr_archive", **breaker)
 
-    async def get_currency_rate(self, currency_code: str) -> Optional[Dict[str, Any]]:
-        """Gets the currency rate from the CBR API."""
-        try:
-            logger.debug(f"Currency exchange rate request: {currency_code}")
-            async with httpx.AsyncClient() as client:
-                response = await client.get(self.api_url, timeout=10.0)
+        self.max_ttl = max_ttl
+        self.snapshot_path = snapshot_path
+        self.revalidate_wait = revalidate_wait
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.hedge_delay = hedge_delay
+        self.cache_stats = CacheStats()
 
-                if response.status_code != 200:
-                    logger.error(f"Request error to CBR: {response.status_code}")
-                    return None
+        self._transport = transport
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._snapshot: Optional[RatesSnapshot] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._version = 0
+        self._listeners: List[Callable[[RatesSnapshot], None]] = []
 
-                return self._parse_currency_data(response.text, currency_code.upper())
+    @property
+    def api_url(self) -> str:
+        """URL of the official daily rates script."""
+        return self.official.url
 
-        except httpx.RequestError as exc:
-            logger.error(f"Network request error to CBR API ({self.api_url}): {type(exc).__name__}: {exc}")
+    @api_url.setter
+    def api_url(self, url: str) -> None:
+        self.official.url = url
+
+    async def start(self) -> None:
+        """Opens the pooled HTTP client used for all requests to the CBR API."""
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=settings.cbr_timeout,
+                limits=httpx.Limits(
+                    max_connections=settings.cbr_max_connections,
+                    max_keepalive_connections=settings.cbr_max_keepalive_connections,
+                    keepalive_expiry=settings.cbr_keepalive_expiry,
+                ),
+            )
+            logger.debug("CBR HTTP client opened")
+
+    async def close(self) -> None:
+        """Closes the pooled HTTP client."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            logger.debug("CBR HTTP client closed")
+
+    async def load_snapshot(self) -> Optional[RatesSnapshot]:
+        """Installs the snapshot saved by a previous run, unless a newer one has been fetched already."""
+        if self.snapshot_path is None or self._snapshot is not None:
+            return self._snapshot
+
+        try:
+            data = await asyncio.to_thread(self.snapshot_path.read_bytes)
+        except FileNotFoundError:
+            logger.info(f"No saved rates snapshot at {self.snapshot_path}")
             return None
-        except httpx.TimeoutException as exc:
-            logger.error(f"Timeout while requesting CBR API: {exc}")
+        except OSError as exc:
+            logger.error(f"Failed to read the saved rates snapshot {self.snapshot_path}: {exc}")
             return None
-        except Exception as exc:
-            logger.exception(f"Unexpected error while retrieving the exchange rate: {exc}")
+
+        try:
+            snapshot = RatesSnapshot.load(data, self._version + 1, self.max_ttl)
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning(f"Ignoring the saved rates snapshot {self.snapshot_path}: {exc}")
             return None
 
-    def _parse_currency_data(self, xml_data: str, currency_code: str) -> Optional[Dict[str, Any]]:
-        """Parses the XML data from the CBR API and extracts currency information."""
+        if self._snapshot is not None:
+            return self._snapshot
+
+        self._version = snapshot.version
+        self._snapshot = snapshot
+        state = "fresh" if snapshot.is_fresh() else "stale"
+        logger.info(f"Rates snapshot for {snapshot.date} loaded from {self.snapshot_path} ({state})")
+        self._notify(snapshot)
+        return snapshot
+
+    async def _save_snapshot(self, snapshot: RatesSnapshot) -> None:
+        """Writes the snapshot to disk atomically, so that a crash never leaves a truncated file behind."""
+        if self.snapshot_path is None:
+            return
+
+        path = self.snapshot_path
+        temporary = path.with_name(path.name + ".tmp")
+
+        def write(data: bytes) -> None:
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+
         try:
-            root = ET.fromstring(xml_data)
+            await asyncio.to_thread(write, snapshot.dump())
+        except OSError as exc:
+            logger.error(f"Failed to save the rates snapshot to {path}: {exc}")
 
-            for valute in root.findall("Valute"):
-                char_code = valute.find("CharCode").text  # type: ignore
+    def add_snapshot_listener(self, listener: Callable[[RatesSnapshot], None]) -> None:
+        """Registers a callback invoked with every new snapshot, right after it is installed."""
+        self._listeners.append(listener)
+
+    def _notify(self, snapshot: RatesSnapshot) -> None:
+        """Passes a new snapshot to the listeners, isolating their failures from the refresh."""
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as exc:
+                logger.exception(f"Snapshot listener {listener!r} failed: {exc}")
 
-                if char_code == currency_code:
-                    name = valute.find("Name").text  # type: ignore
-                    nominal = int(valute.find("Nominal").text)  # type: ignore
-                    value = float(valute.find("Value").text.replace(",", "."))  # type: ignore
+    @property
+    def snapshot(self) -> Optional[RatesSnapshot]:
+        """The last successfully fetched snapshot, if any."""
+        return self._snapshot
 
-                    logger.debug(f" Found a course for {currency_code}: {value} RUB for {nominal} unit.")
+    async def get_currency_rate(self, currency_code: str) -> Optional[Dict[str, Any]]:
+        """Gets the currency rate, answering from the cached snapshot when it is fresh."""
+        currency_code = currency_code.upper()
+        logger.debug("Currency exchange rate request: {code}", code=currency_code)
 
-                    return {
-                        "code": currency_code,
-                        "name": name,
-                        "nominal": nominal,
-                        "value": value,
-                    }
+        snapshot = await self.get_snapshot()
+        if snapshot is None:
+            return None
 
+        record = snapshot.table.get(currency_code)
+        if record is None:
             logger.warning(f"Currency {currency_code} not found in CBR data")
             return None
 
+        return record.as_dict()
+
+    async def get_snapshot(self) -> Optional[RatesSnapshot]:
+        """Returns the current snapshot, refreshing it from the CBR API when it has expired.
+
+        An expired snapshot is returned as is when the refresh fails or does not finish within `revalidate_wait`;
+        the refresh then carries on in the background. Callers can tell by `is_fresh()`.
+        """
+        snapshot = self._snapshot
+
+        if snapshot is not None and snapshot.is_fresh():
+            self.cache_stats.hits += 1
+            return snapshot
+
+        self.cache_stats.misses += 1
+        if snapshot is None:
+            return await self.refresh()
+
+        try:
+            refreshed = await asyncio.wait_for(asyncio.shield(self.start_refresh()), self.revalidate_wait)
+        except asyncio.TimeoutError:
+            refreshed = None
+
+        if refreshed is None:
+            self.cache_stats.stale += 1
+            return self._snapshot
+        return refreshed
+
+    async def refresh(self) -> Optional[RatesSnapshot]:
+        """Fetches a new snapshot; concurrent callers share a single in-flight request."""
+        # Shield the shared task so that a cancelled caller does not abort the fetch for everyone else
+        return await asyncio.shield(self.start_refresh())
+
+    def start_refresh(self) -> asyncio.Task:
+        """Starts a refresh in the background unless one is in flight and returns its task."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._on_refresh_done)
+        return self._refresh_task
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        """Forgets the finished refresh task so that the next miss starts a new one."""
+        if self._refresh_task is task:
+            self._refresh_task = None
+
+    async def _refresh(self) -> Optional[RatesSnapshot]:
+        """Revalidates the current snapshot or downloads and parses a new one."""
+        current = self._snapshot
+        fetched = await self._fetch(current)
+        if fetched is None:
+            self.cache_stats.errors += 1
+            return None
+
+        fetched_at = time.time()
+        source = fetched.source
+
+        if fetched.table is None and current is not None:
+            # The document has not changed: keep the parsed data and only extend its lifetime
+            current.fetched_at = fetched_at
+            current.expires_at = snapshot_expiry(fetched_at, self.max_ttl)
+            self.cache_stats.not_modified += 1
+            logger.debug(f"Rates snapshot v{current.version} revalidated by {source.name}")
+            await self._save_snapshot(current)
+            return current
+
+        table = fetched.table
+        if table is None:
+            self.cache_stats.errors += 1
+            return None
+
+        self._version += 1
+        self._snapshot = RatesSnapshot(
+            version=self._version,
+            table=table,
+            fetched_at=fetched_at,
+            expires_at=snapshot_expiry(fetched_at, self.max_ttl),
+            etag=fetched.response.headers.get("ETag"),
+            last_modified=fetched.response.headers.get("Last-Modified"),
+            source=source.name,
+        )
+        self.cache_stats.refreshes += 1
+
+        snapshot = self._snapshot
+        logger.info(
+            f"Rates snapshot v{self._version} for {table.date} loaded from {source.name}: {len(table)} currencies"
+        )
+        self._notify(snapshot)
+        await self._save_snapshot(snapshot)
+        return snapshot
+
+    async def _fetch(self, current: Optional[RatesSnapshot] = None) -> Optional[Fetched]:
+        """Requests the daily rates from the sources in turn, hedging a slow source with the next one.
+
+        The next source is asked as soon as the previous one fails or has not answered within its hedge delay; the
+        first answer wins and the requests still running are cancelled.
+        """
+        sources = iter(self.sources)
+        pending: Set[asyncio.Task] = set()
+
+        def launch(hedged: bool) -> Optional[float]:
+            """Asks the next source; returns how long to wait for it, or None when no sources are left."""
+            source = next(sources, None)
+            if source is None:
+                return None
+
+            if hedged:
+                logger.info(f"Rates source is slow, asking {source.name} as well")
+                CBR_HEDGES.labels(source.name).inc()
+            pending.add(asyncio.create_task(self._fetch_from(source, current)))
+            return source.hedge_delay(self.hedge_delay)
+
+        timeout = launch(hedged=False)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+
+                for task in done:
+                    fetched = task.result()
+                    if fetched is not None:
+                        return fetched
+
+                timeout = launch(hedged=not done)
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _fetch_from(self, source: RatesSource, current: Optional[RatesSnapshot]) -> Optional[Fetched]:
+        """Requests the daily rates from one source, revalidating the current snapshot if it came from there."""
+        headers = {}
+        if current is not None and current.source == source.name:
+            if current.etag:
+                headers["If-None-Match"] = current.etag
+            if current.last_modified:
+                headers["If-Modified-Since"] = current.last_modified
+
+        response = await self._request(source.url, headers=headers, allowed_statuses=(200, 304), source=source)
+        if response is None:
+            return None
+
+        if response.status_code == 304:
+            return Fetched(source, response, None) if headers else None
+
+        table = self._parse_response(response, source.format)
+        if table is None:
+            self._record_failure(source)
+            return None
+
+        return Fetched(source, response, table)
+
+    async def fetch_daily(self, on: date) -> Optional[RatesTable]:
+        """Downloads the rates set by the CBR on the given date (or the last business day before it)."""
+        response = await self._request(
+            self.api_url, params={"date_req": on.strftime("%d/%m/%Y")}, source=self.archive
+        )
+        return self._parse_response(response) if response is not None else None
+
+    async def fetch_dynamic(self, cbr_id: str, start: date, end: date) -> Optional[bytes]:
+        """Downloads the `XML_dynamic.asp` document with the rates of one currency over a date range."""
+        response = await self._request(
+            settings.cbr_dynamic_url,
+            params={
+                "date_req1": start.strftime("%d/%m/%Y"),
+                "date_req2": end.strftime("%d/%m/%Y"),
+                "VAL_NM_RQ": cbr_id,
+            },
+            source=self.archive,
+        )
+        return response.content if response is not None else None
+
+    async def _request(
+        self,
+        url: str,
+        params: Optional[Dict[str, str]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        allowed_statuses: Tuple[int, ...] = (200,),
+        source: Optional[RatesSource] = None,
+    ) -> Optional[httpx.Response]:
+        """Sends a GET request through the pooled client, retrying network errors and 429/5xx responses.
+
+        The request goes through the circuit breaker of the source, the official one unless given, and its
+        successful durations feed the latency window the hedge delay is derived from.
+        """
+        source = source or self.official
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.0))
+
+            outcome = await self._attempt(source, url, params, headers, allowed_statuses, attempt)
+            if outcome == STOP:
+                return None
+            if isinstance(outcome, httpx.Response):
+                return outcome
+
+        return None
+
+    async def _attempt(
+        self,
+        source: RatesSource,
+        url: str,
+        params: Optional[Dict[str, str]],
+        headers: Optional[Dict[str, str]],
+        allowed_statuses: Tuple[int, ...],
+        attempt: int,
+    ) -> Union[httpx.Response, str]:
+        """Sends the request once; the response, or whether another attempt is worth it (RETRY) or not (STOP)."""
+        if not source.breaker.allow():
+            logger.warning(f"Rates source {source.name} is paused after repeated failures, skipping {url}")
+            CBR_ERRORS.labels("circuit_open").inc()
+            return STOP
+
+        if attempt:
+            CBR_RETRIES.labels(source.name).inc()
+
+        started = time.perf_counter()
+        try:
+            if self._http_client is None:
+                await self.start()
+
+            with CBR_REQUEST_SECONDS.labels(url.rsplit("/", 1)[-1]).time():
+                response = await self._http_client.get(url, params=params, headers=headers)  # type: ignore[union-attr]
+
+        except httpx.TimeoutException as exc:
+            logger.error(f"Timeout while requesting {source.name} ({url}): {exc}")
+            CBR_ERRORS.labels(type(exc).__name__).inc()
+        except httpx.RequestError as exc:
+            logger.error(f"Network request error to {source.name} ({url}): {type(exc).__name__}: {exc}")
+            CBR_ERRORS.labels(type(exc).__name__).inc()
+        except Exception as exc:
+            logger.exception(f"Unexpected error while retrieving the exchange rate: {exc}")
+            CBR_ERRORS.labels(type(exc).__name__).inc()
+            self._record_failure(source)
+            return STOP
+        else:
+            if response.status_code in allowed_statuses:
+                source.breaker.record_success()
+                source.latencies.add(time.perf_counter() - started)
+                return response
+
+            logger.error(f"Request error to {source.name}: {response.status_code}")
+            CBR_ERRORS.labels(f"http_{response.status_code}").inc()
+            if response.status_code not in RETRY_STATUSES:
+                self._record_failure(source)
+                return STOP
+
+        self._record_failure(source)
+        return RETRY
+
+    def _record_failure(self, source: RatesSource) -> None:
+        """Counts a failure of the source and reports when its circuit breaker opens."""
+        if source.breaker.record_failure():
+            logger.warning(
+                f"Rates source {source.name} failed {source.breaker.failures} times in a row, "
+                f"pausing it for {source.breaker.reset_timeout:.0f} s"
+            )
+
+    def _parse_response(self, response: httpx.Response, format: str = XML) -> Optional[RatesTable]:
+        """Parses a daily rates response in the format of its source; XML with the configured parser."""
+        if format == JSON:
+            try:
+                with CBR_PARSE_SECONDS.labels("json").time():
+                    table = parse_daily_json(response.content)
+            except (KeyError, TypeError, ValueError) as exc:
+                logger.error(f"JSON rates processing error: {exc}")
+                table = None
+        elif settings.cbr_parser != "stream":
+            with CBR_PARSE_SECONDS.labels("tree").time():
+                table = self._parse_rates(response.text)
+        else:
+            try:
+                with CBR_PARSE_SECONDS.labels("stream").time():
+                    table = parse_daily(response.content)
+            except ET.ParseError as exc:
+                logger.error(f"XML parsing error: {exc}")
+                table = None
+            except (KeyError, ValueError) as exc:
+                logger.error(f"Currency data processing error: {exc}")
+                table = None
+
+        if table is None:
+            CBR_ERRORS.labels("parse").inc()
+        return table
+
+    def _parse_rates(self, xml_data: str) -> Optional[RatesTable]:
+        """Parses the XML data from the CBR API into a table of all currencies."""
+        try:
+            root = ET.fromstring(xml_data)
+            records = []
+
+            for valute in root.findall("Valute"):
+                records.append(
+                    CurrencyRate(
+                        id=valute.get("ID", ""),
+                        num_code=valute.findtext("NumCode", ""),
+                        char_code=valute.find("CharCode").text,  # type: ignore
+                        nominal=int(valute.find("Nominal").text),  # type: ignore
+                        name=valute.find("Name").text,  # type: ignore
+                        value=float(valute.find("Value").text.replace(",", ".")),  # type: ignore
+                    )
+                )
+
+            return RatesTable(root.get("Date"), records)
+
         except ET.ParseError as exc:
             logger.error(f"XML parsing error: {exc}")
             return None
         except (AttributeError, ValueError) as exc:
             logger.error(f"Currency data processing error: {exc}")
             return None
+
+    def _parse_currency_data(self, xml_data: str, currency_code: str) -> Optional[Dict[str, Any]]:
+        """Parses the XML data from the CBR API and extracts currency information."""
+        table = self._parse_rates(xml_data)
+        if table is None:
+            return None
+
+        record = table.get(currency_code)
+        if record is None:
+            logger.warning(f"Currency {currency_code} not found in CBR data")
+            return None
+
+        logger.debug(f" Found a course for {currency_code}: {record.value} RUB for {record.nominal} unit.")
+        return record.as_dict()
@@ -0,0 +1,115 @@
+"""Compact in-memory representation of the CBR rates."""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# The ruble is the implicit base of every CBR quote
+BASE_CURRENCY = "RUB"
+
+
+class CurrencyRate(NamedTuple):
+    """Official rate of a single currency."""
+
+    id: str
+    num_code: str
+    char_code: str
+    nominal: int
+    name: str
+    value: float
+
+    @property
+    def unit_rate(self) -> float:
+        """Rubles per one unit of the currency."""
+        return self.value / self.nominal
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the rate in the format expected by the text utilities."""
+        return {
+            "code": self.char_code,
+            "name": self.name,
+            "nominal": self.nominal,
+            "value": self.value,
+        }
+
+
+class CrossRateMatrix:
+    """Cross rates between every pair of currencies of a table, the ruble included.
+
+    The matrix is computed once per table, so converting between any two currencies is a single lookup.
+    """
+
+    __slots__ = ("codes", "_positions", "_rows")
+
+    def __init__(self, unit_rates: Dict[str, float]):
+        self.codes: Tuple[str, ...] = tuple(unit_rates)
+        self._positions = {code: position for position, code in enumerate(self.codes)}
+
+        rates = array("d", unit_rates.values())
+        inverse = array("d", (1.0 / rate for rate in rates))
+        self._rows: List[array] = [array("d", (rate * other for other in inverse)) for rate in rates]
+
+    def rate(self, from_code: str, to_code: str) -> Optional[float]:
+        """Units of `to_code` per one unit of `from_code`."""
+        row = self._positions.get(from_code)
+        column = self._positions.get(to_code)
+
+        if row is None or column is None:
+            return None
+
+        return self._rows[row][column]
+
+
+class RatesTable:
+    """Immutable table of rates indexed by CharCode, NumCode and CBR ID."""
+
+    __slots__ = ("date", "records", "matrix", "_index")
+
+    def __init__(self, date: Optional[str], records: Iterable[CurrencyRate]):
+        self.date = date
+        self.records: Tuple[CurrencyRate, ...] = tuple(sorted(records, key=lambda record: record.char_code))
+
+        index: Dict[str, CurrencyRate] = {}
+        for record in self.records:
+            index[record.id] = record
+            index[record.num_code] = record
+            index[record.char_code] = record
+        self._index = index
+
+        unit_rates = {BASE_CURRENCY: 1.0}
+        unit_rates.update((record.char_code, record.unit_rate) for record in self.records)
+        self.matrix = CrossRateMatrix(unit_rates)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[CurrencyRate]:
+        return iter(self.records)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def get(self, key: str) -> Optional[CurrencyRate]:
+        """Looks up a currency by its CharCode, NumCode or CBR ID."""
+        return self._index.get(key)
+
+    @property
+    def codes(self) -> Tuple[str, ...]:
+        """CharCodes of all currencies in alphabetical order."""
+        return tuple(record.char_code for record in self.records)
+
+    def unit_rate(self, code: str) -> Optional[float]:
+        """Rubles per one unit of the currency; the ruble itself is supported."""
+        if code == BASE_CURRENCY:
+            return 1.0
+
+        record = self._index.get(code)
+        return record.unit_rate if record else None
+
+    def cross_rate(self, from_code: str, to_code: str) -> Optional[float]:
+        """Units of `to_code` per one unit of `from_code`."""
+        return self.matrix.rate(from_code, to_code)
+
+    def convert(self, amount: float, from_code: str, to_code: str) -> Optional[float]:
+        """Converts an amount between two currencies through their ruble rates."""
+        rate = self.cross_rate(from_code, to_code)
+        return amount * rate if rate is not None else None
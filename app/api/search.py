@@ -0,0 +1,134 @@
+"""Lookup of currencies by code or Russian name, e.g. "usd", "840", "доллар", "юаня" or "канадский доллар"."""
+
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.api.rates import CurrencyRate, RatesTable
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Match costs, lower is better: an exact code, a prefix of the first word of the name ("доллар" for "Доллар США"),
+# a prefix of a later word or of a code ("крона" for "Датская крона"), a similar word ("долларов", "юаня")
+EXACT = 0.0
+FIRST_WORD = 1.0
+OTHER_WORD = 2.0
+SIMILAR = 3.0
+
+# Share of the trigrams of a word that a name word must contain to be similar
+MIN_SIMILARITY = 0.5
+
+
+def normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def trigrams(word: str) -> List[str]:
+    return [word[start : start + 3] for start in range(len(word) - 2)]
+
+
+class CurrencyIndex:
+    """Prefix and trigram index over the CharCode, NumCode and name of every currency of a rates table.
+
+    Rebuilt once per snapshot, so a lookup is a few dictionary accesses: every prefix of every word maps to the
+    cheapest match of each currency, and words that are not a prefix, such as inflected or misspelled names, fall
+    back to the trigrams of the name words.
+    """
+
+    __slots__ = ("version", "records", "_prefixes", "_trigrams")
+
+    def __init__(self) -> None:
+        self.version: Optional[int] = None
+        self.records: Tuple[CurrencyRate, ...] = ()
+        # Prefix -> {position of the currency: cost}
+        self._prefixes: Dict[str, Dict[int, float]] = {}
+        # Trigram -> [(position of the currency, whether the word is the first of the name)]
+        self._trigrams: Dict[str, List[Tuple[int, bool]]] = {}
+
+    def rebuild(self, version: int, table: RatesTable) -> None:
+        """Index the currencies of a new snapshot, replacing the previous ones."""
+        if version == self.version:
+            return
+
+        records = tuple(table)
+        prefixes: Dict[str, Dict[int, float]] = {}
+        grams: Dict[str, List[Tuple[int, bool]]] = {}
+
+        def add_prefixes(position: int, word: str, cost: float, exact_cost: float) -> None:
+            for end in range(1, len(word) + 1):
+                costs = prefixes.setdefault(word[:end], {})
+                match_cost = exact_cost if end == len(word) else cost
+                costs[position] = min(costs.get(position, match_cost), match_cost)
+
+        for position, record in enumerate(records):
+            add_prefixes(position, normalize(record.char_code), OTHER_WORD, EXACT)
+            add_prefixes(position, record.num_code, OTHER_WORD, EXACT)
+
+            for number, word in enumerate(WORD_PATTERN.findall(normalize(record.name))):
+                cost = FIRST_WORD if number == 0 else OTHER_WORD
+                add_prefixes(position, word, cost, cost)
+                for gram in set(trigrams(word)):
+                    grams.setdefault(gram, []).append((position, number == 0))
+
+        self.records = records
+        self._prefixes = prefixes
+        self._trigrams = grams
+        self.version = version
+
+    def _match_word(self, word: str) -> Dict[int, float]:
+        """Cost of the word for every currency it matches."""
+        costs = self._prefixes.get(word)
+        if costs is not None:
+            return costs
+
+        query = set(trigrams(word))
+        if not query:
+            return {}
+
+        hits: Counter = Counter()
+        for gram in query:
+            hits.update(self._trigrams.get(gram, ()))
+
+        similar: Dict[int, float] = {}
+        for (position, first_word), count in hits.items():
+            share = count / len(query)
+            if share < MIN_SIMILARITY:
+                continue
+
+            # Still below an exact match of the word, with the first word of the name preferred
+            cost = SIMILAR + (1 - share) + (0 if first_word else 0.5)
+            similar[position] = min(similar.get(position, cost), cost)
+        return similar
+
+    def ranked(self, query: str) -> List[Tuple[float, CurrencyRate]]:
+        """Currencies matching every word of the query, cheapest first."""
+        total: Optional[Dict[int, float]] = None
+        for word in WORD_PATTERN.findall(normalize(query)):
+            costs = self._match_word(word)
+            if total is None:
+                total = dict(costs)
+            else:
+                total = {position: cost + costs[position] for position, cost in total.items() if position in costs}
+
+            if not total:
+                return []
+
+        if not total:
+            return []
+
+        matches = total
+        ordered = sorted(matches, key=lambda position: (matches[position], position))
+        return [(matches[position], self.records[position]) for position in ordered]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[CurrencyRate]:
+        """Currencies matching the query, best matches first."""
+        return [record for _, record in self.ranked(query)[:limit]]
+
+    def resolve(self, query: str) -> List[CurrencyRate]:
+        """The best matches of the query: a single currency, or the equally good ones if it is ambiguous."""
+        ranked = self.ranked(query)
+        if not ranked:
+            return []
+
+        best = ranked[0][0]
+        return [record for cost, record in ranked if cost == best]
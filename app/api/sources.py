@@ -0,0 +1,75 @@
+"""Endpoints serving the daily rates: the official CBR script and optional mirrors."""
+
+from collections import deque
+from typing import Deque, Optional
+from urllib.parse import urlsplit
+
+from app.utils.circuit_breaker import CircuitBreaker
+
+# Response formats: the `XML_daily.asp` document and the JSON feed of its mirrors, e.g. `daily_json.js`
+XML = "xml"
+JSON = "json"
+FORMATS = (XML, JSON)
+
+# Fewer latency samples than this are not enough for a percentile
+MIN_LATENCY_SAMPLES = 5
+
+
+class LatencyWindow:
+    """Durations of the latest successful requests to a source."""
+
+    __slots__ = ("samples",)
+
+    def __init__(self, size: int = 100):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """The given percentile of the window, e.g. 0.95, or None without enough samples."""
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class RatesSource:
+    """One endpoint with the daily rates, with its own circuit breaker and latency statistics."""
+
+    def __init__(
+        self,
+        url: str,
+        format: str = XML,
+        name: Optional[str] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown rates format {format!r}, expected one of {', '.join(FORMATS)}")
+
+        self.url = url
+        self.format = format
+        self.name = name or urlsplit(url).netloc or url
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latencies = LatencyWindow()
+
+    @classmethod
+    def from_spec(cls, spec: str, **kwargs) -> "RatesSource":
+        """Creates a source from "json:https://…" or a plain URL of an XML document."""
+        format, _, url = spec.partition(":")
+        if format in FORMATS:
+            return cls(url, format, **kwargs)
+        return cls(spec, XML, **kwargs)
+
+    def hedge_delay(self, default: float) -> float:
+        """How long to wait for this source before asking the next one: its p95 latency, at most `default`."""
+        p95 = self.latencies.percentile(0.95)
+        return default if p95 is None else min(p95, default)
+
+    def __repr__(self) -> str:
+        return f"RatesSource({self.name!r}, {self.format})"
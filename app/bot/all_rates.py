@@ -0,0 +1,186 @@
+"""The /all table of every CBR rate, split into pages rendered once per snapshot."""
+
+import asyncio
+import html
+from datetime import timedelta
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from app.api.cbr import CBRClient, RatesSnapshot
+from app.api.parser import parse_cbr_date
+from app.api.rates import RatesTable
+
+# Sort orders: alphabetically by code, by the ruble value of one unit, by the change since the previous rates
+SORT_CODE = "code"
+SORT_VALUE = "value"
+SORT_CHANGE = "change"
+SORT_LABELS = {SORT_CODE: "По коду", SORT_VALUE: "По курсу", SORT_CHANGE: "По изменению"}
+
+ROWS_PER_PAGE = 15
+
+# Callback data of the page buttons: "all:<sort>:<page>"; buttons that change nothing carry NOOP_CALLBACK
+CALLBACK_PREFIX = "all"
+NOOP_CALLBACK = f"{CALLBACK_PREFIX}:noop"
+
+Page = Tuple[str, InlineKeyboardMarkup]
+
+
+def page_callback(sort: str, page: int) -> str:
+    return f"{CALLBACK_PREFIX}:{sort}:{page}"
+
+
+def parse_page_callback(data: Optional[str]) -> Optional[Tuple[str, int]]:
+    """The sort and page of a page button, None for buttons that change nothing."""
+    parts = (data or "").split(":")
+    if len(parts) != 3 or parts[0] != CALLBACK_PREFIX or parts[1] not in SORT_LABELS or not parts[2].isdigit():
+        return None
+    return parts[1], int(parts[2])
+
+
+def format_change(change: Optional[float]) -> str:
+    if change is None:
+        return "—"
+    return f"{change:+.2%}".replace("-", "−")
+
+
+class AllRatesPages:
+    """Every page of the table in every sort order, with its keyboard, for one snapshot.
+
+    The sort orders are computed once as indexes into the records and every row is formatted once, so a page turn
+    is a dictionary lookup. The daily change compares the unit rates with those of the previous CBR publication;
+    without them the change column is empty and that order falls back to the codes.
+    """
+
+    __slots__ = ("version", "_pages")
+
+    def __init__(self, version: int, table: RatesTable, previous: Optional[RatesTable] = None):
+        self.version = version
+
+        records = table.records
+        changes: List[Optional[float]] = []
+        for record in records:
+            before = previous.unit_rate(record.char_code) if previous is not None else None
+            changes.append(record.unit_rate / before - 1 if before else None)
+
+        rows = [
+            f"{record.char_code}  {record.unit_rate:>12.4f}  {format_change(change):>7}"
+            for record, change in zip(records, changes, strict=True)
+        ]
+
+        positions = range(len(records))
+        orders = {
+            SORT_CODE: list(positions),
+            SORT_VALUE: sorted(positions, key=lambda position: -records[position].unit_rate),
+            SORT_CHANGE: sorted(
+                positions,
+                key=lambda position: (changes[position] is None, -(changes[position] or 0.0)),
+            ),
+        }
+
+        title = f"<b>Курсы ЦБ РФ на {html.escape(table.date or '')}</b>, RUB за 1 единицу"
+        page_count = max(1, -(-len(records) // ROWS_PER_PAGE))
+
+        self._pages: Dict[Tuple[str, int], Page] = {}
+        for sort, order in orders.items():
+            for page in range(page_count):
+                chunk = order[page * ROWS_PER_PAGE : (page + 1) * ROWS_PER_PAGE]
+                body = html.escape("\n".join(rows[position] for position in chunk))
+                text = f"{title}\n{SORT_LABELS[sort].lower()}, стр. {page + 1}/{page_count}\n\n<pre>{body}</pre>"
+                self._pages[(sort, page)] = (text, self._keyboard(sort, page, page_count))
+
+    @staticmethod
+    def _keyboard(sort: str, page: int, page_count: int) -> InlineKeyboardMarkup:
+        navigation = [
+            InlineKeyboardButton("◀️", callback_data=page_callback(sort, page - 1) if page > 0 else NOOP_CALLBACK),
+            InlineKeyboardButton(f"{page + 1}/{page_count}", callback_data=NOOP_CALLBACK),
+            InlineKeyboardButton(
+                "▶️", callback_data=page_callback(sort, page + 1) if page + 1 < page_count else NOOP_CALLBACK
+            ),
+        ]
+        sorts = [
+            InlineKeyboardButton(
+                f"• {label}" if option == sort else label,
+                callback_data=NOOP_CALLBACK if option == sort else page_callback(option, 0),
+            )
+            for option, label in SORT_LABELS.items()
+        ]
+        return InlineKeyboardMarkup([navigation, sorts])
+
+    def page(self, sort: str = SORT_CODE, page: int = 0) -> Page:
+        """The text and keyboard of a page; pages past the end show the last one."""
+        if (sort, page) in self._pages:
+            return self._pages[(sort, page)]
+
+        last = max(number for option, number in self._pages if option == sort)
+        return self._pages[(sort, min(page, last))]
+
+
+class AllRatesCache:
+    """The pages of the current snapshot, rebuilt when a new snapshot arrives.
+
+    The previous rates for the daily change are downloaded once per publication date; concurrent callers share a
+    single in-flight download, the same way the client shares its snapshot refresh, and a failed one is retried on
+    the next call.
+    """
+
+    def __init__(self, cbr_client: CBRClient):
+        self.cbr_client = cbr_client
+        self._pages: Optional[AllRatesPages] = None
+        # Publication date -> download of the rates preceding it
+        self._previous: Dict[str, asyncio.Task] = {}
+
+    async def _fetch_previous(self, date: str) -> Optional[RatesTable]:
+        """Downloads the rates of the CBR publication before the given date."""
+        try:
+            day = parse_cbr_date(date)
+        except ValueError:
+            return None
+
+        # The CBR answers with the last rates set before the requested date
+        previous = await self.cbr_client.fetch_daily(day - timedelta(days=1))
+        if previous is None or previous.date == date:
+            logger.warning(f"Failed to get the rates preceding {date}, /all is shown without changes")
+            return None
+        return previous
+
+    def _on_previous_done(self, date: str, task: asyncio.Task) -> None:
+        """Forgets a failed download so that the next call starts a new one."""
+        if task.cancelled() or task.exception() is not None or task.result() is None:
+            if self._previous.get(date) is task:
+                del self._previous[date]
+
+    async def _previous_table(self, table: RatesTable) -> Optional[RatesTable]:
+        """The rates of the CBR publication before the table's one."""
+        if table.date is None:
+            return None
+
+        task = self._previous.get(table.date)
+        if task is None:
+            task = asyncio.create_task(self._fetch_previous(table.date))
+            task.add_done_callback(partial(self._on_previous_done, table.date))
+            self._previous = {table.date: task}
+        # Shield the shared task so that a cancelled caller does not abort the download for everyone else
+        return await asyncio.shield(task)
+
+    async def get(self, snapshot: RatesSnapshot) -> AllRatesPages:
+        """The pages of the snapshot, built on first use."""
+        pages = self._pages
+        if pages is not None and pages.version == snapshot.version:
+            return pages
+
+        previous = await self._previous_table(snapshot.table)
+
+        # Another caller may have built the pages while the previous rates were loading
+        pages = self._pages
+        if pages is not None and pages.version == snapshot.version:
+            return pages
+
+        pages = AllRatesPages(snapshot.version, snapshot.table, previous)
+        # A slow caller of an older snapshot must not replace the pages of a newer one
+        if self._pages is None or self._pages.version < snapshot.version:
+            self._pages = pages
+            logger.debug(f"Rendered the /all pages of rates snapshot v{snapshot.version}")
+        return pages
@@ -0,0 +1,145 @@
+"""Assembly of the Telegram application with its handlers and services."""
+
+from typing import Optional
+from telegram import Update
+from telegram.ext import (
+    Application,
+    CallbackQueryHandler,
+    CommandHandler,
+    InlineQueryHandler,
+    MessageHandler,
+    TypeHandler,
+    filters,
+)
+from telegram.request import BaseRequest
+from loguru import logger
+
+from app import metrics
+from app.config import settings
+from app.bot.concurrency import PerUserUpdateProcessor
+from app.bot.all_rates import CALLBACK_PREFIX
+from app.bot.persistence import SQLitePersistence
+from app.notifications.broadcaster import Broadcaster
+from app.bot.handlers import (
+    start_command,
+    help_command,
+    handle_message,
+    inline_query,
+    all_command,
+    all_rates_page,
+    history_command,
+    stats_command,
+    subscribe_command,
+    alert_command,
+    unsubscribe_command,
+    error_handler,
+    cbr_client,
+    history_service,
+    stats_service,
+    subscription_service,
+    alert_service,
+    throttle,
+)
+
+metrics_server = metrics.MetricsServer(metrics.registry, settings.metrics_host, settings.metrics_port)
+
+
+async def post_init(application: Application) -> None:
+    """Initialize services after application creation."""
+    await stats_service.initialize()
+    logger.info("Statistics service initialized")
+
+    await cbr_client.start()
+    # Answer from the saved snapshot right away and revalidate it while the first requests come in
+    snapshot = await cbr_client.load_snapshot()
+    if snapshot is None or not snapshot.is_fresh():
+        cbr_client.start_refresh()
+    logger.info("CBR client started")
+
+    await history_service.initialize()
+    logger.info("History service initialized")
+
+    # One broadcaster, so that the pushes and the alerts share the global limit of the bot
+    broadcaster = Broadcaster(application.bot)
+
+    await subscription_service.initialize()
+    subscription_service.start(broadcaster)
+    application.job_queue.run_repeating(
+        subscription_service.broadcast_job,
+        interval=settings.subscriptions_check_interval,
+        first=settings.subscriptions_check_interval,
+        name="broadcast",
+    )
+    logger.info("Subscription service initialized")
+
+    await alert_service.initialize()
+    alert_service.start(broadcaster)
+    logger.info("Alert service initialized")
+
+    if isinstance(application.persistence, SQLitePersistence):
+        application.job_queue.run_repeating(
+            application.persistence.evict_job,
+            interval=application.persistence.idle_timeout / 4,
+            name="persistence_eviction",
+        )
+
+    if settings.metrics_enabled:
+        await metrics_server.start()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Release resources when the application stops."""
+    await metrics_server.close()
+
+    await cbr_client.close()
+    logger.info("CBR client closed")
+
+    await history_service.close()
+    await subscription_service.close()
+    await alert_service.close()
+    await stats_service.close()
+
+
+def build_application(
+    request: Optional[BaseRequest] = None, throttling: bool = settings.throttle_enabled
+) -> Application:
+    """Builds the application with all handlers registered.
+
+    A custom request backend replaces the connection to the Bot API, e.g. with a fake server in benchmarks.
+    """
+    builder = (
+        Application.builder()
+        .token(settings.telegram_token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .concurrent_updates(PerUserUpdateProcessor(settings.update_concurrency))
+    )
+
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+
+    if settings.persistence_enabled:
+        builder = builder.persistence(SQLitePersistence())
+
+    application = builder.build()
+
+    if throttling:
+        # Runs before the handlers of group 0 and stops the updates over the limits there
+        application.add_handler(TypeHandler(Update, throttle.handle), group=-1)
+
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("history", history_command))
+    application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    application.add_handler(CommandHandler("alert", alert_command))
+    application.add_handler(CommandHandler("all", all_command))
+    application.add_handler(CallbackQueryHandler(all_rates_page, pattern=f"^{CALLBACK_PREFIX}:"))
+
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    application.add_handler(InlineQueryHandler(inline_query))
+
+    application.add_error_handler(error_handler)
+
+    return application
@@ -0,0 +1,89 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional, Tuple
+from loguru import logger
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# An update and the coroutine handling it
+PendingUpdate = Tuple[object, Awaitable[Any]]
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently while keeping the updates of each user in arrival order.
+
+    Conversation state such as the custom currency code prompt lives in `user_data`, so two messages of the same
+    user must never be handled at the same time. Updates without a user are processed without ordering.
+
+    Every update holds one of the `max_concurrent_updates` slots while this processor runs it. The first update of
+    a user handles that user's later updates as well, one after another, and those updates are only queued, so they
+    give their slot back at once. A burst from one user therefore takes a single slot instead of all of them.
+    """
+
+    __slots__ = ("_queues",)
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # User ID -> updates waiting for the one being processed
+        self._queues: Dict[int, Deque[PendingUpdate]] = {}
+
+    @property
+    def active_users(self) -> int:
+        """Number of users with updates being processed or waiting."""
+        return len(self._queues)
+
+    @staticmethod
+    def _user_id(update: object) -> Optional[int]:
+        """The user whose updates must stay ordered, falling back to the chat."""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Runs the update after the previous updates of the same user, or queues it behind the one running."""
+        user_id = self._user_id(update)
+        if user_id is None:
+            await self._run(update, coroutine)
+            return
+
+        queue = self._queues.get(user_id)
+        if queue is not None:
+            queue.append((update, coroutine))
+            return
+
+        queue = self._queues[user_id] = deque()
+        try:
+            await self._run(update, coroutine)
+            while queue:
+                try:
+                    await self._run(*queue.popleft())
+                except Exception:
+                    # The updates behind it still have to be processed
+                    logger.exception(f"Failed to process a queued update of user {user_id}")
+        finally:
+            # Drop the queue with the last update of the user so that the mapping only holds active users
+            del self._queues[user_id]
+            # Only left when the processing is cancelled, e.g. on shutdown
+            for _, waiting in queue:
+                if asyncio.iscoroutine(waiting):
+                    waiting.close()
+
+    @staticmethod
+    async def _run(update: object, coroutine: Awaitable[Any]) -> None:
+        """Awaits the coroutine of the update; everything logged meanwhile carries the update ID as `request_id`."""
+        if not isinstance(update, Update):
+            await coroutine
+            return
+
+        with logger.contextualize(request_id=update.update_id):
+            await coroutine
+
+    async def initialize(self) -> None:
+        """Nothing to allocate."""
+
+    async def shutdown(self) -> None:
+        """Nothing to release."""
@@ -1,19 +1,114 @@
-from telegram import Update
+import asyncio
+from datetime import date
+from typing import Optional, Tuple
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Message, ReplyKeyboardMarkup, Update
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes
 from loguru import logger
 
-from app.api.cbr import CBRClient
-from app.bot.keyboards import create_currencies_keyboard
-from app.utils.text_utils import format_currency_message
+from app import metrics
+from app.api.cbr import CBRClient, CacheStats, RatesSnapshot
+from app.api.search import CurrencyIndex
+from app.bot.all_rates import AllRatesCache, parse_page_callback
+from app.bot.keyboards import create_currencies_keyboard, personal_currencies
+from app.bot.throttling import Throttle, ThrottleStats
+from app.utils.text_utils import (
+    ReplyCache,
+    format_alert_list,
+    format_conversion_message,
+    format_currency_message,
+    format_history_message,
+    format_rate_on_date_message,
+    format_stale_notice,
+    parse_alert,
+    parse_conversion_query,
+    parse_date,
+    parse_period,
+)
 from app.config import settings
+from app.history.service import HistoryService, history_period
+from app.notifications import AlertService, SubscriptionService
+from app.notifications.broadcaster import TELEGRAM_SEND_FAILURES
+from app.notifications.models import ABOVE, BELOW
 from app.stats.service import StatsService
 
-cbr_client = CBRClient()
+cbr_client = CBRClient(snapshot_path=settings.cbr_snapshot_path, mirrors=settings.cbr_mirrors)
 stats_service = StatsService()
+history_service = HistoryService(cbr_client)
+reply_cache = ReplyCache()
+currency_index = CurrencyIndex()
+throttle = Throttle()
+all_rates = AllRatesCache(cbr_client)
+subscription_service = SubscriptionService(cbr_client)
+alert_service = AlertService(cbr_client)
+
+cbr_client.add_snapshot_listener(lambda snapshot: reply_cache.render(snapshot.version, snapshot.table))
+cbr_client.add_snapshot_listener(lambda snapshot: currency_index.rebuild(snapshot.version, snapshot.table))
+
+HANDLER_SECONDS = metrics.histogram("handler_duration_seconds", "Duration of update handlers", ("handler",))
+HANDLER_ERRORS = metrics.counter("handler_errors_total", "Exceptions raised by update handlers, by type", ("type",))
+
+# Read at scrape time, so the hot paths keep their plain integer counters
+metrics.gauge(
+    "stats_pending_writes",
+    "User activity entries buffered in memory and not yet written",
+    function=lambda: stats_service.pending_writes,
+)
+metrics.gauge(
+    "cbr_open_circuits",
+    "Rates sources skipped by their circuit breaker after repeated failures",
+    function=lambda: sum(not source.breaker.closed for source in cbr_client.sources),
+)
+
+
+def _register_event_counters() -> None:
+    """Counters read from the cache and throttle statistics, one per event."""
+    for event in CacheStats.__slots__:
+        metrics.counter(
+            f"cbr_cache_{event}_total",
+            f"Rates snapshot cache {event.replace('_', ' ')}",
+            function=lambda event=event: getattr(cbr_client.cache_stats, event),
+        )
+    for event in ThrottleStats.__slots__:
+        metrics.counter(
+            f"throttle_{event}_total",
+            f"Updates {event.replace('_', ' ')} by the flood protection",
+            function=lambda event=event: getattr(throttle.stats, event),
+        )
+
+
+_register_event_counters()
+
+HISTORY_USAGE = (
+    "Использование: /history USD [период]\n\n"
+    "Период: 30d, 2w, 6m, 1y (или 30д, 2н, 6м, 1г), диапазон дат 01.01.2024 31.01.2024 "
+    "или одна дата 15.03.2024. По умолчанию — 30 дней."
+)
+
+SUBSCRIBE_USAGE = (
+    "Использование: /subscribe USD EUR\n\n"
+    "Курсы выбранных валют будут приходить каждый раз, когда ЦБ РФ публикует новые. "
+    "Отписаться — /unsubscribe."
+)
+
+ALERT_USAGE = (
+    "Использование: /alert USD > 100 или /alert EUR < 95\n\n"
+    "Оповещение придет один раз, когда курс ЦБ РФ пересечет порог. "
+    "Список оповещений — /alert, удалить — /alert del 12."
+)
 
 WAITING_FOR_CUSTOM_CODE = "waiting_for_custom_code"
+# Currencies of the keyboard the user has been sent last
+KEYBOARD_CODES = "keyboard_codes"
+
+# Shorter messages match too many currency names to be meant as one
+MIN_NAME_QUERY_LENGTH = 3
+
+# Telegram shows at most 50 results of an inline query
+INLINE_RESULTS_LIMIT = 20
 
 
+@metrics.timed(HANDLER_SECONDS)
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /start command."""
     user = update.effective_user
@@ -24,7 +119,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = user.id
     username = user.username or user.first_name
 
-    logger.info(f"Пользователь {username} (ID: {user_id}) запустил бота")
+    logger.info("Пользователь {username} (ID: {user_id}) запустил бота", username=username, user_id=user_id)
 
     # Record user activity
     await stats_service.record_user_activity(
@@ -33,7 +128,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         first_name=user.first_name,
     )
 
-    keyboard = create_currencies_keyboard(settings.base_currencies)
+    codes = personal_currencies(await stats_service.get_currency_usage(user_id), settings.base_currencies)
+    context.user_data[KEYBOARD_CODES] = list(codes)
+    keyboard = create_currencies_keyboard(codes)
 
     if not update.message:
         logger.error("Failed to retrieve message information from update")
@@ -47,6 +144,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     )
 
 
+@metrics.timed(HANDLER_SECONDS)
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /help command."""
 
@@ -57,11 +155,19 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.message.reply_text(
         "🔹 Выберите валюту из кнопок для получения курса.\n"
         "🔹 Нажмите 'Ввести свой код' для проверки любой валюты по коду.\n"
+        "🔹 Или просто напишите название валюты: доллар, юань, тенге.\n"
+        "🔹 В любом чате наберите @имя_бота и название валюты, чтобы отправить ее курс.\n"
+        "🔹 Для пересчета напишите сумму и валюты, например: 100 USD в EUR или 5000 KZT.\n"
+        "🔹 Используйте /all, чтобы посмотреть курсы всех валют.\n"
+        "🔹 Используйте /history USD 30d для истории курса за период.\n"
+        "🔹 Используйте /subscribe USD EUR, чтобы получать новые курсы автоматически.\n"
+        "🔹 Используйте /alert USD > 100, чтобы узнать, когда курс пересечет порог.\n"
         "🔹 Используйте команду /start для перезапуска бота.\n"
         "🔹 Данные предоставлены Центральным Банком России."
     )
 
 
+@metrics.timed(HANDLER_SECONDS)
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles incoming messages from users."""
     user = update.effective_user
@@ -76,7 +182,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     message_text = update.message.text.strip()
 
-    logger.debug(f"Получено сообщение от {user_id}: {message_text}")
+    logger.debug("Получено сообщение от {user_id}: {text}", user_id=user_id, text=message_text)
 
     # Record user activity
     await stats_service.record_user_activity(
@@ -94,16 +200,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     if message_text.upper() == "ВВЕСТИ СВОЙ КОД":
         context.user_data[WAITING_FOR_CUSTOM_CODE] = True
-        logger.info(f"User {user_id} requested currency code input")
+        logger.info("User {user_id} requested currency code input", user_id=user_id)
 
         await update.message.reply_text("Введите международный код валюты (например, USD, EUR, GBP):")
         return
 
     currency_code = message_text.upper()
-    if currency_code in settings.base_currencies:
+    if currency_code in context.user_data.get(KEYBOARD_CODES, settings.base_currencies):
         await get_currency_rate(update, context, currency_code)
-    else:
-        await update.message.reply_text("Пожалуйста, выберите валюту из кнопок или нажмите 'Ввести свой код'.")
+        return
+
+    conversion = parse_conversion_query(message_text)
+    if conversion:
+        await convert_currency(update, context, *conversion)
+        return
+
+    if len(message_text) >= MIN_NAME_QUERY_LENGTH and await resolve_currency_name(update, context, message_text):
+        return
+
+    await update.message.reply_text("Пожалуйста, выберите валюту из кнопок или нажмите 'Ввести свой код'.")
 
 
 async def handle_custom_currency(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str) -> None:
@@ -116,11 +231,13 @@ async def handle_custom_currency(update: Update, context: ContextTypes.DEFAULT_T
     currency_code = message_text.strip().upper()
 
     # Сбрасываем состояние ожидания
-    context.user_data[WAITING_FOR_CUSTOM_CODE] = False
+    context.user_data.pop(WAITING_FOR_CUSTOM_CODE, None)
 
     # Проверяем формат кода валюты
     if not (len(currency_code) == 3 and currency_code.isalpha()):
-        logger.warning(f"Пользователь {user_id} ввел некорректный код валюты: {currency_code}")
+        logger.warning(
+            "Пользователь {user_id} ввел некорректный код валюты: {code}", user_id=user_id, code=currency_code
+        )
 
         if not update.message:
             logger.error("Failed to retrieve message information from update")
@@ -135,35 +252,426 @@ async def handle_custom_currency(update: Update, context: ContextTypes.DEFAULT_T
     await get_currency_rate(update, context, currency_code)
 
 
+async def resolve_currency_name(update: Update, context: ContextTypes.DEFAULT_TYPE, message_text: str) -> bool:
+    """Answers a message naming a currency, e.g. "доллар", "юань" or "aed"; False if it names none."""
+    snapshot = await cbr_client.get_snapshot()
+    if snapshot is None or not update.message:
+        return False
+
+    currency_index.rebuild(snapshot.version, snapshot.table)
+    matches = currency_index.resolve(message_text)
+
+    if not matches:
+        return False
+
+    if len(matches) == 1:
+        await get_currency_rate(update, context, matches[0].char_code)
+        return True
+
+    choices = "\n".join(f"{record.char_code} — {record.name}" for record in matches[:INLINE_RESULTS_LIMIT])
+    await update.message.reply_text(f"Уточните валюту, отправив ее код:\n\n{choices}")
+    return True
+
+
+async def get_snapshot_with_progress(message: Message) -> Tuple[Optional[RatesSnapshot], Optional[Message]]:
+    """Waits for the rates snapshot, showing a progress message only when the CBR is being asked for it.
+
+    A warm snapshot is answered with a single send; after `PROGRESS_MESSAGE_DELAY` seconds of waiting the user gets
+    a progress message, which is returned so that the answer can replace it in place.
+    """
+    snapshot = cbr_client.snapshot
+    if snapshot is not None and snapshot.is_fresh():
+        return await cbr_client.get_snapshot(), None
+
+    fetch = asyncio.ensure_future(cbr_client.get_snapshot())
+    try:
+        return await asyncio.wait_for(asyncio.shield(fetch), settings.progress_message_delay), None
+    except asyncio.TimeoutError:
+        pass
+
+    progress = await message.reply_text("⏳ Получаю данные...")
+    return await fetch, progress
+
+
+async def send_reply(
+    message: Message, progress: Optional[Message], text: str, keyboard: Optional[ReplyKeyboardMarkup] = None
+) -> None:
+    """Sends the answer, editing the progress message into it if one was shown."""
+    if progress is not None:
+        await progress.edit_text(text)
+    else:
+        await message.reply_text(text, reply_markup=keyboard)
+
+
+async def updated_keyboard(
+    user_id: int, context: ContextTypes.DEFAULT_TYPE, currency_code: str
+) -> Optional[ReplyKeyboardMarkup]:
+    """The user's new keyboard if the currency has just earned a button on it."""
+    current = context.user_data.get(KEYBOARD_CODES, settings.base_currencies)
+    if currency_code in current:
+        # Reordering the existing buttons waits for the next /start
+        return None
+
+    codes = personal_currencies(await stats_service.get_currency_usage(user_id), settings.base_currencies)
+    if list(codes) == list(current):
+        return None
+
+    context.user_data[KEYBOARD_CODES] = list(codes)
+    return create_currencies_keyboard(codes)
+
+
 async def get_currency_rate(update: Update, context: ContextTypes.DEFAULT_TYPE, currency_code: str) -> None:
     """Gets the currency rate from the CBR API and sends it to the user."""
     user_id = update.effective_user.id
-    logger.info(f"Пользователь {user_id} запросил курс валюты: {currency_code}")
+    logger.info("Пользователь {user_id} запросил курс валюты: {code}", user_id=user_id, code=currency_code)
 
     if not update.message:
         logger.error("Failed to retrieve message information from update")
         return
 
-    await update.message.reply_text("⏳ Получаю данные...")
+    # Получаем готовый ответ для текущего снимка курсов
+    snapshot, progress = await get_snapshot_with_progress(update.message)
+    message = None
+
+    if snapshot:
+        # The listener renders replies as soon as a snapshot arrives; this only covers snapshots installed before it
+        reply_cache.render(snapshot.version, snapshot.table)
+        message = reply_cache.get(snapshot.version, currency_code)
 
-    # Получаем данные о курсе валюты
-    currency_data = await cbr_client.get_currency_rate(currency_code)
+    if snapshot and message:
+        logger.debug(
+            "Successfully sent the amount in {code} to the user {user_id}", code=currency_code, user_id=user_id
+        )
 
-    if currency_data:
-        # Форматируем и отправляем сообщение с курсом
-        message = format_currency_message(currency_data)
-        logger.info(f"Successfully sent the amount in {currency_code} to the user {user_id}")
+        if not snapshot.is_fresh():
+            message += format_stale_notice(snapshot.date)
 
-        await update.message.reply_text(message)
+        stats_service.record_currency_use(user_id, currency_code)
+        # A reply keyboard can only come with a new message, not with an edited one
+        keyboard = await updated_keyboard(user_id, context, currency_code) if progress is None else None
+        await send_reply(update.message, progress, message, keyboard)
     else:
-        logger.warning(f"Failed to find the exchange rate {currency_code} for user {user_id}")
+        logger.warning(
+            "Failed to find the exchange rate {code} for user {user_id}", code=currency_code, user_id=user_id
+        )
 
-        await update.message.reply_text(
+        await send_reply(
+            update.message,
+            progress,
             f"❌ Не удалось получить курс валюты {currency_code}.\n"
+            f"Проверьте правильность кода валюты или попробуйте позже.",
+        )
+
+
+async def convert_currency(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, amount: float, source: str, target: str
+) -> None:
+    """Converts an amount between two currencies using the cross rates of the current snapshot."""
+    user_id = update.effective_user.id
+    logger.info(
+        "Пользователь {user_id} запросил пересчет {amount} {source} в {target}",
+        user_id=user_id,
+        amount=amount,
+        source=source,
+        target=target,
+    )
+
+    if not update.message:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    snapshot, progress = await get_snapshot_with_progress(update.message)
+    rate = snapshot.table.cross_rate(source, target) if snapshot else None
+
+    if snapshot is None or rate is None:
+        logger.warning(
+            "Failed to convert {source} to {target} for user {user_id}", source=source, target=target, user_id=user_id
+        )
+
+        await send_reply(
+            update.message,
+            progress,
+            f"❌ Не удалось пересчитать {source} в {target}.\n"
+            f"Проверьте правильность кодов валют или попробуйте позже.",
+        )
+        return
+
+    message = format_conversion_message(amount, source, target, amount * rate, rate, snapshot.date)
+    if not snapshot.is_fresh():
+        message += format_stale_notice(snapshot.date)
+    await send_reply(update.message, progress, message)
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers inline queries such as "@bot тенге" with the matching rates, ready to be sent to any chat."""
+    query = update.inline_query
+    if not query:
+        logger.error("Failed to retrieve inline query from update")
+        return
+
+    snapshot = await cbr_client.get_snapshot()
+    if snapshot is None:
+        await query.answer([], cache_time=0)
+        return
+
+    reply_cache.render(snapshot.version, snapshot.table)
+    currency_index.rebuild(snapshot.version, snapshot.table)
+
+    text = query.query.strip()
+    if text:
+        records = currency_index.search(text, INLINE_RESULTS_LIMIT)
+    else:
+        records = [record for code in settings.base_currencies if (record := snapshot.table.get(code))]
+
+    logger.debug("Inline query {text!r}: {count} results", text=text, count=len(records))
+
+    stale_notice = "" if snapshot.is_fresh() else format_stale_notice(snapshot.date)
+    results = [
+        InlineQueryResultArticle(
+            id=f"{snapshot.version}:{record.char_code}",
+            title=f"{record.char_code} — {record.name}",
+            description=f"{record.unit_rate:.4f} RUB за 1 {record.char_code}",
+            input_message_content=InputTextMessageContent(
+                # The cache only holds the latest snapshot, a newer one may have replaced it meanwhile
+                (reply_cache.get(snapshot.version, record.char_code) or format_currency_message(record.as_dict()))
+                + stale_notice
+            ),
+        )
+        for record in records
+    ]
+
+    # Stale answers are not cached, so the fresh rates show up as soon as they arrive
+    await query.answer(results, cache_time=settings.inline_cache_time if not stale_notice else 0)
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def all_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the /all command - shows the first page of the table with every rate."""
+    if not update.message:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    snapshot, progress = await get_snapshot_with_progress(update.message)
+    if snapshot is None:
+        await send_reply(update.message, progress, "❌ Не удалось получить курсы ЦБ РФ. Попробуйте позже.")
+        return
+
+    text, keyboard = (await all_rates.get(snapshot)).page()
+    if not snapshot.is_fresh():
+        text += format_stale_notice(snapshot.date)
+
+    if progress is not None:
+        await progress.edit_text(text, parse_mode="HTML", reply_markup=keyboard)
+    else:
+        await update.message.reply_text(text, parse_mode="HTML", reply_markup=keyboard)
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def all_rates_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Turns the pages of the /all table by editing the message with a page rendered for the snapshot."""
+    query = update.callback_query
+    if not query:
+        logger.error("Failed to retrieve callback query from update")
+        return
+
+    requested = parse_page_callback(query.data)
+    snapshot = await cbr_client.get_snapshot() if requested else None
+
+    if requested is None or snapshot is None:
+        await query.answer()
+        return
+
+    text, keyboard = (await all_rates.get(snapshot)).page(*requested)
+    if not snapshot.is_fresh():
+        text += format_stale_notice(snapshot.date)
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text, parse_mode="HTML", reply_markup=keyboard)
+    except BadRequest as exc:
+        # A repeated tap on the same button asks for the page already shown
+        if "not modified" not in str(exc).lower():
+            raise
+
+
+async def reply_rate_on_date(message: Message, currency_code: str, day: date) -> None:
+    """Answers /history with the rate of a currency on a single date."""
+    if day > date.today():
+        await message.reply_text("❌ Дата не может быть в будущем.")
+        return
+
+    rate = await history_service.get_rate_on(currency_code, day)
+    if rate is None:
+        await message.reply_text(f"❌ Не удалось получить курс {currency_code} на {day:%d.%m.%Y}.")
+        return
+
+    await message.reply_text(format_rate_on_date_message(currency_code, day, *rate))
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the /history command - shows the rates of a currency over a period or on a date."""
+    if not update.message:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    user_id = update.effective_user.id
+    args = context.args or []
+
+    if not args or not (len(args[0]) == 3 and args[0].isalpha()) or len(args) > 3:
+        await update.message.reply_text(HISTORY_USAGE)
+        return
+
+    currency_code = args[0].upper()
+    today = date.today()
+    logger.info(
+        "Пользователь {user_id} запросил историю курса {code}: {period}",
+        user_id=user_id,
+        code=currency_code,
+        period=" ".join(args[1:]),
+    )
+
+    if len(args) == 2 and (day := parse_date(args[1])):
+        await reply_rate_on_date(update.message, currency_code, day)
+        return
+
+    if len(args) == 3:
+        start, end = parse_date(args[1]), parse_date(args[2])
+        if not start or not end or start > end:
+            await update.message.reply_text(HISTORY_USAGE)
+            return
+        end = min(end, today)
+    else:
+        days = parse_period(args[1]) if len(args) == 2 else 30
+        if days is None:
+            await update.message.reply_text(HISTORY_USAGE)
+            return
+        # One day over the limit is enough to be rejected below, and keeps huge periods from overflowing the dates
+        start, end = history_period(min(days, settings.history_max_days + 1), today)
+
+    if (end - start).days >= settings.history_max_days:
+        await update.message.reply_text(f"❌ Максимальный период — {settings.history_max_days} дней.")
+        return
+
+    series = await history_service.get_series(currency_code, start, end)
+
+    if not series:
+        logger.warning(f"Failed to get the history of {currency_code} for user {user_id}")
+        await update.message.reply_text(
+            f"❌ Не удалось получить историю курса {currency_code}.\n"
             f"Проверьте правильность кода валюты или попробуйте позже."
         )
+        return
+
+    await update.message.reply_text(format_history_message(series))
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the /subscribe command - subscribes the chat to the daily rates of the given currencies."""
+    if not update.message or not update.effective_chat:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    chat_id = update.effective_chat.id
+    codes = tuple(dict.fromkeys(arg.upper() for arg in context.args or []))
+
+    if not codes:
+        current = await subscription_service.get_codes(chat_id)
+        if current:
+            await update.message.reply_text(f"🔔 Вы подписаны на: {', '.join(current)}\n\n{SUBSCRIBE_USAGE}")
+        else:
+            await update.message.reply_text(SUBSCRIBE_USAGE)
+        return
 
+    if len(codes) > settings.subscriptions_max_codes:
+        await update.message.reply_text(f"❌ Можно подписаться максимум на {settings.subscriptions_max_codes} валют.")
+        return
+
+    snapshot = await cbr_client.get_snapshot()
+    # Without a snapshot only the format of the codes can be checked
+    unknown = [
+        code
+        for code in codes
+        if not (len(code) == 3 and code.isalpha()) or (snapshot is not None and code not in snapshot.table)
+    ]
+
+    if unknown:
+        await update.message.reply_text(f"❌ Неизвестные коды валют: {', '.join(unknown)}")
+        return
+
+    await subscription_service.subscribe(chat_id, codes)
+    await update.message.reply_text(
+        f"✅ Вы подписались на курсы {', '.join(codes)}.\n"
+        f"Они будут приходить после каждой публикации новых курсов ЦБ РФ."
+    )
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the /unsubscribe command - cancels the subscription of the chat."""
+    if not update.message or not update.effective_chat:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    await subscription_service.unsubscribe(update.effective_chat.id)
+    await update.message.reply_text("🔕 Подписка отменена.")
+
+
+@metrics.timed(HANDLER_SECONDS)
+async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handles the /alert command - lists, creates and deletes the rate alerts of the chat."""
+    if not update.message or not update.effective_chat:
+        logger.error("Failed to retrieve message information from update")
+        return
+
+    chat_id = update.effective_chat.id
+    args = context.args or []
+
+    if not args:
+        alerts = alert_service.get_alerts(chat_id)
+        await update.message.reply_text(f"{format_alert_list(alerts)}\n\n{ALERT_USAGE}" if alerts else ALERT_USAGE)
+        return
+
+    if args[0].lower() in ("del", "delete", "удалить"):
+        alert_id = args[1].lstrip("#") if len(args) == 2 else ""
+        if not alert_id.isdigit() or not await alert_service.remove_alert(chat_id, int(alert_id)):
+            await update.message.reply_text("❌ Оповещение не найдено.")
+            return
 
+        await update.message.reply_text(f"🗑 Оповещение #{alert_id} удалено.")
+        return
+
+    condition = parse_alert(" ".join(args))
+    if condition is None:
+        await update.message.reply_text(ALERT_USAGE)
+        return
+
+    code, operator, threshold = condition
+
+    if len(alert_service.get_alerts(chat_id)) >= settings.alerts_max_per_chat:
+        await update.message.reply_text(f"❌ Можно создать не более {settings.alerts_max_per_chat} оповещений.")
+        return
+
+    snapshot = await cbr_client.get_snapshot()
+    if snapshot and code not in snapshot.table:
+        await update.message.reply_text(f"❌ Неизвестный код валюты: {code}")
+        return
+
+    unit_rate = snapshot.table.unit_rate(code) if snapshot else None
+    alert = await alert_service.add_alert(chat_id, code, ABOVE if operator == ">" else BELOW, threshold, unit_rate)
+    message = f"✅ Оповещение #{alert.alert_id} создано: {code} {operator} {threshold:.4f} RUB."
+
+    if unit_rate is not None:
+        message += f"\nСейчас курс {code}: {unit_rate:.4f} RUB."
+        if not alert.armed:
+            message += "\nУсловие уже выполнено, оповещение придет, когда курс вернется за порог и снова его пересечет."
+
+    await update.message.reply_text(message)
+
+
+@metrics.timed(HANDLER_SECONDS)
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /stats command - shows bot statistics."""
     if not update.message:
@@ -188,12 +696,16 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         total_users = await stats_service.get_total_users()
         today_stats = await stats_service.get_daily_stats()
         recent_stats = await stats_service.get_recent_stats(days=7)
+        weekly_active = await stats_service.get_recent_unique_users(days=7)
+        monthly_active = await stats_service.get_recent_unique_users(days=30)
 
         # Calculate weekly totals
-        weekly_active = sum(stat.active_users for stat in recent_stats)
         weekly_requests = sum(stat.total_requests for stat in recent_stats)
         weekly_new = sum(stat.new_users for stat in recent_stats)
 
+        cache_stats = cbr_client.cache_stats
+        throttle_stats = throttle.stats
+
         message = (
             "📊 <b>Статистика бота</b>\n\n"
             f"👥 <b>Всего пользователей:</b> {total_users}\n\n"
@@ -204,10 +716,36 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             f"📈 <b>За последние 7 дней:</b>\n"
             f"   • Активных: {weekly_active}\n"
             f"   • Запросов: {weekly_requests}\n"
-            f"   • Новых: {weekly_new}\n"
+            f"   • Новых: {weekly_new}\n\n"
+            f"🗓 <b>Уникальных за 30 дней:</b> {monthly_active}\n\n"
+            f"💱 <b>Кэш курсов:</b>\n"
+            f"   • Попаданий: {cache_stats.hits}\n"
+            f"   • Промахов: {cache_stats.misses}\n"
+            f"   • Устаревших ответов: {cache_stats.stale}\n"
+            f"   • Обновлений: {cache_stats.refreshes}\n"
+            f"   • Ошибок: {cache_stats.errors}\n\n"
+            f"🚦 <b>Ограничение запросов:</b>\n"
+            f"   • Обработано: {throttle_stats.allowed}\n"
+            f"   • Отброшено (лимит пользователя): {throttle_stats.user_dropped}\n"
+            f"   • Отброшено (общий лимит): {throttle_stats.global_dropped}\n"
         )
 
         await update.message.reply_text(message, parse_mode="HTML")
     except Exception as e:
         logger.exception(f"Error getting statistics: {e}")
         await update.message.reply_text("❌ Ошибка при получении статистики. Попробуйте позже.")
+
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Logs the exceptions raised while handling updates and counts them by type."""
+    error = context.error
+    if error is None:
+        return
+
+    HANDLER_ERRORS.labels(type(error).__name__).inc()
+
+    # Failed replies surface here, since the handlers do not catch Bot API errors themselves
+    if isinstance(error, TelegramError):
+        TELEGRAM_SEND_FAILURES.labels(type(error).__name__).inc()
+
+    logger.opt(exception=error).error(f"Error while handling an update: {error}")
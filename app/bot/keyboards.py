@@ -1,15 +1,43 @@
-from typing import List
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
 from telegram import ReplyKeyboardMarkup
 
+# Layouts differ only in the order and choice of a few codes, so a small cache is shared by all users
+KEYBOARD_CACHE_SIZE = 1024
 
-def create_currencies_keyboard(currencies: List[str]) -> ReplyKeyboardMarkup:
-    """Creates a keyboard with currency buttons."""
+# A currency outside the base ones gets a button once it has been looked up this many times
+MIN_USES_FOR_BUTTON = 2
+
+
+def create_currencies_keyboard(currencies: Sequence[str]) -> ReplyKeyboardMarkup:
+    """Creates a keyboard with currency buttons.
+
+    Markups are immutable, so every distinct layout is built once and the same object is sent to every user with it.
+    """
+    return _build_keyboard(tuple(currencies))
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _build_keyboard(currencies: Tuple[str, ...]) -> ReplyKeyboardMarkup:
     keyboard = []
 
     for i in range(0, len(currencies), 2):
         row = currencies[i : i + 2]
         keyboard.append(row)
 
-    keyboard.append(["Ввести свой код"])
+    keyboard.append(("Ввести свой код",))
 
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
+
+def personal_currencies(usage: Dict[str, int], base_currencies: Sequence[str]) -> Tuple[str, ...]:
+    """The currencies of a user's keyboard: the most used ones first, filled up with the base currencies.
+
+    The keyboard keeps as many buttons as there are base currencies; unused base currencies keep their order.
+    """
+    used = [code for code, uses in usage.items() if code in base_currencies or uses >= MIN_USES_FOR_BUTTON]
+    used.sort(key=lambda code: (-usage[code], code))
+
+    codes = used[: len(base_currencies)]
+    codes.extend(code for code in base_currencies if code not in codes)
+    return tuple(codes[: len(base_currencies)])
@@ -0,0 +1,310 @@
+"""Persistence of user_data, chat_data and conversation states in the statistics database."""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import aiosqlite
+from loguru import logger
+from telegram.ext import Application, BasePersistence, ContextTypes, PersistenceInput
+
+from app.config import settings
+from app.stats.service import DB_PATH
+
+SELECT_DATA_SQL = "SELECT data FROM {table} WHERE {column} = ?"
+
+UPSERT_DATA_SQL = """
+    INSERT INTO {table} ({column}, data) VALUES (?, ?)
+    ON CONFLICT({column}) DO UPDATE SET data = excluded.data
+"""
+
+DELETE_DATA_SQL = "DELETE FROM {table} WHERE {column} = ?"
+
+# Same as the types of `ConversationHandler`, which PTB does not export
+ConversationKey = Tuple[Union[int, str], ...]
+ConversationDict = Dict[ConversationKey, object]
+
+UPSERT_CONVERSATION_SQL = """
+    INSERT INTO conversations (name, key, state) VALUES (?, ?, ?)
+    ON CONFLICT(name, key) DO UPDATE SET state = excluded.state
+"""
+
+
+def _encode(data: Dict[Any, Any]) -> Optional[str]:
+    """Compact JSON of the data; empty data is not stored at all."""
+    if not data:
+        return None
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+class DataTable:
+    """Users or chats whose data has been loaded, least recently used first.
+
+    Only a hash of the stored JSON is kept per key, so data that has not changed since it was stored is never
+    written again, while the data itself lives in the application alone. Changes wait in `pending` for the next
+    batch write; None stands for deleting the row.
+    """
+
+    __slots__ = ("table", "column", "seen", "pending")
+
+    def __init__(self, table: str, column: str):
+        self.table = table
+        self.column = column
+        # Key -> (last access on the monotonic clock, hash of the stored JSON)
+        self.seen: "OrderedDict[int, Tuple[float, int]]" = OrderedDict()
+        self.pending: Dict[int, Optional[str]] = {}
+
+    def touch(self, key: int, now: float) -> bool:
+        """Mark the key as used; False if its data has not been loaded yet."""
+        entry = self.seen.get(key)
+        if entry is None:
+            return False
+
+        self.seen[key] = (now, entry[1])
+        self.seen.move_to_end(key)
+        return True
+
+    def loaded(self, key: int, encoded: Optional[str], now: float) -> None:
+        self.seen[key] = (now, hash(encoded))
+        self.seen.move_to_end(key)
+
+    def stage(self, key: int, data: Dict[Any, Any], now: float) -> bool:
+        """Queue the data for writing unless it is what has been stored already; True if it was queued."""
+        try:
+            encoded = _encode(data)
+        except (TypeError, ValueError) as exc:
+            logger.error(f"Failed to serialize {self.table} of {key}: {exc}")
+            return False
+
+        fingerprint = hash(encoded)
+        entry = self.seen.get(key)
+        if entry is not None and entry[1] == fingerprint:
+            return False
+
+        self.seen[key] = (entry[0] if entry else now, fingerprint)
+        self.pending[key] = encoded
+        return True
+
+    def evict(self, cutoff: float) -> List[int]:
+        """Forget the keys last used before the cutoff, except those with changes still to be written."""
+        evicted = []
+        while self.seen:
+            key, (used_at, _) = next(iter(self.seen.items()))
+            if used_at >= cutoff:
+                break
+
+            if key in self.pending:
+                # Evicted on a later run, once the change has been written
+                break
+
+            self.seen.popitem(last=False)
+            evicted.append(key)
+        return evicted
+
+
+class SQLitePersistence(BasePersistence):
+    """Stores user_data, chat_data and conversation states in the statistics database.
+
+    Nothing is loaded at startup: the data of a user or chat is read on its first update by `refresh_user_data` and
+    `refresh_chat_data`. The application hands over the data of every user and chat it has seen every
+    `update_interval` seconds; only the entries that actually changed are written, in one transaction per run.
+    Users and chats idle for `idle_timeout` seconds are dropped from memory by `evict_job` and loaded again
+    when they return, so memory follows the number of recently active users rather than all users ever seen.
+    Data must be serializable to JSON, with string keys.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        update_interval: float = settings.persistence_update_interval,
+        idle_timeout: float = settings.persistence_idle_timeout,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.db_path = db_path
+        # Entries stay in memory for at least two update runs, so the application never hands over an evicted one
+        self.idle_timeout = max(idle_timeout, 2 * update_interval)
+
+        self.users = DataTable("user_data", "user_id")
+        self.chats = DataTable("chat_data", "chat_id")
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._write_task: Optional[asyncio.Task] = None
+
+    async def _connection(self) -> aiosqlite.Connection:
+        """Return the connection, opening it and creating the tables on first use."""
+        if self._conn is None:
+            conn = await aiosqlite.connect(self.db_path)
+            await conn.execute("PRAGMA journal_mode = WAL")
+            await conn.execute("PRAGMA synchronous = NORMAL")
+            await conn.execute("PRAGMA busy_timeout = 5000")
+
+            for table in (self.users, self.chats):
+                await conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table.table} ({table.column} INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+                )
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    name TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    PRIMARY KEY (name, key)
+                )
+            """)
+            await conn.commit()
+
+            self._conn = conn
+            logger.info("Persistence database initialized")
+        return self._conn
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        """Loaded lazily per user by `refresh_user_data`."""
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        """Loaded lazily per chat by `refresh_chat_data`."""
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        conn = await self._connection()
+        async with conn.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)) as cursor:
+            return {tuple(json.loads(key)): json.loads(state) async for key, state in cursor}
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        conn = await self._connection()
+        encoded_key = json.dumps(key)
+        if new_state is None:
+            await conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, encoded_key))
+        else:
+            await conn.execute(UPSERT_CONVERSATION_SQL, (name, encoded_key, json.dumps(new_state)))
+        await conn.commit()
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        if self.users.stage(user_id, data, time.monotonic()):
+            self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        if self.chats.stage(chat_id, data, time.monotonic()):
+            self._schedule_write()
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self.update_user_data(user_id, {})
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self.update_chat_data(chat_id, {})
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        await self._refresh(self.users, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        await self._refresh(self.chats, chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def _refresh(self, table: DataTable, key: int, data: Dict[Any, Any]) -> None:
+        """Load the stored data of the key into the application on its first update."""
+        now = time.monotonic()
+        if table.touch(key, now):
+            return
+
+        if key in table.pending:
+            encoded = table.pending[key]
+        else:
+            conn = await self._connection()
+            async with conn.execute(SELECT_DATA_SQL.format(table=table.table, column=table.column), (key,)) as cursor:
+                row = await cursor.fetchone()
+            encoded = row[0] if row else None
+
+        table.loaded(key, encoded, now)
+        if encoded:
+            data.update(json.loads(encoded))
+
+    def _schedule_write(self) -> None:
+        """Write the pending changes once the current run of updates has staged all of them."""
+        if self._write_task is None:
+            self._write_task = asyncio.get_running_loop().create_task(self._write())
+            self._write_task.add_done_callback(self._on_write_done)
+
+    def _on_write_done(self, task: asyncio.Task) -> None:
+        self._write_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to write the persistent data: {task.exception()}")
+
+    async def _write(self) -> None:
+        """Write all pending changes in one transaction."""
+        async with self._write_lock:
+            batches = [(table, table.pending) for table in (self.users, self.chats) if table.pending]
+            if not batches:
+                return
+
+            for table, _ in batches:
+                table.pending = {}
+
+            conn = await self._connection()
+            try:
+                for table, pending in batches:
+                    upserts = [(key, encoded) for key, encoded in pending.items() if encoded is not None]
+                    deletes = [(key,) for key, encoded in pending.items() if encoded is None]
+
+                    if upserts:
+                        await conn.executemany(UPSERT_DATA_SQL.format(table=table.table, column=table.column), upserts)
+                    if deletes:
+                        await conn.executemany(DELETE_DATA_SQL.format(table=table.table, column=table.column), deletes)
+                await conn.commit()
+            except Exception:
+                # Keep the changes for the next attempt unless newer ones have been staged meanwhile
+                for table, pending in batches:
+                    table.pending = {**pending, **table.pending}
+                raise
+
+            logger.debug(f"Persisted {sum(len(pending) for _, pending in batches)} changed user and chat entries")
+
+    async def flush(self) -> None:
+        """Write the pending changes and close the connection; called by the application on shutdown."""
+        if self._write_task is not None:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await self._write()
+
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def evict_idle(self, application: Application, now: Optional[float] = None) -> int:
+        """Drop the data of users and chats idle for longer than `idle_timeout` from the application's memory.
+
+        The data stays in the database and is loaded again on the next update of the user or chat.
+        """
+        cutoff = (time.monotonic() if now is None else now) - self.idle_timeout
+        evicted = 0
+
+        # The application only exposes read-only views of its user_data and chat_data
+        for table, data in ((self.users, application._user_data), (self.chats, application._chat_data)):
+            for key in table.evict(cutoff):
+                data.pop(key, None)
+                evicted += 1
+
+        if evicted:
+            logger.debug(f"Evicted the data of {evicted} idle users and chats from memory")
+        return evicted
+
+    async def evict_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Job entry point for the periodic eviction."""
+        self.evict_idle(context.application)
@@ -0,0 +1,123 @@
+"""Flood protection applied to every update before the handlers see it."""
+
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+from loguru import logger
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from app.config import settings
+from app.utils.rate_limit import TokenBucket
+
+# Why an update was dropped
+USER_LIMIT = "user"
+GLOBAL_LIMIT = "global"
+
+THROTTLED_MESSAGE = "⏳ Слишком много запросов. Подождите несколько секунд и попробуйте снова."
+
+
+class ThrottleStats:
+    """Counters of the throttled updates."""
+
+    __slots__ = ("allowed", "user_dropped", "global_dropped")
+
+    def __init__(self) -> None:
+        self.allowed = 0
+        self.user_dropped = 0
+        self.global_dropped = 0
+
+
+class Throttle:
+    """Per-user token buckets and a global budget in front of the handlers.
+
+    Every user may send `burst` updates at once and `rate` updates per second after that. All users together are
+    limited to `global_rate` updates per second, about what the bot may send to Telegram, since every handled
+    update is answered with a message. Excess updates are dropped before any handler, statistics write or rates
+    lookup; a user over their own limit is told about it once per streak of dropped updates.
+
+    Buckets are kept in least recently used order, so buckets idle for `idle_timeout` seconds are evicted in O(1)
+    per update. An idle bucket is full anyway, so evicting it forgets nothing.
+    """
+
+    def __init__(
+        self,
+        rate: float = settings.throttle_rate,
+        burst: int = settings.throttle_burst,
+        global_rate: float = settings.throttle_global_rate,
+        idle_timeout: float = settings.throttle_idle_timeout,
+    ):
+        self.rate = rate
+        self.burst = burst
+        # A bucket needs burst / rate seconds to fill up again
+        self.idle_timeout = max(idle_timeout, burst / rate)
+        self.stats = ThrottleStats()
+
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._warned: Set[int] = set()
+
+    @property
+    def tracked_users(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, user_id: int, now: float) -> TokenBucket:
+        """The bucket of the user, created on their first update, after evicting the buckets idle for too long."""
+        cutoff = now - self.idle_timeout
+        while self._buckets:
+            oldest_id, oldest = next(iter(self._buckets.items()))
+            if oldest.updated_at >= cutoff:
+                break
+            del self._buckets[oldest_id]
+            self._warned.discard(oldest_id)
+
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, capacity=self.burst, now=now)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def check(self, user_id: int, now: Optional[float] = None) -> Optional[str]:
+        """Take a token for an update of the user; the exceeded limit if the update has to be dropped."""
+        now = time.monotonic() if now is None else now
+        bucket = self._bucket(user_id, now)
+
+        if not bucket.try_acquire(now=now):
+            self.stats.user_dropped += 1
+            return USER_LIMIT
+
+        if not self._global.try_acquire(now=now):
+            # The user is not to blame for the global limit
+            bucket.tokens += 1
+            self.stats.global_dropped += 1
+            return GLOBAL_LIMIT
+
+        self.stats.allowed += 1
+        self._warned.discard(user_id)
+        return None
+
+    async def handle(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """`TypeHandler` callback stopping the handling of the updates over the limits."""
+        # Inline queries arrive on every keystroke and are cached by Telegram, so they are not counted
+        if not isinstance(update, Update) or not update.effective_user or update.inline_query:
+            return
+
+        user_id = update.effective_user.id
+        limit = self.check(user_id)
+        if limit is None:
+            return
+
+        # The notice is a message too, so it is only sent while the global budget allows it
+        if (
+            limit == USER_LIMIT
+            and user_id not in self._warned
+            and update.effective_message
+            and self._global.try_acquire()
+        ):
+            self._warned.add(user_id)
+            logger.info("Throttling the updates of user {user_id}", user_id=user_id)
+            await update.effective_message.reply_text(THROTTLED_MESSAGE)
+
+        raise ApplicationHandlerStop
@@ -1,5 +1,6 @@
+from datetime import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 
@@ -16,19 +17,104 @@ class Settings(BaseSettings):
         json_schema_extra={"env": "BASE_CURRENCIES"},
     )
 
+    # "polling" or "webhook"
+    bot_mode: str = Field("polling", json_schema_extra={"env": "BOT_MODE"})
+    update_concurrency: int = Field(32, json_schema_extra={"env": "UPDATE_CONCURRENCY"})
+
+    webhook_url: Optional[str] = Field(None, json_schema_extra={"env": "WEBHOOK_URL"})
+    webhook_listen: str = Field("0.0.0.0", json_schema_extra={"env": "WEBHOOK_LISTEN"})
+    webhook_port: int = Field(8443, json_schema_extra={"env": "WEBHOOK_PORT"})
+    webhook_path: str = Field("telegram", json_schema_extra={"env": "WEBHOOK_PATH"})
+    webhook_secret_token: Optional[str] = Field(None, json_schema_extra={"env": "WEBHOOK_SECRET_TOKEN"})
+
+    # Prometheus metrics endpoint, bound to the local interface by default
+    metrics_enabled: bool = Field(True, json_schema_extra={"env": "METRICS_ENABLED"})
+    metrics_host: str = Field("127.0.0.1", json_schema_extra={"env": "METRICS_HOST"})
+    metrics_port: int = Field(9108, json_schema_extra={"env": "METRICS_PORT"})
+
     log_level: str = Field("INFO", json_schema_extra={"env": "LOG_LEVEL"})
     log_dir: Path = Field(BASE_DIR / "logs", json_schema_extra={"env": "LOG_DIR"})
     log_rotation: str = Field("5 MB", json_schema_extra={"env": "LOG_ROTATION"})
+    # "text" or "json" (one object per line, with the request ID and the keyword arguments of the call)
+    log_format: str = Field("text", json_schema_extra={"env": "LOG_FORMAT"})
+    # Write from a background thread so that the event loop never waits for the disk or a rotation
+    log_enqueue: bool = Field(True, json_schema_extra={"env": "LOG_ENQUEUE"})
+    # Share of DEBUG/INFO records kept per "module:function" or module, as JSON: {"app.bot.handlers": 0.1}
+    log_sampling: Dict[str, float] = Field({}, json_schema_extra={"env": "LOG_SAMPLING"})
 
     cbr_api_url: str = Field(
         "https://www.cbr.ru/scripts/XML_daily.asp",
         json_schema_extra={"env": "CBR_API_URL"},
     )
+    cbr_dynamic_url: str = Field(
+        "https://www.cbr.ru/scripts/XML_dynamic.asp",
+        json_schema_extra={"env": "CBR_DYNAMIC_URL"},
+    )
+    # Moscow time after which the CBR is expected to have published the next rates
+    cbr_publication_time: time = Field(time(15, 30), json_schema_extra={"env": "CBR_PUBLICATION_TIME"})
+    cbr_cache_max_ttl: int = Field(3600, json_schema_extra={"env": "CBR_CACHE_MAX_TTL"})
+    # Parser of the CBR XML, for the daily rates and the /history chunks of up to HISTORY_CHUNK_DAYS: "tree" builds
+    # the full XML tree and is the faster one on these documents; "stream" parses the raw response bytes
+    # incrementally, with a lower peak memory but 10-40% slower, and only pays off on multi-year documents
+    cbr_parser: str = Field("tree", json_schema_extra={"env": "CBR_PARSER"})
+    cbr_timeout: float = Field(10.0, json_schema_extra={"env": "CBR_TIMEOUT"})
+    cbr_max_connections: int = Field(10, json_schema_extra={"env": "CBR_MAX_CONNECTIONS"})
+    cbr_max_keepalive_connections: int = Field(5, json_schema_extra={"env": "CBR_MAX_KEEPALIVE_CONNECTIONS"})
+    cbr_keepalive_expiry: float = Field(60.0, json_schema_extra={"env": "CBR_KEEPALIVE_EXPIRY"})
+    # Extra sources of the daily rates tried after the CBR, as "json:<url>" for `daily_json.js` feeds or "xml:<url>"
+    cbr_mirrors: List[str] = Field([], json_schema_extra={"env": "CBR_MIRRORS"})
+    # Additional attempts after a network error or a 429/5xx response, with exponential backoff
+    cbr_retries: int = Field(2, json_schema_extra={"env": "CBR_RETRIES"})
+    cbr_retry_backoff: float = Field(0.5, json_schema_extra={"env": "CBR_RETRY_BACKOFF"})
+    # Longest wait for a source before the next one is asked as well; the p95 latency of the source once known
+    cbr_hedge_delay: float = Field(2.0, json_schema_extra={"env": "CBR_HEDGE_DELAY"})
+    # Consecutive failures after which a source is skipped for CBR_BREAKER_RESET seconds
+    cbr_breaker_threshold: int = Field(5, json_schema_extra={"env": "CBR_BREAKER_THRESHOLD"})
+    cbr_breaker_reset: float = Field(30.0, json_schema_extra={"env": "CBR_BREAKER_RESET"})
+    # Last good snapshot, loaded at startup so that the first requests do not depend on the CBR being reachable
+    cbr_snapshot_path: Optional[Path] = Field(
+        BASE_DIR / "rates_snapshot.json",
+        json_schema_extra={"env": "CBR_SNAPSHOT_PATH"},
+    )
+    # How long a request waits for the refresh of an expired snapshot before it is answered from the stale one
+    cbr_revalidate_wait: float = Field(1.0, json_schema_extra={"env": "CBR_REVALIDATE_WAIT"})
+    # How long a rate request waits for the CBR before the user is shown a progress message
+    progress_message_delay: float = Field(0.25, json_schema_extra={"env": "PROGRESS_MESSAGE_DELAY"})
 
     stats_whitelist: Optional[List[int]] = Field(
         default=None,
         json_schema_extra={"env": "STATS_WHITELIST"},
     )
+    stats_flush_interval: float = Field(5.0, json_schema_extra={"env": "STATS_FLUSH_INTERVAL"})
+    stats_flush_threshold: int = Field(500, json_schema_extra={"env": "STATS_FLUSH_THRESHOLD"})
+    history_max_days: int = Field(3650, json_schema_extra={"env": "HISTORY_MAX_DAYS"})
+    history_chunk_days: int = Field(366, json_schema_extra={"env": "HISTORY_CHUNK_DAYS"})
+    history_concurrency: int = Field(4, json_schema_extra={"env": "HISTORY_CONCURRENCY"})
+    # Per-user flood protection: `THROTTLE_BURST` updates at once, then `THROTTLE_RATE` per second; all users together
+    # are limited to `THROTTLE_GLOBAL_RATE` updates per second, about the Telegram limit of sent messages
+    throttle_enabled: bool = Field(True, json_schema_extra={"env": "THROTTLE_ENABLED"})
+    throttle_rate: float = Field(1.0, json_schema_extra={"env": "THROTTLE_RATE"})
+    throttle_burst: int = Field(5, json_schema_extra={"env": "THROTTLE_BURST"})
+    throttle_global_rate: float = Field(30.0, json_schema_extra={"env": "THROTTLE_GLOBAL_RATE"})
+    throttle_idle_timeout: float = Field(600.0, json_schema_extra={"env": "THROTTLE_IDLE_TIMEOUT"})
+    # Seconds Telegram may reuse the answer to an inline query for the same text
+    inline_cache_time: int = Field(300, json_schema_extra={"env": "INLINE_CACHE_TIME"})
+    stats_mmap_size: int = Field(64 * 1024 * 1024, json_schema_extra={"env": "STATS_MMAP_SIZE"})
+    stats_cache_size_kib: int = Field(8192, json_schema_extra={"env": "STATS_CACHE_SIZE_KIB"})
+    # user_data and chat_data kept in the statistics database, written in batches every PERSISTENCE_UPDATE_INTERVAL
+    persistence_enabled: bool = Field(True, json_schema_extra={"env": "PERSISTENCE_ENABLED"})
+    persistence_update_interval: float = Field(30.0, json_schema_extra={"env": "PERSISTENCE_UPDATE_INTERVAL"})
+    # Users idle for longer are dropped from memory and loaded from the database when they come back
+    persistence_idle_timeout: float = Field(3600.0, json_schema_extra={"env": "PERSISTENCE_IDLE_TIMEOUT"})
+    # Interval between the checks for a new snapshot to push to the subscribers
+    subscriptions_check_interval: float = Field(300.0, json_schema_extra={"env": "SUBSCRIPTIONS_CHECK_INTERVAL"})
+    subscriptions_max_codes: int = Field(10, json_schema_extra={"env": "SUBSCRIPTIONS_MAX_CODES"})
+    alerts_max_per_chat: int = Field(20, json_schema_extra={"env": "ALERTS_MAX_PER_CHAT"})
+    broadcast_rate: float = Field(25.0, json_schema_extra={"env": "BROADCAST_RATE"})
+    broadcast_chat_rate: float = Field(1.0, json_schema_extra={"env": "BROADCAST_CHAT_RATE"})
+    broadcast_concurrency: int = Field(20, json_schema_extra={"env": "BROADCAST_CONCURRENCY"})
+    broadcast_max_attempts: int = Field(3, json_schema_extra={"env": "BROADCAST_MAX_ATTEMPTS"})
+    broadcast_page_size: int = Field(500, json_schema_extra={"env": "BROADCAST_PAGE_SIZE"})
 
     model_config = {
         "env_file": BASE_DIR / ".env",
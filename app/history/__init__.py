@@ -0,0 +1,5 @@
+"""Historical exchange rates module."""
+
+from app.history.service import HistoryService
+
+__all__ = ["HistoryService"]
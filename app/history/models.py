@@ -0,0 +1,61 @@
+"""Models for historical exchange rates."""
+
+from array import array
+from datetime import date
+from typing import Tuple
+
+
+class RateSeries:
+    """Rubles per one unit of a currency on every date the CBR set a rate within a range.
+
+    Dates are stored as ordinals and rates as doubles in parallel arrays, so the aggregates run over contiguous
+    memory in C.
+    """
+
+    __slots__ = ("code", "days", "values")
+
+    def __init__(self, code: str, days: array, values: array):
+        self.code = code
+        self.days = days
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def start_date(self) -> date:
+        return date.fromordinal(self.days[0])
+
+    @property
+    def end_date(self) -> date:
+        return date.fromordinal(self.days[-1])
+
+    @property
+    def first(self) -> float:
+        return self.values[0]
+
+    @property
+    def last(self) -> float:
+        return self.values[-1]
+
+    @property
+    def average(self) -> float:
+        return sum(self.values) / len(self.values)
+
+    @property
+    def change(self) -> float:
+        return self.last - self.first
+
+    @property
+    def change_percent(self) -> float:
+        return self.change / self.first * 100
+
+    def minimum(self) -> Tuple[date, float]:
+        """The lowest rate and the date it was set for."""
+        value = min(self.values)
+        return date.fromordinal(self.days[self.values.index(value)]), value
+
+    def maximum(self) -> Tuple[date, float]:
+        """The highest rate and the date it was set for."""
+        value = max(self.values)
+        return date.fromordinal(self.days[self.values.index(value)]), value
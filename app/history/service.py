@@ -0,0 +1,132 @@
+"""Service for historical exchange rates backed by the local store."""
+
+import asyncio
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+from loguru import logger
+
+from app.api.cbr import CBRClient
+from app.api.parser import iter_dynamic, parse_cbr_date, parse_dynamic
+from app.api.rates import CurrencyRate
+from app.config import settings
+from app.history.models import RateSeries
+from app.history.store import HistoryStore
+
+
+class HistoryService:
+    """Serves historical rates from the local store, downloading only the days it has never seen.
+
+    Missing ranges are split into chunks and fetched from `XML_dynamic.asp` with bounded concurrency. Rates for a
+    single date come from `XML_daily.asp?date_req=`, which returns every currency at once.
+    """
+
+    def __init__(
+        self,
+        cbr_client: CBRClient,
+        store: Optional[HistoryStore] = None,
+        chunk_days: int = settings.history_chunk_days,
+        concurrency: int = settings.history_concurrency,
+    ):
+        self.cbr_client = cbr_client
+        self.store = store or HistoryStore()
+        self.chunk_days = chunk_days
+        self.concurrency = concurrency
+
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def initialize(self) -> None:
+        """Prepare the local store."""
+        await self.store.initialize()
+
+    async def close(self) -> None:
+        """Close the local store."""
+        await self.store.close()
+
+    def _lock(self, code: str) -> asyncio.Lock:
+        """The lock serializing the downloads of the currency."""
+        return self._locks.setdefault(code, asyncio.Lock())
+
+    async def _resolve(self, code: str) -> Optional[CurrencyRate]:
+        """Find the currency in the current snapshot to learn its CBR ID."""
+        snapshot = await self.cbr_client.get_snapshot()
+        return snapshot.table.get(code) if snapshot else None
+
+    async def get_series(self, code: str, start: date, end: date) -> Optional[RateSeries]:
+        """Rates of the currency within the range, or None if the currency is unknown."""
+        record = await self._resolve(code)
+        if record is None:
+            return None
+
+        start_day, end_day = start.toordinal(), end.toordinal()
+
+        # Requests for the same currency wait for each other, so overlapping ranges are downloaded only once
+        async with self._lock(record.char_code):
+            missing = await self.store.missing_ranges(record.char_code, start_day, end_day)
+            chunks = [
+                (chunk_start, min(chunk_start + self.chunk_days - 1, range_end))
+                for range_start, range_end in missing
+                for chunk_start in range(range_start, range_end + 1, self.chunk_days)
+            ]
+
+            if chunks:
+                semaphore = asyncio.Semaphore(self.concurrency)
+                await asyncio.gather(*(self._backfill(record, chunk, semaphore) for chunk in chunks))
+
+        return await self.store.get_series(record.char_code, start_day, end_day)
+
+    async def _backfill(self, record: CurrencyRate, chunk: Tuple[int, int], semaphore: asyncio.Semaphore) -> None:
+        """Download one chunk of the currency history and store it."""
+        start, end = chunk
+
+        async with semaphore:
+            data = await self.cbr_client.fetch_dynamic(record.id, date.fromordinal(start), date.fromordinal(end))
+
+        if data is None:
+            return
+
+        try:
+            # Chunks span at most HISTORY_CHUNK_DAYS, short enough for the default tree parser to be the faster one
+            records = iter_dynamic(data) if settings.cbr_parser == "stream" else parse_dynamic(data)
+            points = [(record.char_code, day.toordinal(), value / nominal) for day, nominal, value in records]
+        except (ET.ParseError, ValueError) as exc:
+            logger.error(f"Failed to parse the history of {record.char_code}: {exc}")
+            return
+
+        # The rate for today may still change until the CBR publishes it, so today is never marked as downloaded
+        covered_end = min(end, date.today().toordinal() - 1)
+        coverage = [(record.char_code, start, covered_end)] if covered_end >= start else []
+
+        await self.store.add(points, coverage)
+        logger.debug(f"Stored {len(points)} rates of {record.char_code} for {chunk}")
+
+    async def get_rate_on(self, code: str, day: date) -> Optional[Tuple[date, float]]:
+        """The rate of the currency in effect on the date and the date it was set for."""
+        code = code.upper()
+        ordinal = day.toordinal()
+
+        async with self._lock(code):
+            if not await self.store.missing_ranges(code, ordinal, ordinal):
+                point = await self.store.get_last_point(code, ordinal)
+                return (date.fromordinal(point[0]), point[1]) if point else None
+
+            table = await self.cbr_client.fetch_daily(day)
+            if table is None or table.date is None:
+                return None
+
+            set_on = parse_cbr_date(table.date)
+            points = [(record.char_code, set_on.toordinal(), record.unit_rate) for record in table]
+
+            # No other rates were set between the returned date and the requested one
+            covered_end = min(ordinal, date.today().toordinal() - 1)
+            coverage = [(record.char_code, set_on.toordinal(), covered_end) for record in table]
+            await self.store.add(points, [entry for entry in coverage if entry[1] <= entry[2]])
+
+            record = table.get(code)
+            return (set_on, record.unit_rate) if record else None
+
+
+def history_period(days: int, today: Optional[date] = None) -> Tuple[date, date]:
+    """The range covering the last N days including today."""
+    end = today or date.today()
+    return end - timedelta(days=days - 1), end
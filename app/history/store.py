@@ -0,0 +1,151 @@
+"""Local append-only store of historical exchange rates."""
+
+import asyncio
+import aiosqlite
+from array import array
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.history.models import RateSeries
+
+BASE_DIR = Path(__file__).parent.parent.parent
+HISTORY_DB_PATH = BASE_DIR / "bot_history.db"
+
+INSERT_POINTS_SQL = "INSERT OR REPLACE INTO rate_history (code, day, unit_rate) VALUES (?, ?, ?)"
+
+SELECT_SERIES_SQL = """
+    SELECT day, unit_rate FROM rate_history
+    WHERE code = ? AND day BETWEEN ? AND ?
+    ORDER BY day
+"""
+
+SELECT_LAST_POINT_SQL = """
+    SELECT day, unit_rate FROM rate_history
+    WHERE code = ? AND day <= ?
+    ORDER BY day DESC
+    LIMIT 1
+"""
+
+SELECT_COVERAGE_SQL = "SELECT start_day, end_day FROM history_coverage WHERE code = ? ORDER BY start_day"
+
+
+class HistoryStore:
+    """SQLite store of daily unit rates keyed by currency and date ordinal.
+
+    Besides the rates, the store remembers which date ranges have already been downloaded for every currency, so
+    that the same day is never requested from the CBR twice, even when the CBR set no rate on it.
+    """
+
+    def __init__(self, db_path: Path = HISTORY_DB_PATH):
+        self.db_path = db_path
+        self._conn: Optional[aiosqlite.Connection] = None
+        # The coverage of a currency is read, merged and rewritten, which must not interleave with another write
+        self._write_lock = asyncio.Lock()
+
+    async def initialize(self) -> None:
+        """Open the connection and create the tables."""
+        if self._conn is None:
+            self._conn = await aiosqlite.connect(self.db_path)
+            await self._conn.execute("PRAGMA journal_mode = WAL")
+            await self._conn.execute("PRAGMA synchronous = NORMAL")
+
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_history (
+                code TEXT NOT NULL,
+                day INTEGER NOT NULL,
+                unit_rate REAL NOT NULL,
+                PRIMARY KEY (code, day)
+            ) WITHOUT ROWID
+        """)
+
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS history_coverage (
+                code TEXT NOT NULL,
+                start_day INTEGER NOT NULL,
+                end_day INTEGER NOT NULL,
+                PRIMARY KEY (code, start_day)
+            ) WITHOUT ROWID
+        """)
+
+        await self._conn.commit()
+        logger.info("History database initialized")
+
+    async def close(self) -> None:
+        """Close the connection."""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> aiosqlite.Connection:
+        """Return the open connection or fail if the store has not been initialized."""
+        if self._conn is None:
+            raise RuntimeError("HistoryStore is not initialized")
+        return self._conn
+
+    async def _coverage(self, code: str) -> List[Tuple[int, int]]:
+        """Date ranges (as inclusive ordinals) already downloaded for the currency."""
+        async with self._connection().execute(SELECT_COVERAGE_SQL, (code,)) as cursor:
+            return [(start, end) async for start, end in cursor]
+
+    async def missing_ranges(self, code: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Sub-ranges of [start, end] that have not been downloaded for the currency yet."""
+        missing = []
+        cursor = start
+
+        for covered_start, covered_end in await self._coverage(code):
+            if covered_end < cursor:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - 1))
+            cursor = covered_end + 1
+
+        if cursor <= end:
+            missing.append((cursor, end))
+
+        return missing
+
+    async def add(self, points: Iterable[Tuple[str, int, float]], coverage: Iterable[Tuple[str, int, int]]) -> None:
+        """Store rate points and mark the downloaded ranges as covered in one transaction."""
+        async with self._write_lock:
+            conn = self._connection()
+            await conn.executemany(INSERT_POINTS_SQL, points)
+
+            for code, start, end in coverage:
+                ranges = sorted([*await self._coverage(code), (start, end)])
+                merged = [ranges[0]]
+
+                for range_start, range_end in ranges[1:]:
+                    last_start, last_end = merged[-1]
+                    if range_start <= last_end + 1:
+                        merged[-1] = (last_start, max(last_end, range_end))
+                    else:
+                        merged.append((range_start, range_end))
+
+                await conn.execute("DELETE FROM history_coverage WHERE code = ?", (code,))
+                await conn.executemany(
+                    "INSERT INTO history_coverage (code, start_day, end_day) VALUES (?, ?, ?)",
+                    [(code, range_start, range_end) for range_start, range_end in merged],
+                )
+
+            await conn.commit()
+
+    async def get_series(self, code: str, start: int, end: int) -> RateSeries:
+        """Load the stored rates of the currency within [start, end]."""
+        days = array("i")
+        values = array("d")
+
+        async with self._connection().execute(SELECT_SERIES_SQL, (code, start, end)) as cursor:
+            for day, unit_rate in await cursor.fetchall():
+                days.append(day)
+                values.append(unit_rate)
+
+        return RateSeries(code, days, values)
+
+    async def get_last_point(self, code: str, day: int) -> Optional[Tuple[int, float]]:
+        """The last stored rate of the currency set on or before the day."""
+        async with self._connection().execute(SELECT_LAST_POINT_SQL, (code, day)) as cursor:
+            row = await cursor.fetchone()
+        return (row[0], row[1]) if row else None
@@ -0,0 +1,109 @@
+"""Loguru configuration: text or JSON records written by background threads, with per-path sampling.
+
+Records emitted while an update is handled carry its `request_id` (the Telegram update ID), set by the update
+processor with `logger.contextualize`. Keyword arguments of a log call, e.g.
+`logger.info("Курс {code} для {user_id}", code=code, user_id=user_id)`, are formatted only if a sink accepts the
+level and end up as separate fields of the JSON records.
+"""
+
+import json
+import random
+import sys
+import traceback
+from typing import Any, Dict, Mapping
+
+from loguru import logger
+
+from app.config import settings
+
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}\n{exception}"
+TEXT_FORMAT_WITH_REQUEST = (
+    "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | #{extra[request_id]} - {message}"
+    "\n{exception}"
+)
+
+# Records at this level or above are never sampled out
+SAMPLING_MAX_LEVEL = logger.level("INFO").no
+
+# Keys of `extra` used internally and left out of the JSON records
+SAMPLED_OUT = "_sampled_out"
+JSON_RECORD = "_json"
+
+
+class Sampler:
+    """Patcher marking a share of the DEBUG and INFO records of the configured paths to be dropped.
+
+    Rates are keyed by "module:function" or by module, e.g. {"app.bot.handlers:get_currency_rate": 0.1} keeps one
+    in ten records of that function. The decision is made once per record, so every sink drops the same records.
+    """
+
+    def __init__(self, rates: Mapping[str, float]):
+        self.rates = dict(rates)
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        if record["level"].no > SAMPLING_MAX_LEVEL:
+            return
+
+        rate = self.rates.get(f"{record['name']}:{record['function']}")
+        if rate is None:
+            rate = self.rates.get(record["name"])
+
+        if rate is not None and random.random() >= rate:
+            record["extra"][SAMPLED_OUT] = True
+
+
+def _keep(record: Dict[str, Any]) -> bool:
+    return SAMPLED_OUT not in record["extra"]
+
+
+def _text_format(record: Dict[str, Any]) -> str:
+    return TEXT_FORMAT_WITH_REQUEST if "request_id" in record["extra"] else TEXT_FORMAT
+
+
+def _json_format(record: Dict[str, Any]) -> str:
+    """Renders the record as one line of JSON, stashed in `extra` since loguru formats the returned template."""
+    payload = {
+        "time": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    payload.update((key, value) for key, value in record["extra"].items() if key != JSON_RECORD)
+
+    if record["exception"] is not None:
+        payload["exception"] = "".join(traceback.format_exception(*record["exception"]))
+
+    record["extra"][JSON_RECORD] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[" + JSON_RECORD + "]}\n"
+
+
+def configure_logging() -> None:
+    """Replaces the default sink with the stderr and rotating file sinks described by the settings.
+
+    With `LOG_ENQUEUE` the sinks write from a background thread, so the event loop never waits for the terminal,
+    the disk or a file rotation.
+    """
+    log_format = _json_format if settings.log_format == "json" else _text_format
+
+    logger.remove()  # Удаляем стандартный обработчик
+    logger.configure(patcher=Sampler(settings.log_sampling) if settings.log_sampling else None)
+
+    logger.add(
+        sys.stderr,
+        level=settings.log_level,
+        format=log_format,
+        filter=_keep,
+        enqueue=settings.log_enqueue,
+    )
+
+    logger.add(
+        settings.log_dir / ("bot.json.log" if settings.log_format == "json" else "bot.log"),
+        rotation=settings.log_rotation,
+        level=settings.log_level,
+        format=log_format,
+        filter=_keep,
+        enqueue=settings.log_enqueue,
+        retention="10 days",
+    )
@@ -0,0 +1,47 @@
+"""Low-overhead metrics exposed in the Prometheus text format.
+
+Instrumented modules create their metrics at import time with the helpers below, which register them in the
+process-wide registry served by `MetricsServer`.
+"""
+
+from typing import Callable, Optional, Sequence
+
+from app.metrics.registry import DEFAULT_BUCKETS, Counter, Gauge, Histogram, Registry, timed
+from app.metrics.server import MetricsServer
+
+registry = Registry()
+
+
+def counter(
+    name: str, documentation: str, labelnames: Sequence[str] = (), function: Optional[Callable[[], float]] = None
+) -> Counter:
+    """Create and register a counter."""
+    return registry.register(Counter(name, documentation, labelnames, function))
+
+
+def gauge(
+    name: str, documentation: str, labelnames: Sequence[str] = (), function: Optional[Callable[[], float]] = None
+) -> Gauge:
+    """Create and register a gauge."""
+    return registry.register(Gauge(name, documentation, labelnames, function))
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Create and register a histogram."""
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsServer",
+    "Registry",
+    "counter",
+    "gauge",
+    "histogram",
+    "registry",
+    "timed",
+]
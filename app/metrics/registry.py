@@ -0,0 +1,270 @@
+"""Counters, gauges and histograms rendered in the Prometheus text format."""
+
+import functools
+import math
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# Upper bounds in seconds, from sub-millisecond cache lookups to slow CBR downloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+F = TypeVar("F", bound=Callable[..., Any])
+M = TypeVar("M", bound="Metric")
+
+
+class CounterChild:
+    """Value of a counter for one combination of label values."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeChild:
+    """Value of a gauge for one combination of label values."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class HistogramChild:
+    """Observations of a histogram for one combination of label values, counted per bucket."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # The last slot counts the observations above the highest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> "Timer":
+        """Context manager observing the duration of its block."""
+        return Timer(self)
+
+
+class Timer:
+    """Observes the time spent inside a `with` block."""
+
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: HistogramChild):
+        self.child = child
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Metric(ABC):
+    """Named metric with optional labels; every combination of label values gets its own child.
+
+    The bot runs on a single event loop, so children are plain attributes updated without locks, and the
+    children are looked up once and kept by the instrumented code wherever the label values are fixed. A metric
+    can instead read its value from a function at scrape time, which costs nothing on the hot path.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    @abstractmethod
+    def _new_child(self) -> Any:
+        """A child holding the value for one combination of label values."""
+
+    def labels(self, *values: str) -> Any:
+        """The child for the label values, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def children(self) -> Dict[Tuple[str, ...], Any]:
+        """The children created so far, keyed by their label values."""
+        return dict(self._children)
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values, strict=True)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _samples(self) -> Iterator[str]:
+        if self.function is not None:
+            yield f"{self.name} {_number(self.function())}"
+            return
+
+        for values, child in sorted(self._children.items()):
+            yield f"{self.name}{self._label_text(values)} {_number(child.value)}"
+
+    def render(self) -> List[str]:
+        """The metric in the Prometheus text exposition format."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """Increments the counter without labels."""
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float) -> None:
+        """Sets the gauge without labels."""
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """Records an observation without labels."""
+        self.labels().observe(value)
+
+    def time(self) -> Timer:
+        """Times a block without labels."""
+        return self.labels().time()
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in sorted(self._children.items()):
+            labels = self._label_text(values)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), child.counts, strict=True):
+                cumulative += count
+                bucket_labels = self._label_text(values, 'le="' + _bound(bound) + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+
+            yield f"{self.name}_sum{labels} {_number(child.sum)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """Collection of the metrics exposed by the endpoint."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """Adds a metric; names must be unique."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        """Removes a metric, e.g. one reading from a service that has been replaced."""
+        self._metrics.pop(name, None)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram) -> Callable[[F], F]:
+    """Decorator observing the duration of every call of a coroutine function.
+
+    The histogram must have a single label, which is set to the name of the decorated function.
+    """
+
+    def decorator(func: F) -> F:
+        child = histogram.labels(func.__name__)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _bound(value: float) -> str:
+    return "+Inf" if value == math.inf else _number(value)
+
+
+def _number(value: float) -> str:
+    """Formats a sample value; integral floats lose the trailing ".0" like in the reference client."""
+    if math.isfinite(value) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
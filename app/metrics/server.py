@@ -0,0 +1,66 @@
+"""Local HTTP endpoint serving the metrics for scraping."""
+
+import asyncio
+from typing import Optional
+from loguru import logger
+
+from app.metrics.registry import Registry
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class MetricsServer:
+    """Answers `GET /metrics` with the rendered registry; every other request gets a 404."""
+
+    def __init__(self, registry: Registry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening; port 0 picks a free port, which is stored back in `port`.
+
+        A port that cannot be bound is logged and leaves the bot running without the endpoint.
+        """
+        if self._server is None:
+            try:
+                self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            except OSError as exc:
+                logger.error(f"Failed to serve metrics on {self.host}:{self.port}, the endpoint is disabled: {exc}")
+                return
+            self.port = self._server.sockets[0].getsockname()[1]  # type: ignore[attr-defined]
+            logger.info(f"Metrics are served on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        """Stop listening."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve a single request and close the connection."""
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        except Exception as exc:
+            logger.exception(f"Failed to serve metrics: {exc}")
+        finally:
+            writer.close()
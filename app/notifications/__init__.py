@@ -0,0 +1,6 @@
+"""Subscriptions to the daily rates, rate alerts and their delivery."""
+
+from app.notifications.alerts import AlertService
+from app.notifications.service import SubscriptionService
+
+__all__ = ["AlertService", "SubscriptionService"]
@@ -0,0 +1,274 @@
+"""Threshold alerts on the unit rates of currencies."""
+
+import asyncio
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from loguru import logger
+
+from app.api.cbr import CBRClient, RatesSnapshot
+from app.config import settings
+from app.notifications.broadcaster import BLOCKED, Broadcaster
+from app.notifications.models import ABOVE, Alert
+from app.notifications.store import SubscriptionStore
+from app.utils.text_utils import format_alerts_message
+
+
+class ThresholdIndex:
+    """Alert IDs of one currency and direction ordered by their thresholds."""
+
+    __slots__ = ("thresholds", "alert_ids")
+
+    def __init__(self) -> None:
+        self.thresholds = array("d")
+        self.alert_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.alert_ids)
+
+    def add(self, threshold: float, alert_id: int) -> None:
+        """Insert the alert keeping the thresholds sorted."""
+        position = bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(position, threshold)
+        self.alert_ids.insert(position, alert_id)
+
+    def remove(self, threshold: float, alert_id: int) -> None:
+        """Remove the alert, searching only among the equal thresholds."""
+        position = bisect_left(self.thresholds, threshold)
+        end = bisect_right(self.thresholds, threshold)
+        position += self.alert_ids[position:end].index(alert_id)
+        del self.thresholds[position]
+        del self.alert_ids[position]
+
+    def below(self, value: float) -> List[int]:
+        """Alerts with thresholds strictly below the value."""
+        return self.alert_ids[: bisect_left(self.thresholds, value)]
+
+    def above(self, value: float) -> List[int]:
+        """Alerts with thresholds strictly above the value."""
+        return self.alert_ids[bisect_right(self.thresholds, value) :]
+
+    def at_most(self, value: float) -> List[int]:
+        """Alerts with thresholds below or equal to the value."""
+        return self.alert_ids[: bisect_right(self.thresholds, value)]
+
+    def at_least(self, value: float) -> List[int]:
+        """Alerts with thresholds above or equal to the value."""
+        return self.alert_ids[bisect_left(self.thresholds, value) :]
+
+
+class AlertIndex:
+    """Per-currency sorted thresholds of the "above" and "below" alerts.
+
+    An "above" alert fires when the rate exceeds its threshold, so the triggered alerts of a currency are the
+    prefix of its "above" thresholds lower than the rate, and symmetrically the suffix of its "below" thresholds.
+    Both are found with a binary search, in O(log n + k) for k triggered alerts.
+    """
+
+    def __init__(self) -> None:
+        self._above: Dict[str, ThresholdIndex] = defaultdict(ThresholdIndex)
+        self._below: Dict[str, ThresholdIndex] = defaultdict(ThresholdIndex)
+
+    def _side(self, alert: Alert) -> Dict[str, ThresholdIndex]:
+        return self._above if alert.direction == ABOVE else self._below
+
+    def add(self, alert: Alert) -> None:
+        """Index the alert."""
+        self._side(alert)[alert.code].add(alert.threshold, alert.alert_id)
+
+    def remove(self, alert: Alert) -> None:
+        """Drop the alert from the index."""
+        side = self._side(alert)
+        side[alert.code].remove(alert.threshold, alert.alert_id)
+        if not side[alert.code]:
+            del side[alert.code]
+
+    def codes(self) -> Set[str]:
+        """Currencies with at least one alert."""
+        return self._above.keys() | self._below.keys()
+
+    def triggered(self, code: str, unit_rate: float) -> List[int]:
+        """IDs of the alerts of the currency whose condition the rate satisfies."""
+        triggered = []
+        if code in self._above:
+            triggered.extend(self._above[code].below(unit_rate))
+        if code in self._below:
+            triggered.extend(self._below[code].above(unit_rate))
+        return triggered
+
+    def cleared(self, code: str, unit_rate: float) -> List[int]:
+        """IDs of the alerts of the currency whose condition the rate does not satisfy."""
+        cleared = []
+        if code in self._above:
+            cleared.extend(self._above[code].at_least(unit_rate))
+        if code in self._below:
+            cleared.extend(self._below[code].at_most(unit_rate))
+        return cleared
+
+
+class AlertService:
+    """Keeps the alerts of all chats and fires them when a new snapshot crosses their thresholds.
+
+    Alerts are persisted in the statistics database and indexed in memory. Every new snapshot is matched against
+    the index of each currency that has alerts, the triggered alerts are deleted, since they fire once, and the
+    chats are notified in batches, one message per chat.
+
+    An alert whose condition already holds when it is created, or whose currency has no known rate yet, waits in a
+    separate index until a snapshot puts the rate on the other side of the threshold. Only then is it armed, so it
+    fires on a crossing rather than on the level the rate was already at.
+    """
+
+    def __init__(
+        self,
+        cbr_client: CBRClient,
+        store: Optional[SubscriptionStore] = None,
+        batch_size: int = settings.broadcast_page_size,
+    ):
+        self.cbr_client = cbr_client
+        self.store = store or SubscriptionStore()
+        self.batch_size = batch_size
+
+        self._alerts: Dict[int, Alert] = {}
+        self._index = AlertIndex()
+        # Alerts not armed yet
+        self._waiting = AlertIndex()
+        self._broadcaster: Optional[Broadcaster] = None
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+        cbr_client.add_snapshot_listener(self._on_snapshot)
+
+    async def initialize(self) -> None:
+        """Prepare the store and load the alerts into the index."""
+        await self.store.initialize()
+
+        for alert in await self.store.get_alerts():
+            self._alerts[alert.alert_id] = alert
+            self._index_of(alert).add(alert)
+
+        logger.info(f"Loaded {len(self._alerts)} rate alerts")
+
+    def start(self, broadcaster: Broadcaster) -> None:
+        """Enable the delivery of triggered alerts through the broadcaster shared with the subscription pushes."""
+        self._broadcaster = broadcaster
+
+    async def close(self) -> None:
+        """Wait for the deliveries in progress and close the store."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.store.close()
+
+    def _index_of(self, alert: Alert) -> AlertIndex:
+        return self._index if alert.armed else self._waiting
+
+    async def add_alert(
+        self, chat_id: int, code: str, direction: str, threshold: float, unit_rate: Optional[float] = None
+    ) -> Alert:
+        """Create an alert for the chat, armed if the current unit rate of the currency does not satisfy it yet."""
+        armed = unit_rate is not None and not Alert(0, chat_id, code, direction, threshold).is_triggered(unit_rate)
+
+        async with self._lock:
+            alert = await self.store.add_alert(chat_id, code, direction, threshold, armed)
+            self._alerts[alert.alert_id] = alert
+            self._index_of(alert).add(alert)
+
+        logger.info(f"Chat {chat_id} added alert {alert.alert_id}: {code} {direction} {threshold}")
+        return alert
+
+    async def remove_alert(self, chat_id: int, alert_id: int) -> bool:
+        """Delete an alert of the chat; False if the chat has no such alert."""
+        async with self._lock:
+            alert = self._alerts.get(alert_id)
+            if alert is None or alert.chat_id != chat_id:
+                return False
+
+            await self._forget([alert])
+            return True
+
+    def get_alerts(self, chat_id: int) -> List[Alert]:
+        """Alerts of the chat in the order they were created."""
+        return [alert for alert in self._alerts.values() if alert.chat_id == chat_id]
+
+    async def _forget(self, alerts: List[Alert]) -> None:
+        """Remove the alerts from the index and the store."""
+        for alert in alerts:
+            del self._alerts[alert.alert_id]
+            self._index_of(alert).remove(alert)
+        await self.store.delete_alerts(*(alert.alert_id for alert in alerts))
+
+    def _on_snapshot(self, snapshot: RatesSnapshot) -> None:
+        """Snapshot listener scheduling the check of the alerts."""
+        if self._broadcaster is None:
+            return
+
+        task = asyncio.get_running_loop().create_task(self.process(snapshot))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def check(self, snapshot: RatesSnapshot) -> List[Alert]:
+        """Remove and return the armed alerts triggered by the snapshot, then arm the waiting ones it clears."""
+        async with self._lock:
+            triggered = []
+            for code in self._index.codes():
+                unit_rate = snapshot.table.unit_rate(code)
+                if unit_rate is not None:
+                    triggered.extend(self._alerts[alert_id] for alert_id in self._index.triggered(code, unit_rate))
+
+            if triggered:
+                await self._forget(triggered)
+
+            await self._arm(snapshot)
+
+        return triggered
+
+    async def _arm(self, snapshot: RatesSnapshot) -> None:
+        """Arm the waiting alerts whose condition the rates of the snapshot do not satisfy."""
+        cleared = []
+        for code in self._waiting.codes():
+            unit_rate = snapshot.table.unit_rate(code)
+            if unit_rate is not None:
+                cleared.extend(self._alerts[alert_id] for alert_id in self._waiting.cleared(code, unit_rate))
+
+        if not cleared:
+            return
+
+        for alert in cleared:
+            self._waiting.remove(alert)
+            armed = self._alerts[alert.alert_id] = alert._replace(armed=True)
+            self._index.add(armed)
+        await self.store.arm_alerts(*(alert.alert_id for alert in cleared))
+
+    async def process(self, snapshot: RatesSnapshot) -> List[Alert]:
+        """Fire the alerts triggered by the snapshot and notify their chats."""
+        try:
+            triggered = await self.check(snapshot)
+            if triggered and self._broadcaster is not None:
+                await self._deliver(snapshot, triggered)
+            return triggered
+        except Exception as exc:
+            logger.exception(f"Failed to process rate alerts: {exc}")
+            return []
+
+    async def _deliver(self, snapshot: RatesSnapshot, triggered: List[Alert]) -> None:
+        """Send one message per chat, in batches; the remaining alerts of blocked chats are dropped."""
+        by_chat: Dict[int, List[Alert]] = defaultdict(list)
+        for alert in triggered:
+            by_chat[alert.chat_id].append(alert)
+
+        messages = [
+            (chat_id, format_alerts_message(alerts, snapshot.table, snapshot.date))
+            for chat_id, alerts in by_chat.items()
+        ]
+        logger.info(f"{len(triggered)} alerts triggered for {len(messages)} chats")
+
+        broadcaster = self._broadcaster
+        assert broadcaster is not None
+
+        for start in range(0, len(messages), self.batch_size):
+            results = await broadcaster.send_many(messages[start : start + self.batch_size])
+
+            blocked = {chat_id for chat_id, result in results.items() if result == BLOCKED}
+            if blocked:
+                async with self._lock:
+                    await self._forget([alert for alert in self._alerts.values() if alert.chat_id in blocked])
@@ -0,0 +1,96 @@
+"""Paced delivery of messages to many chats."""
+
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+from loguru import logger
+from telegram import Bot
+from telegram.error import Forbidden, RetryAfter, TelegramError
+
+from app import metrics
+from app.config import settings
+from app.utils.rate_limit import TokenBucket
+
+# Outcomes of delivering a message to one chat
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+TELEGRAM_SEND_FAILURES = metrics.counter(
+    "telegram_send_failures_total", "Messages the Bot API refused to deliver, by error type", ("type",)
+)
+
+# Per-chat buckets of the chats that received a message most recently; older ones are full again anyway
+MAX_CHAT_BUCKETS = 10000
+
+
+class Broadcaster:
+    """Sends messages while staying within the Bot API limits.
+
+    Every message takes a token from the global bucket (about 30 messages per second for the whole bot) and from
+    the bucket of its chat (about one message per second). When Telegram still answers with 429, the global
+    bucket is drained for the delay from the response, so all senders back off together before the retry.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = settings.broadcast_rate,
+        chat_rate: float = settings.broadcast_chat_rate,
+        concurrency: int = settings.broadcast_concurrency,
+        max_attempts: int = settings.broadcast_max_attempts,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+        self._bucket = TokenBucket(rate, capacity=rate)
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        """The bucket of the chat, created on its first message."""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=1)
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def send(self, chat_id: int, text: str) -> str:
+        """Deliver one message, retrying after flood waits, and report the outcome."""
+        for attempt in range(1, self.max_attempts + 1):
+            await self._chat_bucket(chat_id).acquire()
+            await self._bucket.acquire()
+
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return SENT
+            except RetryAfter as exc:
+                TELEGRAM_SEND_FAILURES.labels(type(exc).__name__).inc()
+                delay = exc.retry_after
+                logger.warning(f"Flood limit hit while sending to {chat_id}, retrying in {delay}s (attempt {attempt})")
+                self._bucket.pause(delay)
+                await asyncio.sleep(delay)
+            except Forbidden as exc:
+                TELEGRAM_SEND_FAILURES.labels(type(exc).__name__).inc()
+                logger.info(f"Chat {chat_id} is no longer reachable: {exc}")
+                return BLOCKED
+            except TelegramError as exc:
+                TELEGRAM_SEND_FAILURES.labels(type(exc).__name__).inc()
+                logger.error(f"Failed to send a message to {chat_id}: {exc}")
+                return FAILED
+
+        return FAILED
+
+    async def send_many(self, messages: Iterable[Tuple[int, str]]) -> Dict[int, str]:
+        """Deliver a batch of (chat ID, text) messages concurrently and report the outcome for every chat."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(chat_id: int, text: str) -> Tuple[int, str]:
+            async with semaphore:
+                return chat_id, await self.send(chat_id, text)
+
+        return dict(await asyncio.gather(*(deliver(chat_id, text) for chat_id, text in messages)))
@@ -0,0 +1,29 @@
+"""Data models for rate alerts."""
+
+from typing import NamedTuple
+
+# Directions of an alert threshold
+ABOVE = "above"
+BELOW = "below"
+
+
+class Alert(NamedTuple):
+    """Request to notify a chat once the unit rate of a currency crosses a threshold."""
+
+    alert_id: int
+    chat_id: int
+    code: str
+    direction: str
+    threshold: float
+    # Whether the rate has been on the other side of the threshold since the alert was created, so the alert only
+    # fires when the rate crosses the threshold and not because the condition already held at creation
+    armed: bool = True
+
+    @property
+    def operator(self) -> str:
+        """Comparison sign of the condition."""
+        return ">" if self.direction == ABOVE else "<"
+
+    def is_triggered(self, unit_rate: float) -> bool:
+        """Whether the rate satisfies the condition of the alert."""
+        return unit_rate > self.threshold if self.direction == ABOVE else unit_rate < self.threshold
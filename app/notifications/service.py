@@ -0,0 +1,118 @@
+"""Daily push of the new rates to the subscribed chats."""
+
+import asyncio
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from telegram.ext import ContextTypes
+
+from app.api.cbr import CBRClient, RatesSnapshot
+from app.config import settings
+from app.notifications.broadcaster import BLOCKED, SENT, Broadcaster
+from app.notifications.store import BroadcastProgress, SubscriptionStore
+from app.utils.text_utils import format_currency_message, format_subscription_message
+
+
+class SubscriptionService:
+    """Pushes every new CBR snapshot to the chats subscribed to its currencies.
+
+    A repeating job checks the snapshot; once its date has not been broadcast yet, the subscribers are walked in
+    pages ordered by chat ID and the cursor is saved after every page. A restart resumes from the cursor, so the
+    chats that already got the rates are not messaged again. Subscribers with the same set of currencies share one
+    message, formatted once per broadcast from the table of the snapshot being broadcast, so a newer snapshot arriving
+    meanwhile does not change what the remaining pages get.
+    """
+
+    def __init__(
+        self,
+        cbr_client: CBRClient,
+        store: Optional[SubscriptionStore] = None,
+        page_size: int = settings.broadcast_page_size,
+    ):
+        self.cbr_client = cbr_client
+        self.store = store or SubscriptionStore()
+        self.page_size = page_size
+
+        self._broadcaster: Optional[Broadcaster] = None
+        self._broadcast_lock = asyncio.Lock()
+
+    async def initialize(self) -> None:
+        """Prepare the subscriptions store."""
+        await self.store.initialize()
+
+    def start(self, broadcaster: Broadcaster) -> None:
+        """Enable the pushes through the broadcaster shared with the rate alerts."""
+        self._broadcaster = broadcaster
+
+    async def close(self) -> None:
+        """Close the subscriptions store."""
+        await self.store.close()
+
+    async def subscribe(self, chat_id: int, codes: Tuple[str, ...]) -> None:
+        """Subscribe the chat to the currencies."""
+        await self.store.subscribe(chat_id, codes)
+        logger.info(f"Chat {chat_id} subscribed to {', '.join(codes)}")
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        """Cancel the subscription of the chat."""
+        await self.store.unsubscribe(chat_id)
+        logger.info(f"Chat {chat_id} unsubscribed")
+
+    async def get_codes(self, chat_id: int) -> Tuple[str, ...]:
+        """Currencies the chat is subscribed to."""
+        return await self.store.get_codes(chat_id)
+
+    def _render(self, snapshot: RatesSnapshot, codes: Tuple[str, ...], messages: Dict[Tuple[str, ...], str]) -> str:
+        """The push for a set of currencies, rendered once per broadcast."""
+        message = messages.get(codes)
+        if message is None:
+            records = filter(None, map(snapshot.table.get, codes))
+            replies = (format_currency_message(record.as_dict()) for record in records)
+            message = messages[codes] = format_subscription_message(snapshot.date, replies)
+        return message
+
+    async def broadcast(self) -> Optional[BroadcastProgress]:
+        """Push the current snapshot to the subscribers unless it has already been delivered."""
+        broadcaster = self._broadcaster
+        if broadcaster is None or self._broadcast_lock.locked():
+            return None
+
+        async with self._broadcast_lock:
+            snapshot = await self.cbr_client.get_snapshot()
+            if snapshot is None or snapshot.date is None:
+                return None
+
+            progress = await self.store.get_progress(snapshot.date)
+            if progress.finished:
+                return progress
+
+            logger.info(f"Broadcasting the rates on {snapshot.date} from chat {progress.last_chat_id}")
+
+            messages: Dict[Tuple[str, ...], str] = {}
+
+            while page := await self.store.get_page(progress.last_chat_id, self.page_size):
+                results = await broadcaster.send_many(
+                    (chat_id, self._render(snapshot, codes, messages)) for chat_id, codes in page
+                )
+
+                blocked = [chat_id for chat_id, result in results.items() if result == BLOCKED]
+                if blocked:
+                    await self.store.unsubscribe(*blocked)
+
+                sent = sum(result == SENT for result in results.values())
+                progress.sent += sent
+                progress.failed += len(results) - sent
+                progress.last_chat_id = page[-1][0]
+                await self.store.save_progress(progress)
+
+            progress.finished = True
+            await self.store.save_progress(progress)
+
+            logger.info(f"Broadcast of {snapshot.date} finished: {progress.sent} sent, {progress.failed} failed")
+            return progress
+
+    async def broadcast_job(self, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """JobQueue callback checking for a snapshot that has not been pushed yet."""
+        try:
+            await self.broadcast()
+        except Exception as exc:
+            logger.exception(f"Broadcast failed: {exc}")
@@ -0,0 +1,206 @@
+"""Persistent subscriptions and broadcast progress."""
+
+import aiosqlite
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from loguru import logger
+
+from app.notifications.models import Alert
+from app.stats.service import DB_PATH
+
+UPSERT_SUBSCRIPTION_SQL = """
+    INSERT INTO subscriptions (chat_id, codes) VALUES (?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET codes = excluded.codes
+"""
+
+SELECT_SUBSCRIBERS_PAGE_SQL = """
+    SELECT chat_id, codes FROM subscriptions
+    WHERE chat_id > ?
+    ORDER BY chat_id
+    LIMIT ?
+"""
+
+UPSERT_BROADCAST_SQL = """
+    INSERT INTO broadcasts (broadcast_id, last_chat_id, sent, failed, finished)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(broadcast_id) DO UPDATE SET
+        last_chat_id = excluded.last_chat_id,
+        sent = excluded.sent,
+        failed = excluded.failed,
+        finished = excluded.finished
+"""
+
+INSERT_ALERT_SQL = "INSERT INTO alerts (chat_id, code, direction, threshold, armed) VALUES (?, ?, ?, ?, ?)"
+
+SELECT_ALERTS_SQL = "SELECT alert_id, chat_id, code, direction, threshold, armed FROM alerts ORDER BY alert_id"
+
+ARM_ALERT_SQL = "UPDATE alerts SET armed = 1 WHERE alert_id = ?"
+
+SELECT_CODES_SQL = "SELECT codes FROM subscriptions WHERE chat_id = ?"
+
+SELECT_BROADCAST_SQL = "SELECT last_chat_id, sent, failed, finished FROM broadcasts WHERE broadcast_id = ?"
+
+# Chat IDs of users are positive and those of groups negative, so the cursor starts below any of them
+FIRST_CHAT_CURSOR = -(2**63)
+
+
+class BroadcastProgress:
+    """Progress of delivering one snapshot to the subscribers, ordered by chat ID."""
+
+    __slots__ = ("broadcast_id", "last_chat_id", "sent", "failed", "finished")
+
+    def __init__(
+        self,
+        broadcast_id: str,
+        last_chat_id: int = FIRST_CHAT_CURSOR,
+        sent: int = 0,
+        failed: int = 0,
+        finished: bool = False,
+    ):
+        self.broadcast_id = broadcast_id
+        self.last_chat_id = last_chat_id
+        self.sent = sent
+        self.failed = failed
+        self.finished = finished
+
+
+class SubscriptionStore:
+    """Subscriptions, rate alerts and broadcast progress kept in the statistics database.
+
+    Subscribers are read in pages ordered by chat ID, and the ID of the last chat of every delivered page is saved
+    as the broadcast cursor, so a restarted broadcast continues after the chats that already got the message.
+    """
+
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = db_path
+        self._conn: Optional[aiosqlite.Connection] = None
+
+    async def initialize(self) -> None:
+        """Open the connection and create the tables."""
+        if self._conn is None:
+            self._conn = await aiosqlite.connect(self.db_path)
+            await self._conn.execute("PRAGMA journal_mode = WAL")
+            await self._conn.execute("PRAGMA synchronous = NORMAL")
+            await self._conn.execute("PRAGMA busy_timeout = 5000")
+
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                chat_id INTEGER PRIMARY KEY,
+                codes TEXT NOT NULL
+            )
+        """)
+
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                broadcast_id TEXT PRIMARY KEY,
+                last_chat_id INTEGER NOT NULL,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                finished INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+        await self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                direction TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                armed INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+
+        # Alerts stored before the crossing check fire as they did, on the first snapshot satisfying them
+        async with self._conn.execute("PRAGMA table_info(alerts)") as cursor:
+            columns = {row[1] async for row in cursor}
+        if "armed" not in columns:
+            await self._conn.execute("ALTER TABLE alerts ADD COLUMN armed INTEGER NOT NULL DEFAULT 1")
+
+        await self._conn.commit()
+        logger.info("Subscriptions database initialized")
+
+    async def close(self) -> None:
+        """Close the connection."""
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> aiosqlite.Connection:
+        """Return the open connection or fail if the store has not been initialized."""
+        if self._conn is None:
+            raise RuntimeError("SubscriptionStore is not initialized")
+        return self._conn
+
+    async def subscribe(self, chat_id: int, codes: Iterable[str]) -> None:
+        """Subscribe the chat to the currencies, replacing its previous subscription."""
+        conn = self._connection()
+        await conn.execute(UPSERT_SUBSCRIPTION_SQL, (chat_id, ",".join(codes)))
+        await conn.commit()
+
+    async def unsubscribe(self, *chat_ids: int) -> None:
+        """Remove the subscriptions of the chats."""
+        conn = self._connection()
+        await conn.executemany("DELETE FROM subscriptions WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+        await conn.commit()
+
+    async def get_codes(self, chat_id: int) -> Tuple[str, ...]:
+        """Currencies the chat is subscribed to, empty if it has no subscription."""
+        async with self._connection().execute(SELECT_CODES_SQL, (chat_id,)) as cursor:
+            row = await cursor.fetchone()
+        return tuple(row[0].split(",")) if row else ()
+
+    async def count(self) -> int:
+        """Number of subscribed chats."""
+        async with self._connection().execute("SELECT COUNT(*) FROM subscriptions") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def get_page(self, after_chat_id: int, limit: int) -> List[Tuple[int, Tuple[str, ...]]]:
+        """Next subscribers after the chat ID, with their currencies."""
+        async with self._connection().execute(SELECT_SUBSCRIBERS_PAGE_SQL, (after_chat_id, limit)) as cursor:
+            return [(chat_id, tuple(codes.split(","))) async for chat_id, codes in cursor]
+
+    async def get_progress(self, broadcast_id: str) -> BroadcastProgress:
+        """Saved progress of the broadcast, or a fresh one if it has never started."""
+        async with self._connection().execute(SELECT_BROADCAST_SQL, (broadcast_id,)) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None:
+            return BroadcastProgress(broadcast_id)
+
+        last_chat_id, sent, failed, finished = row
+        return BroadcastProgress(broadcast_id, last_chat_id, sent, failed, bool(finished))
+
+    async def save_progress(self, progress: BroadcastProgress) -> None:
+        """Persist the broadcast cursor and counters."""
+        conn = self._connection()
+        await conn.execute(
+            UPSERT_BROADCAST_SQL,
+            (progress.broadcast_id, progress.last_chat_id, progress.sent, progress.failed, int(progress.finished)),
+        )
+        await conn.commit()
+
+    async def add_alert(self, chat_id: int, code: str, direction: str, threshold: float, armed: bool) -> Alert:
+        """Store a new alert and return it with its ID."""
+        conn = self._connection()
+        cursor = await conn.execute(INSERT_ALERT_SQL, (chat_id, code, direction, threshold, int(armed)))
+        await conn.commit()
+        return Alert(cursor.lastrowid, chat_id, code, direction, threshold, armed)
+
+    async def arm_alerts(self, *alert_ids: int) -> None:
+        """Mark the alerts as ready to fire on the next crossing."""
+        conn = self._connection()
+        await conn.executemany(ARM_ALERT_SQL, [(alert_id,) for alert_id in alert_ids])
+        await conn.commit()
+
+    async def delete_alerts(self, *alert_ids: int) -> None:
+        """Remove the alerts."""
+        conn = self._connection()
+        await conn.executemany("DELETE FROM alerts WHERE alert_id = ?", [(alert_id,) for alert_id in alert_ids])
+        await conn.commit()
+
+    async def get_alerts(self) -> List[Alert]:
+        """All stored alerts."""
+        async with self._connection().execute(SELECT_ALERTS_SQL) as cursor:
+            return [Alert(*row[:5], armed=bool(row[5])) async for row in cursor]
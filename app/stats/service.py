@@ -1,55 +1,237 @@
 """Service for managing bot statistics."""
 
+import asyncio
 import aiosqlite
 from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Set, Tuple
 from loguru import logger
 
+from app import metrics
 from app.config import settings
 from app.stats.models import UserActivity, DailyStats
+from app.stats.user_sets import decode_user_ids, encode_user_ids
 
 BASE_DIR = Path(__file__).parent.parent.parent
 DB_PATH = BASE_DIR / "bot_stats.db"
 
+# SQLite allows up to 999 bound parameters per statement in older builds
+SELECT_CHUNK_SIZE = 500
+
+# Number of most recent days whose sets of active users are kept decoded in memory
+ACTIVE_SETS_CACHE_DAYS = 62
+
+# Statements are kept as constants so that sqlite3 reuses their prepared versions from the connection cache
+UPSERT_USERS_SQL = """
+    INSERT INTO users (user_id, username, first_name, last_activity, total_requests)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        username = excluded.username,
+        first_name = excluded.first_name,
+        last_activity = excluded.last_activity,
+        total_requests = total_requests + excluded.total_requests
+"""
+
+UPSERT_DAILY_STATS_SQL = """
+    INSERT INTO daily_stats (date, active_users, total_requests, new_users)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(date) DO UPDATE SET
+        active_users = active_users + excluded.active_users,
+        total_requests = total_requests + excluded.total_requests,
+        new_users = new_users + excluded.new_users
+"""
+
+UPSERT_CURRENCY_USAGE_SQL = """
+    INSERT INTO currency_usage (user_id, code, uses)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id, code) DO UPDATE SET
+        uses = uses + excluded.uses
+"""
+
+SELECT_CURRENCY_USAGE_SQL = "SELECT code, uses FROM currency_usage WHERE user_id = ?"
+
+COUNT_USERS_SQL = "SELECT COUNT(*) as count FROM users"
+
+SELECT_DAILY_STATS_SQL = "SELECT * FROM daily_stats WHERE date = ?"
+
+INSERT_ACTIVE_SEGMENT_SQL = "INSERT INTO daily_active_users (date, segment, user_ids) VALUES (?, ?, ?)"
+
+SELECT_DAY_SEGMENTS_SQL = "SELECT segment, user_ids FROM daily_active_users WHERE date = ?"
+
+SELECT_PERIOD_SEGMENTS_SQL = "SELECT date, user_ids FROM daily_active_users WHERE date BETWEEN ? AND ?"
+
+SELECT_UNCOMPACTED_DAYS_SQL = """
+    SELECT date FROM daily_active_users
+    WHERE date < ?
+    GROUP BY date
+    HAVING COUNT(*) > 1
+"""
+
+SELECT_PERIOD_STATS_SQL = """
+    SELECT * FROM daily_stats
+    WHERE date BETWEEN ? AND ?
+    ORDER BY date DESC
+"""
+
+
+STATS_QUERY_SECONDS = metrics.histogram(
+    "stats_query_duration_seconds", "Duration of statistics queries and flushes by method", ("method",)
+)
+
+
+class PendingActivity:
+    """Activity of one user on one day that has not been written to the database yet."""
+
+    __slots__ = ("username", "first_name", "requests")
+
+    def __init__(self, username: Optional[str], first_name: Optional[str]):
+        self.username = username
+        self.first_name = first_name
+        self.requests = 0
+
 
 class StatsService:
-    """Service for collecting and retrieving bot statistics."""
+    """Service for collecting and retrieving bot statistics.
+
+    The service owns two long-lived connections to the WAL-journaled database: a writer used only by the batched
+    flush and a read-only connection for the queries, so a query never blocks other writers or readers at the
+    SQLite level.
 
-    def __init__(self, db_path: Path = DB_PATH):
+    User activity is buffered in memory and written behind in batches, either periodically or once the buffer
+    reaches the configured size. Reads flush the buffer first, so they always see every recorded event; this means
+    `/stats` waits for a flush already running and commits the buffered activity on the writer before it queries.
+
+    Besides the counters, every day keeps the exact set of its active users in `daily_active_users`. Each flush
+    appends a compressed segment with the users that became active that day, and the segments of a finished day
+    are merged into one. Distinct users over any range are the union of the daily sets, the most recent of which
+    stay decoded in memory.
+
+    Rate lookups are counted per user and currency in `currency_usage`, buffered and written by the same flush.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        flush_interval: float = settings.stats_flush_interval,
+        flush_threshold: int = settings.stats_flush_threshold,
+    ):
         self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._reader: Optional[aiosqlite.Connection] = None
+
+        self._pending: Dict[Tuple[str, int], PendingActivity] = {}
+        # User ID -> {currency code: lookups not written yet}
+        self._pending_usage: Dict[int, Dict[str, int]] = {}
+        self._day_sets: Dict[str, Set[int]] = {}
+        self._next_segment: Dict[str, int] = {}
+        self._compacted_before: Optional[str] = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def pending_writes(self) -> int:
+        """Number of buffered (day, user) activity entries."""
+        return len(self._pending)
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Open a connection to the statistics database with the performance pragmas applied."""
+        conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        await conn.execute("PRAGMA journal_mode = WAL")
+        await conn.execute("PRAGMA synchronous = NORMAL")
+        await conn.execute("PRAGMA temp_store = MEMORY")
+        await conn.execute("PRAGMA busy_timeout = 5000")
+        await conn.execute(f"PRAGMA mmap_size = {int(settings.stats_mmap_size)}")
+        await conn.execute(f"PRAGMA cache_size = -{int(settings.stats_cache_size_kib)}")
+        return conn
 
     async def initialize(self) -> None:
-        """Initialize database tables."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_activity DATE,
-                    total_requests INTEGER DEFAULT 0
-                )
-            """)
-
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS daily_stats (
-                    date DATE PRIMARY KEY,
-                    active_users INTEGER DEFAULT 0,
-                    total_requests INTEGER DEFAULT 0,
-                    new_users INTEGER DEFAULT 0
-                )
-            """)
-
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_users_last_activity 
-                ON users(last_activity)
-            """)
+        """Open the connections, initialize database tables and start the periodic flush."""
+        if self._writer is None:
+            self._writer = await self._connect()
 
-            await conn.commit()
-            logger.info("Statistics database initialized")
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_activity DATE,
+                total_requests INTEGER DEFAULT 0
+            )
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                date DATE PRIMARY KEY,
+                active_users INTEGER DEFAULT 0,
+                total_requests INTEGER DEFAULT 0,
+                new_users INTEGER DEFAULT 0
+            )
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS daily_active_users (
+                date DATE NOT NULL,
+                segment INTEGER NOT NULL,
+                user_ids BLOB NOT NULL,
+                PRIMARY KEY (date, segment)
+            ) WITHOUT ROWID
+        """)
+
+        await self._writer.execute("""
+            CREATE TABLE IF NOT EXISTS currency_usage (
+                user_id INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                uses INTEGER NOT NULL,
+                PRIMARY KEY (user_id, code)
+            ) WITHOUT ROWID
+        """)
+
+        await self._writer.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_last_activity
+            ON users(last_activity)
+        """)
+
+        await self._writer.commit()
+
+        if self._reader is None:
+            self._reader = await self._connect()
+            self._reader.row_factory = aiosqlite.Row
+            await self._reader.execute("PRAGMA query_only = ON")
+
+        logger.info("Statistics database initialized")
+
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Stop the periodic flush, write all buffered activity and close the connections."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+
+        await self.flush()
+
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                await conn.close()
+        self._reader = self._writer = None
+
+        logger.info("Statistics service closed")
+
+    def _connection(self, conn: Optional[aiosqlite.Connection]) -> aiosqlite.Connection:
+        """Return an open connection or fail if the service has not been initialized."""
+        if conn is None:
+            raise RuntimeError("StatsService is not initialized")
+        return conn
 
     async def record_user_activity(
         self,
@@ -58,142 +240,306 @@ class StatsService:
         first_name: Optional[str] = None,
     ) -> None:
         """Record user activity."""
-        today = date.today()
-
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            # Check if user exists
-            cursor = await conn.execute(
-                "SELECT user_id, last_activity, total_requests FROM users WHERE user_id = ?",
-                (user_id,),
-            )
-            row = await cursor.fetchone()
+        key = (date.today().isoformat(), user_id)
+
+        activity = self._pending.get(key)
+        if activity is None:
+            activity = self._pending[key] = PendingActivity(username, first_name)
+        else:
+            activity.username = username
+            activity.first_name = first_name
+        activity.requests += 1
+
+        if len(self._pending) >= self.flush_threshold and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self.flush())
+            self._flush_task.add_done_callback(self._on_flush_done)
+
+    def record_currency_use(self, user_id: int, code: str) -> None:
+        """Count a rate lookup of the user; written with the next flush of the activity."""
+        usage = self._pending_usage.get(user_id)
+        if usage is None:
+            usage = self._pending_usage[user_id] = {}
+        usage[code] = usage.get(code, 0) + 1
+
+    def _on_flush_done(self, task: asyncio.Task) -> None:
+        """Forgets the finished threshold flush."""
+        self._flush_task = None
+
+    async def _flush_periodically(self) -> None:
+        """Flush the buffer every `flush_interval` seconds."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    @metrics.timed(STATS_QUERY_SECONDS)
+    async def flush(self) -> None:
+        """Write all buffered activity to the database in a single transaction."""
+        async with self._flush_lock:
+            if not self._pending and not self._pending_usage:
+                return
 
-            if row:
-                # Update existing user
-                last_activity = datetime.fromisoformat(row["last_activity"]).date() if row["last_activity"] else None
-                is_new_day = last_activity != today
-                total_requests = row["total_requests"] + 1
-
-                await conn.execute(
-                    """
-                    UPDATE users 
-                    SET username = ?, first_name = ?, last_activity = ?, total_requests = ?
-                    WHERE user_id = ?
-                    """,
-                    (username, first_name, today.isoformat(), total_requests, user_id),
-                )
-
-                # Update daily stats if it's a new day for this user
-                if is_new_day:
-                    await self._increment_daily_active_users(conn, today)
+            pending, self._pending = self._pending, {}
+            usage, self._pending_usage = self._pending_usage, {}
+
+            try:
+                await self._write(pending, usage)
+            except Exception as exc:
+                logger.exception(f"Failed to flush statistics, keeping {len(pending)} entries buffered: {exc}")
+                if self._writer is not None:
+                    await self._writer.rollback()
+                self._restore(pending, usage)
+                return
+
+            # Runs after the commit of the batch, so a failure here must not put the written entries back
+            await self._compact()
+
+    def _restore(self, pending: Dict[Tuple[str, int], PendingActivity], usage: Dict[int, Dict[str, int]]) -> None:
+        """Put entries of a failed flush back into the buffer."""
+        for key, activity in pending.items():
+            newer = self._pending.get(key)
+            if newer is not None:
+                activity.username = newer.username
+                activity.first_name = newer.first_name
+                activity.requests += newer.requests
+            self._pending[key] = activity
+
+        for user_id, counts in usage.items():
+            newer_counts = self._pending_usage.get(user_id, {})
+            for code, uses in newer_counts.items():
+                counts[code] = counts.get(code, 0) + uses
+            self._pending_usage[user_id] = counts
+
+    async def _write(self, pending: Dict[Tuple[str, int], PendingActivity], usage: Dict[int, Dict[str, int]]) -> None:
+        """Apply a batch of activity to the users, daily_stats and currency_usage tables."""
+        conn = self._connection(self._writer)
+        user_ids = list({user_id for _, user_id in pending})
+        last_activity: Dict[int, Optional[str]] = {}
+
+        for i in range(0, len(user_ids), SELECT_CHUNK_SIZE):
+            chunk = user_ids[i : i + SELECT_CHUNK_SIZE]
+            async with conn.execute(
+                f"SELECT user_id, last_activity FROM users WHERE user_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ) as cursor:
+                for user_id, day in await cursor.fetchall():
+                    last_activity[user_id] = day
+
+        users: Dict[int, list] = {}
+        daily: Dict[str, list] = {}
+        day_users: Dict[str, List[int]] = {}
+
+        for (day, user_id), activity in sorted(pending.items()):
+            counters = daily.setdefault(day, [0, 0, 0])  # active users, requests, new users
+            day_users.setdefault(day, []).append(user_id)
+
+            if user_id not in last_activity:
+                counters[2] += 1
+                counters[0] += 1
+            elif last_activity[user_id] != day:
+                counters[0] += 1
+            last_activity[user_id] = day
+            counters[1] += activity.requests
+
+            row = users.get(user_id)
+            if row is None:
+                users[user_id] = [user_id, activity.username, activity.first_name, day, activity.requests]
             else:
-                # New user
-                await conn.execute(
-                    """
-                    INSERT INTO users (user_id, username, first_name, last_activity, total_requests)
-                    VALUES (?, ?, ?, ?, 1)
-                    """,
-                    (user_id, username, first_name, today.isoformat()),
-                )
-                await self._increment_daily_new_users(conn, today)
-                await self._increment_daily_active_users(conn, today)
-
-            # Increment daily requests
-            await self._increment_daily_requests(conn, today)
+                row[1:4] = activity.username, activity.first_name, day
+                row[4] += activity.requests
 
-            await conn.commit()
+        segments, fresh_users = await self._new_segments(conn, day_users)
 
-    async def _increment_daily_active_users(self, conn: aiosqlite.Connection, day: date) -> None:
-        """Increment active users count for the day."""
-        await conn.execute(
-            """
-            INSERT INTO daily_stats (date, active_users, total_requests, new_users)
-            VALUES (?, 1, 0, 0)
-            ON CONFLICT(date) DO UPDATE SET active_users = active_users + 1
-            """,
-            (day.isoformat(),),
+        await conn.executemany(UPSERT_USERS_SQL, users.values())
+        await conn.executemany(
+            UPSERT_DAILY_STATS_SQL,
+            [(day, active, requests, new) for day, (active, requests, new) in daily.items()],
         )
-
-    async def _increment_daily_new_users(self, conn: aiosqlite.Connection, day: date) -> None:
-        """Increment new users count for the day."""
-        await conn.execute(
-            """
-            INSERT INTO daily_stats (date, active_users, total_requests, new_users)
-            VALUES (?, 0, 0, 1)
-            ON CONFLICT(date) DO UPDATE SET new_users = new_users + 1
-            """,
-            (day.isoformat(),),
+        await conn.executemany(INSERT_ACTIVE_SEGMENT_SQL, segments)
+        await conn.executemany(
+            UPSERT_CURRENCY_USAGE_SQL,
+            [(user_id, code, uses) for user_id, counts in usage.items() for code, uses in counts.items()],
         )
 
-    async def _increment_daily_requests(self, conn: aiosqlite.Connection, day: date) -> None:
-        """Increment total requests count for the day."""
-        await conn.execute(
-            """
-            INSERT INTO daily_stats (date, active_users, total_requests, new_users)
-            VALUES (?, 0, 1, 0)
-            ON CONFLICT(date) DO UPDATE SET total_requests = total_requests + 1
-            """,
-            (day.isoformat(),),
-        )
+        await conn.commit()
+
+        for day, fresh in fresh_users.items():
+            self._day_sets[day].update(fresh)
+
+        logger.debug(f"Flushed activity of {len(users)} users for {len(daily)} days")
+
+    async def _compact(self) -> None:
+        """Compact the active sets of the finished days once a day; a failure is retried by the next flush."""
+        today = date.today().isoformat()
+        if self._compacted_before == today:
+            return
+
+        conn = self._connection(self._writer)
+        try:
+            await self._compact_active_sets(conn, today)
+        except Exception as exc:
+            logger.exception(f"Failed to compact the active user sets: {exc}")
+            await conn.rollback()
+            # The segment counters may describe the rolled back compaction, so they are loaded again on use
+            self._next_segment.clear()
+            return
+
+        self._compacted_before = today
+
+    async def _new_segments(
+        self, conn: aiosqlite.Connection, day_users: Dict[str, List[int]]
+    ) -> Tuple[List[Tuple[str, int, bytes]], Dict[str, List[int]]]:
+        """Segments of the users not yet active on their day, and those users per day."""
+        segments = []
+        fresh_users: Dict[str, List[int]] = {}
+
+        for day, active_ids in day_users.items():
+            members = await self._load_day_set(conn, day)
+            fresh = [user_id for user_id in active_ids if user_id not in members]
+
+            if fresh:
+                segment = self._next_segment[day]
+                self._next_segment[day] = segment + 1
+                segments.append((day, segment, encode_user_ids(fresh)))
+                fresh_users[day] = fresh
+
+        return segments, fresh_users
+
+    async def _load_day_set(self, conn: aiosqlite.Connection, day: str) -> Set[int]:
+        """Return the cached set of users active on the day, loading it and its segment counter on first use."""
+        members = self._day_sets.get(day)
+
+        if members is None or day not in self._next_segment:
+            members = set()
+            next_segment = 0
+            async with conn.execute(SELECT_DAY_SEGMENTS_SQL, (day,)) as cursor:
+                async for segment, blob in cursor:
+                    members.update(decode_user_ids(blob))
+                    next_segment = max(next_segment, segment + 1)
+
+            self._cache_day_set(day, members)
+            self._next_segment[day] = next_segment
+
+        return members
 
+    def _cache_day_set(self, day: str, members: Set[int]) -> None:
+        """Keep the decoded set of a day, evicting the oldest days beyond the cache size."""
+        self._day_sets[day] = members
+
+        while len(self._day_sets) > ACTIVE_SETS_CACHE_DAYS:
+            oldest = min(self._day_sets)
+            del self._day_sets[oldest]
+            self._next_segment.pop(oldest, None)
+
+    async def _compact_active_sets(self, conn: aiosqlite.Connection, before: str) -> None:
+        """Merge the segments of every finished day into a single one."""
+        async with conn.execute(SELECT_UNCOMPACTED_DAYS_SQL, (before,)) as cursor:
+            days = [row[0] async for row in cursor]
+
+        for day in days:
+            members = await self._load_day_set(conn, day)
+            await conn.execute("DELETE FROM daily_active_users WHERE date = ?", (day,))
+            await conn.execute(INSERT_ACTIVE_SEGMENT_SQL, (day, 0, encode_user_ids(members)))
+            self._next_segment[day] = 1
+
+        if days:
+            await conn.commit()
+            logger.debug(f"Compacted active user sets of {len(days)} days")
+
+    @metrics.timed(STATS_QUERY_SECONDS)
+    async def get_currency_usage(self, user_id: int) -> Dict[str, int]:
+        """Number of rate lookups of the user per currency code.
+
+        The buffered lookups of the user are added to the stored ones instead of flushing the whole buffer.
+        """
+        async with self._connection(self._reader).execute(SELECT_CURRENCY_USAGE_SQL, (user_id,)) as cursor:
+            usage = {row["code"]: row["uses"] async for row in cursor}
+
+        for code, uses in self._pending_usage.get(user_id, {}).items():
+            usage[code] = usage.get(code, 0) + uses
+        return usage
+
+    @metrics.timed(STATS_QUERY_SECONDS)
     async def get_total_users(self) -> int:
         """Get total number of registered users."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute("SELECT COUNT(*) as count FROM users")
+        await self.flush()
+
+        async with self._connection(self._reader).execute(COUNT_USERS_SQL) as cursor:
             row = await cursor.fetchone()
-            return row["count"] if row else 0
+        return row["count"] if row else 0
 
+    @metrics.timed(STATS_QUERY_SECONDS)
     async def get_daily_stats(self, day: Optional[date] = None) -> DailyStats:
         """Get statistics for a specific day (default: today)."""
+        await self.flush()
+
         if day is None:
             day = date.today()
 
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute(
-                "SELECT * FROM daily_stats WHERE date = ?",
-                (day.isoformat(),),
-            )
+        async with self._connection(self._reader).execute(SELECT_DAILY_STATS_SQL, (day.isoformat(),)) as cursor:
             row = await cursor.fetchone()
 
-            if row:
-                return DailyStats(
-                    date=day,
-                    active_users=row["active_users"],
-                    total_requests=row["total_requests"],
-                    new_users=row["new_users"],
-                )
-            return DailyStats(date=day, active_users=0, total_requests=0, new_users=0)
+        if row:
+            return DailyStats(
+                date=day,
+                active_users=row["active_users"],
+                total_requests=row["total_requests"],
+                new_users=row["new_users"],
+            )
+        return DailyStats(date=day, active_users=0, total_requests=0, new_users=0)
 
+    @metrics.timed(STATS_QUERY_SECONDS)
     async def get_stats_for_period(self, start_date: date, end_date: date) -> list[DailyStats]:
         """Get statistics for a date range."""
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute(
-                """
-                SELECT * FROM daily_stats 
-                WHERE date BETWEEN ? AND ?
-                ORDER BY date DESC
-                """,
-                (start_date.isoformat(), end_date.isoformat()),
-            )
+        await self.flush()
+
+        async with self._connection(self._reader).execute(
+            SELECT_PERIOD_STATS_SQL,
+            (start_date.isoformat(), end_date.isoformat()),
+        ) as cursor:
             rows = await cursor.fetchall()
 
-            return [
-                DailyStats(
-                    date=datetime.fromisoformat(row["date"]).date(),
-                    active_users=row["active_users"],
-                    total_requests=row["total_requests"],
-                    new_users=row["new_users"],
-                )
-                for row in rows
-            ]
+        return [
+            DailyStats(
+                date=datetime.fromisoformat(row["date"]).date(),
+                active_users=row["active_users"],
+                total_requests=row["total_requests"],
+                new_users=row["new_users"],
+            )
+            for row in rows
+        ]
+
+    @metrics.timed(STATS_QUERY_SECONDS)
+    async def get_unique_users(self, start_date: date, end_date: date) -> int:
+        """Get the exact number of distinct users active within a date range."""
+        await self.flush()
+
+        start, end = start_date.isoformat(), end_date.isoformat()
+        sets = [members for day, members in self._day_sets.items() if start <= day <= end]
+        cached_days = {day for day in self._day_sets if start <= day <= end}
+        loaded: Dict[str, Set[int]] = {}
+
+        async with self._connection(self._reader).execute(SELECT_PERIOD_SEGMENTS_SQL, (start, end)) as cursor:
+            async for row in cursor:
+                day = row["date"]
+                if day not in cached_days:
+                    loaded.setdefault(day, set()).update(decode_user_ids(row["user_ids"]))
 
+        for day, members in loaded.items():
+            self._cache_day_set(day, members)
+        sets.extend(loaded.values())
+
+        return len(set().union(*sets))
+
+    @metrics.timed(STATS_QUERY_SECONDS)
+    async def get_recent_unique_users(self, days: int = 7) -> int:
+        """Get the exact number of distinct users active within the last N days."""
+        end_date = date.today()
+        start_date = date.fromordinal(end_date.toordinal() - days + 1)
+        return await self.get_unique_users(start_date, end_date)
+
+    @metrics.timed(STATS_QUERY_SECONDS)
     async def get_recent_stats(self, days: int = 7) -> list[DailyStats]:
         """Get statistics for the last N days."""
         end_date = date.today()
         start_date = date.fromordinal(end_date.toordinal() - days + 1)
         return await self.get_stats_for_period(start_date, end_date)
-
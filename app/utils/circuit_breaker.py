@@ -0,0 +1,53 @@
+import time
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calls to a failing dependency for `reset_timeout` seconds after `failure_threshold` consecutive failures.
+
+    Once the timeout has passed a single trial call is let through: its success closes the circuit and its failure
+    opens it again. A trial that never reports back, e.g. because it was cancelled, is replaced after another timeout.
+    """
+
+    __slots__ = ("failure_threshold", "reset_timeout", "failures", "state", "changed_at")
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = CLOSED
+        self.changed_at = 0.0
+
+    @property
+    def closed(self) -> bool:
+        return self.state == CLOSED
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Whether a call may be made right now."""
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic() if now is None else now
+        if now - self.changed_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self.changed_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.state = CLOSED
+
+    def record_failure(self, now: Optional[float] = None) -> bool:
+        """Count a failed call; True if it has just opened the circuit."""
+        self.failures += 1
+        if self.state == OPEN or (self.state == CLOSED and self.failures < self.failure_threshold):
+            return False
+
+        self.state = OPEN
+        self.changed_at = time.monotonic() if now is None else now
+        return True
@@ -1,3 +1,22 @@
+import re
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+
+from app.api.rates import RatesTable
+from app.history.models import RateSeries
+
+if TYPE_CHECKING:
+    # The notifications package renders its messages with this module
+    from app.notifications.models import Alert
+
+# "100 USD", "5 000 kzt в cny", "1,5 EUR -> USD", "100usd to eur?"
+CONVERSION_PATTERN = re.compile(
+    r"^(?P<amount>\d[\d ]*(?:[.,]\d+)?)\s*(?P<source>[a-z]{3})"
+    r"(?:\s*(?:in|to|в|во|->|→|=)?\s*(?P<target>[a-z]{3}))?\s*\??$",
+    re.IGNORECASE,
+)
+
+
 def get_unit_word(nominal: int) -> str:
     """Get the correct form of the word "единица" based on the nominal value."""
     last_digit = nominal % 10
@@ -26,3 +45,143 @@ def format_currency_message(currency_data: dict) -> str:
         f"→ за 1 {code}: {value / nominal:.4f} RUB\n"
         f"→ за 1 RUB: {nominal / value:.6f} {code}"
     )
+
+
+def format_stale_notice(date: Optional[str]) -> str:
+    """Format the notice appended to replies answered from rates that could not be refreshed."""
+    return f"\n\n⚠️ Курс ЦБ РФ на {date}: свежие данные сейчас недоступны."
+
+
+class ReplyCache:
+    """Rate replies rendered once per rates snapshot and keyed by (snapshot version, currency code)."""
+
+    def __init__(self) -> None:
+        self._replies: Dict[Tuple[int, str], str] = {}
+        self._version: Optional[int] = None
+
+    def render(self, version: int, table: RatesTable) -> None:
+        """Render the replies for every currency of a new snapshot, replacing the previous ones."""
+        if version == self._version:
+            return
+
+        self._replies = {(version, record.char_code): format_currency_message(record.as_dict()) for record in table}
+        self._version = version
+
+    def get(self, version: int, code: str) -> Optional[str]:
+        """The rendered reply for the currency in the given snapshot version."""
+        return self._replies.get((version, code))
+
+
+def parse_conversion_query(text: str) -> Optional[Tuple[float, str, str]]:
+    """Parse a free-form conversion request into (amount, source code, target code).
+
+    The target defaults to RUB when only an amount and a currency are given.
+    """
+    match = CONVERSION_PATTERN.match(text.strip())
+    if not match:
+        return None
+
+    amount = float(match["amount"].replace(" ", "").replace(",", "."))
+    target = match["target"] or "RUB"
+
+    return amount, match["source"].upper(), target.upper()
+
+
+def format_amount(amount: float) -> str:
+    """Format an amount with two decimals and spaces between thousands."""
+    return f"{amount:,.2f}".replace(",", " ")
+
+
+def format_conversion_message(amount: float, source: str, target: str, result: float, rate: float, date: str) -> str:
+    """Format the result of a currency conversion."""
+    return (
+        f"{format_amount(amount)} {source} = {format_amount(result)} {target}\n\n"
+        f"→ за 1 {source}: {rate:.4f} {target}\n"
+        f"→ за 1 {target}: {1 / rate:.6f} {source}\n\n"
+        f"По курсу ЦБ РФ на {date}"
+    )
+
+
+# "30d", "2w", "6m", "1y" and their Russian counterparts "30д", "2н", "6м", "1г"
+PERIOD_PATTERN = re.compile(r"^(?P<count>\d{1,4})\s*(?P<unit>[dwmyднмг])$", re.IGNORECASE)
+PERIOD_UNIT_DAYS = {"d": 1, "д": 1, "w": 7, "н": 7, "m": 30, "м": 30, "y": 365, "г": 365}
+
+
+def parse_period(text: str) -> Optional[int]:
+    """Parse a period such as "30d" or "1y" into a number of days."""
+    match = PERIOD_PATTERN.match(text.strip())
+    if not match:
+        return None
+
+    days = int(match["count"]) * PERIOD_UNIT_DAYS[match["unit"].lower()]
+    return days or None
+
+
+def parse_date(text: str) -> Optional[date]:
+    """Parse a date in the DD.MM.YYYY format."""
+    try:
+        return datetime.strptime(text.strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def format_history_message(series: RateSeries) -> str:
+    """Format the summary of a currency's rates over a period."""
+    min_date, min_value = series.minimum()
+    max_date, max_value = series.maximum()
+    sign = "+" if series.change >= 0 else ""
+
+    return (
+        f"📈 Курс {series.code} с {series.start_date:%d.%m.%Y} по {series.end_date:%d.%m.%Y}\n\n"
+        f"→ начало: {series.first:.4f} RUB\n"
+        f"→ конец: {series.last:.4f} RUB\n"
+        f"→ изменение: {sign}{series.change:.4f} RUB ({sign}{series.change_percent:.2f}%)\n"
+        f"→ минимум: {min_value:.4f} RUB ({min_date:%d.%m.%Y})\n"
+        f"→ максимум: {max_value:.4f} RUB ({max_date:%d.%m.%Y})\n"
+        f"→ среднее: {series.average:.4f} RUB\n\n"
+        f"Курсов за период: {len(series)}"
+    )
+
+
+def format_rate_on_date_message(code: str, requested: date, set_on: date, unit_rate: float) -> str:
+    """Format the rate of a currency in effect on a past date."""
+    message = f"Курс {code} на {requested:%d.%m.%Y}\n\n→ за 1 {code}: {unit_rate:.4f} RUB"
+
+    if set_on != requested:
+        message += f"\n\nКурс установлен на {set_on:%d.%m.%Y}"
+
+    return message
+
+
+def format_subscription_message(date: str, replies: Iterable[str]) -> str:
+    """Format the daily push with the rate replies of the subscribed currencies."""
+    return f"🔔 Курсы ЦБ РФ на {date}\n\n" + "\n\n".join(replies)
+
+
+# "USD > 100", "eur<95,5"
+ALERT_PATTERN = re.compile(r"^(?P<code>[A-Za-z]{3})\s*(?P<operator>[<>])\s*(?P<threshold>\d+(?:[.,]\d+)?)$")
+
+
+def parse_alert(text: str) -> Optional[Tuple[str, str, float]]:
+    """Parse an alert condition such as "USD > 100" into (code, operator, threshold)."""
+    match = ALERT_PATTERN.match(text.strip())
+    if not match:
+        return None
+
+    return match["code"].upper(), match["operator"], float(match["threshold"].replace(",", "."))
+
+
+def format_alert_list(alerts: Iterable["Alert"]) -> str:
+    """Format the active alerts of a chat with their IDs."""
+    lines = [f"#{alert.alert_id}: {alert.code} {alert.operator} {alert.threshold:.4f} RUB" for alert in alerts]
+    return "🔔 Ваши оповещения:\n\n" + "\n".join(lines)
+
+
+def format_alerts_message(alerts: Iterable["Alert"], table: RatesTable, date: Optional[str]) -> str:
+    """Format the notification about triggered alerts with the current rates."""
+    lines = [
+        f"→ {alert.code} {'выше' if alert.operator == '>' else 'ниже'} {alert.threshold:.4f} RUB: "
+        f"сейчас {table.unit_rate(alert.code) or 0:.4f} RUB"
+        for alert in alerts
+    ]
+    return "🔔 Сработали оповещения о курсе\n\n" + "\n".join(lines) + f"\n\nПо курсу ЦБ РФ на {date}"
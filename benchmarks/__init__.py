@@ -0,0 +1,10 @@
+"""Performance benchmarks for the bot.
+
+The benchmarks never talk to Telegram, so a placeholder token is enough to load the settings.
+"""
+
+import os
+
+os.environ.setdefault("TELEGRAM_TOKEN", "0:benchmark")
+# Per-request log lines would dominate the measured latencies
+os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,97 @@
+"""Runs every benchmark and saves the results as JSON.
+
+Run with `python -m benchmarks`; pass `--compare` with an earlier result file to see the change of every timing.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from benchmarks import bench_handlers, bench_parser, bench_stats
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Keys holding timings, where lower is better; throughput keys end with "_per_s"
+TIMING_SUFFIXES = ("_ms", "us_per_call")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        command = ["git", "rev-parse", "--short", "HEAD"]
+        return subprocess.run(command, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(quick: bool = False) -> Dict[str, Any]:
+    """Runs the benchmarks; `quick` shrinks them for a smoke run."""
+    scale = 10 if quick else 1
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+        },
+        "parser": bench_parser.run(repeat=5, number=200 // scale),
+        "stats": bench_stats.run(users=5000 // scale, events=50000 // scale, rounds=1000 // scale),
+        "handlers": bench_handlers.run(updates=2000 // scale),
+    }
+
+
+def _metrics(results: Dict[str, Any], prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Flattens the nested results into (dotted path, value) pairs of timings and throughputs."""
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _metrics(value, path)
+        elif isinstance(value, float) and (key.endswith(TIMING_SUFFIXES) or key.endswith("_per_s")):
+            yield path, value
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Prints every metric of both runs with its relative change; regressions are marked with "!"."""
+    before = dict(_metrics({key: value for key, value in baseline.items() if key != "meta"}))
+
+    print(f"{'metric':<72}{'baseline':>12}{'current':>12}{'change':>10}")
+    for path, value in _metrics({key: value for key, value in current.items() if key != "meta"}):
+        old = before.get(path)
+        if not old:
+            continue
+
+        change = (value - old) / old
+        worse = change < 0 if path.endswith("_per_s") else change > 0
+        marker = "!" if worse and abs(change) > 0.1 else ""
+        print(f"{path:<72}{old:>12.3f}{value:>12.3f}{change:>+9.1%}{marker}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a smoke run")
+    parser.add_argument("--output", type=Path, help="result file, by default under benchmarks/results")
+    parser.add_argument("--compare", type=Path, help="earlier result file to compare with")
+    args = parser.parse_args()
+
+    results = run_all(args.quick)
+
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{results['meta']['revision'] or 'unknown'}.json"
+
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Results saved to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
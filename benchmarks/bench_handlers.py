@@ -0,0 +1,102 @@
+"""Measures end-to-end handler latency against a fake Bot API and a fake CBR server.
+
+Updates go through the same application, handlers and update processor as in production; only the Bot API
+requests are answered in-process and the CBR documents come from a local HTTP server.
+
+Run with `python -m benchmarks.bench_handlers`.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List
+
+from telegram.ext import Application
+
+from benchmarks.fakes import text_update
+from benchmarks.harness import running_application
+from benchmarks.timing import latency_summary
+
+# Messages each user of a scenario sends in turn, all handled by `handle_message`
+SCENARIOS = {
+    "rate": ("USD",),
+    "conversion": ("100 USD в EUR",),
+    "custom_code": ("Ввести свой код", "AED"),
+    "unrecognized": ("привет",),
+}
+
+USERS_PER_SCENARIO = 100
+
+
+async def _run(updates: int, concurrency: int, bot_latency: float) -> Dict[str, Any]:
+    async with running_application(bot_latency) as harness:
+        results = await _measure(harness.application, updates, concurrency, bot_latency)
+        results["bot_api_calls"] = dict(harness.bot_api.calls)
+        results["cbr_requests"] = harness.cbr_server.requests
+        return results
+
+
+async def _measure(application: Application, updates: int, concurrency: int, bot_latency: float) -> Dict[str, Any]:
+    update_ids = itertools.count(1)
+    results: Dict[str, Any] = {"updates_per_scenario": updates, "bot_latency_ms": bot_latency * 1e3}
+
+    started = time.perf_counter()
+    await application.process_update(text_update(application.bot, next(update_ids), 1, "USD"))
+    results["cold_rate_ms"] = (time.perf_counter() - started) * 1e3
+
+    for offset, (name, texts) in enumerate(SCENARIOS.items()):
+        latencies: List[float] = []
+        for index in range(updates):
+            user_id = 10_000 * (offset + 1) + index % USERS_PER_SCENARIO
+            text = texts[index // USERS_PER_SCENARIO % len(texts)]
+            update = text_update(application.bot, next(update_ids), user_id, text)
+
+            started = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - started)
+
+        results[name] = latency_summary(latencies)
+
+    # Many users at once through the per-user update processor, as the running application dispatches them
+    processor = application.update_processor
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def dispatch(index: int) -> float:
+        update = text_update(application.bot, next(update_ids), 100_000 + index, "USD")
+        async with semaphore:
+            started = time.perf_counter()
+            await processor.process_update(update, application.process_update(update))
+            return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(dispatch(index) for index in range(updates)))
+    elapsed = time.perf_counter() - started
+
+    results["concurrent_rate"] = {
+        "concurrency": concurrency,
+        "updates_per_s": updates / elapsed,
+        **latency_summary(latencies),
+    }
+
+    return results
+
+
+def run(updates: int = 2000, concurrency: int = 64, bot_latency: float = 0.0) -> Dict[str, Any]:
+    """Runs the handler benchmark with a temporary statistics database."""
+    return asyncio.run(_run(updates, concurrency, bot_latency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--bot-latency", type=float, default=0.0, help="simulated Bot API round trip in seconds")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.updates, args.concurrency, args.bot_latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compares the tree and streaming parsers of the CBR XML documents.
+
+Run with `python -m benchmarks.bench_parser`.
+"""
+
+import argparse
+import timeit
+import tracemalloc
+from typing import Callable, Dict
+
+from benchmarks.fixtures import ENCODING, daily_document, dynamic_document
+from app.api.cbr import CBRClient
+from app.api.parser import iter_dynamic, parse_daily, parse_dynamic
+
+
+def measure(func: Callable[[], object], repeat: int, number: int) -> Dict[str, float]:
+    """Returns the best time per call in microseconds and the peak allocated memory in KiB."""
+    best = min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"us_per_call": best * 1e6, "peak_kib": peak / 1024}
+
+
+def run(repeat: int, number: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Runs all parser benchmarks."""
+    client = CBRClient()
+    daily = daily_document()
+    last_code = parse_daily(daily).records[-1].char_code
+    cases = {
+        "daily": (
+            lambda: client._parse_currency_data(daily.decode(ENCODING), last_code),
+            lambda: parse_daily(daily).get(last_code),
+        ),
+    }
+
+    for years in (1, 5, 20):
+        dynamic = dynamic_document(years=years)
+        cases[f"dynamic_{years}y"] = (
+            lambda data=dynamic: parse_dynamic(data),
+            lambda data=dynamic: list(iter_dynamic(data)),
+        )
+
+    results = {}
+    for name, (tree, stream) in cases.items():
+        scale = number if name == "daily" else max(1, number // 20)
+        results[name] = {
+            "tree": measure(tree, repeat, scale),
+            "stream": measure(stream, repeat, scale),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'document':<14}{'parser':<8}{'us/call':>12}{'peak KiB':>12}")
+    for name, modes in run(args.repeat, args.number).items():
+        for mode, result in modes.items():
+            print(f"{name:<14}{mode:<8}{result['us_per_call']:>12.1f}{result['peak_kib']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Measures the statistics service under concurrent writes and reads.
+
+Run with `python -m benchmarks.bench_stats`.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.timing import latency_summary
+from app.stats.service import StatsService
+
+WRITERS = 50
+
+
+async def _write_load(service: StatsService, user_ids: List[int], events: int, seed: int) -> List[float]:
+    """Records activity of random users from concurrent writers and returns the latency of every call."""
+    rng = random.Random(seed)
+    schedule = [rng.choice(user_ids) for _ in range(events)]
+    latencies: List[float] = []
+
+    async def writer(chunk: List[int]) -> None:
+        for user_id in chunk:
+            started = time.perf_counter()
+            await service.record_user_activity(user_id=user_id, username=None, first_name="User")
+            latencies.append(time.perf_counter() - started)
+            # Handlers yield to the loop between updates, so the writers interleave like real traffic
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(writer(schedule[index::WRITERS]) for index in range(WRITERS)))
+    return latencies
+
+
+async def _background_writes(service: StatsService, user_ids: List[int], rate: float, stop: asyncio.Event) -> int:
+    """Keeps recording activity at about `rate` events per second until stopped and returns the number of events."""
+    rng = random.Random(2)
+    events = 0
+
+    while not stop.is_set():
+        for _ in range(WRITERS):
+            await service.record_user_activity(user_id=rng.choice(user_ids), username=None, first_name="User")
+        events += WRITERS
+        await asyncio.sleep(WRITERS / rate)
+
+    return events
+
+
+async def _read_load(service: StatsService, rounds: int) -> Dict[str, List[float]]:
+    """Calls every getter the given number of times and returns their latencies."""
+    getters: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "get_total_users": service.get_total_users,
+        "get_daily_stats": service.get_daily_stats,
+        "get_recent_stats": lambda: service.get_recent_stats(days=7),
+        "get_recent_unique_users": lambda: service.get_recent_unique_users(days=30),
+    }
+    latencies: Dict[str, List[float]] = {name: [] for name in getters}
+
+    for _ in range(rounds):
+        for name, getter in getters.items():
+            started = time.perf_counter()
+            await getter()
+            latencies[name].append(time.perf_counter() - started)
+
+    return latencies
+
+
+async def _run(users: int, events: int, rounds: int, write_rate: float, db_path: Path) -> Dict[str, Any]:
+    service = StatsService(db_path)
+    await service.initialize()
+
+    user_ids = random.Random(0).sample(range(10**6, 10**10), users)
+
+    try:
+        started = time.perf_counter()
+        write_latencies = await _write_load(service, user_ids, events, seed=1)
+        await service.flush()
+        write_elapsed = time.perf_counter() - started
+
+        # Every getter flushes the buffer first, so readers compete with writers that never stop
+        stop = asyncio.Event()
+        writes = asyncio.ensure_future(_background_writes(service, user_ids, write_rate, stop))
+        read_latencies = await _read_load(service, rounds)
+        stop.set()
+        concurrent_events = await writes
+    finally:
+        await service.close()
+
+    return {
+        "users": users,
+        "events": events,
+        "writes": {
+            "events_per_s": events / write_elapsed,
+            "record_user_activity": latency_summary(write_latencies),
+        },
+        "reads_under_write_load": {
+            "write_rate": write_rate,
+            "concurrent_events": concurrent_events,
+            **{name: latency_summary(samples) for name, samples in read_latencies.items()},
+        },
+    }
+
+
+def run(users: int = 5000, events: int = 50000, rounds: int = 1000, write_rate: float = 5000.0) -> Dict[str, Any]:
+    """Runs the statistics benchmark on a temporary database."""
+    with tempfile.TemporaryDirectory() as directory:
+        return asyncio.run(_run(users, events, rounds, write_rate, Path(directory) / "bench_stats.db"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--write-rate", type=float, default=5000.0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.users, args.events, args.rounds, args.write_rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Local stand-ins for the Telegram Bot API and the CBR server."""
+
+import asyncio
+import itertools
+import json
+from typing import Any, Dict, Optional
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from benchmarks.fixtures import ENCODING, daily_document, dynamic_document
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Currency Bot", "username": "currency_bench_bot"}
+
+
+class FakeBotAPI(BaseRequest):
+    """Request backend answering Bot API calls in-process after an optional simulated round trip."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+        self, url: str, method: str, request_data: Optional[RequestData] = None, **kwargs: Any
+    ) -> tuple:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        parameters = request_data.parameters if request_data else {}
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result: Any = True
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            chat_id = parameters.get("chat_id")
+            result = {
+                "message_id": parameters.get("message_id") or next(self._message_ids),
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": parameters.get("text", ""),
+            }
+
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class FakeCBRServer:
+    """Minimal HTTP/1.1 server with keep-alive serving the daily and dynamic CBR documents."""
+
+    def __init__(self, daily: Optional[bytes] = None, dynamic: Optional[bytes] = None, latency: float = 0.0):
+        self.daily = daily if daily is not None else daily_document()
+        self.dynamic = dynamic if dynamic is not None else dynamic_document(years=1)
+        self.latency = latency
+        self.requests = 0
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def url(self, script: str) -> str:
+        """URL of a CBR script on this server."""
+        return f"http://127.0.0.1:{self.port}/scripts/{script}"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]  # type: ignore[attr-defined]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while request_line := await reader.readline():
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                body = self.dynamic if b"XML_dynamic" in request_line else self.daily
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    + f"Content-Type: application/xml; charset={ENCODING}\r\n".encode()
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def text_update(bot: Any, update_id: int, user_id: int, text: str) -> Update:
+    """A private text message from a user, as delivered by Telegram; commands get their entity."""
+    message: Dict[str, Any] = {
+        "message_id": update_id,
+        "date": 0,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+        "text": text,
+    }
+
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
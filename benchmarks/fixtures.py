@@ -0,0 +1,129 @@
+"""Generators of CBR documents for benchmarks."""
+
+import random
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+ENCODING = "windows-1251"
+
+# (ID, NumCode, CharCode, Nominal, Name, Value) of the currencies in a CBR daily document of spring 2025
+CBR_CURRENCIES: Tuple[Tuple[str, str, str, int, str, float], ...] = (
+    ("R01010", "036", "AUD", 1, "Австралийский доллар", 52.0163),
+    ("R01020A", "944", "AZN", 1, "Азербайджанский манат", 48.3476),
+    ("R01030", "012", "DZD", 100, "Алжирских динаров", 61.8203),
+    ("R01035", "826", "GBP", 1, "Фунт стерлингов Соединенного королевства", 108.9962),
+    ("R01060", "051", "AMD", 100, "Армянских драмов", 21.0112),
+    ("R01080", "048", "BHD", 1, "Бахрейнский динар", 218.6056),
+    ("R01090B", "933", "BYN", 1, "Белорусский рубль", 26.9521),
+    ("R01100", "975", "BGN", 1, "Болгарский лев", 47.9452),
+    ("R01115", "986", "BRL", 1, "Бразильский реал", 14.0331),
+    ("R01135", "348", "HUF", 100, "Форинтов", 23.0713),
+    ("R01150", "704", "VND", 10000, "Донгов", 31.6782),
+    ("R01200", "344", "HKD", 1, "Гонконгский доллар", 10.5924),
+    ("R01210", "981", "GEL", 1, "Лари", 29.9298),
+    ("R01215", "208", "DKK", 1, "Датская крона", 12.5592),
+    ("R01230", "784", "AED", 1, "Дирхам ОАЭ", 22.3798),
+    ("R01235", "840", "USD", 1, "Доллар США", 82.1910),
+    ("R01239", "978", "EUR", 1, "Евро", 93.5186),
+    ("R01240", "818", "EGP", 10, "Египетских фунтов", 16.1131),
+    ("R01270", "356", "INR", 100, "Индийских рупий", 96.2013),
+    ("R01280", "360", "IDR", 10000, "Рупий", 48.7601),
+    ("R01300", "364", "IRR", 100000, "Иранских риалов", 19.5693),
+    ("R01335", "398", "KZT", 100, "Тенге", 15.7793),
+    ("R01350", "124", "CAD", 1, "Канадский доллар", 59.3227),
+    ("R01355", "634", "QAR", 1, "Катарский риал", 22.5799),
+    ("R01370", "417", "KGS", 10, "Сомов", 93.9892),
+    ("R01375", "156", "CNY", 1, "Юань", 11.2210),
+    ("R01500", "498", "MDL", 10, "Молдавских леев", 47.6452),
+    ("R01530", "554", "NZD", 1, "Новозеландский доллар", 48.9341),
+    ("R01535", "578", "NOK", 10, "Норвежских крон", 78.7813),
+    ("R01565", "985", "PLN", 1, "Злотый", 21.8870),
+    ("R01585F", "946", "RON", 1, "Румынский лей", 18.7924),
+    ("R01589", "960", "XDR", 1, "СДР (специальные права заимствования)", 110.0521),
+    ("R01625", "702", "SGD", 1, "Сингапурский доллар", 62.6374),
+    ("R01670", "972", "TJS", 10, "Сомони", 76.1498),
+    ("R01675", "764", "THB", 10, "Батов", 24.6042),
+    ("R01700J", "949", "TRY", 10, "Турецких лир", 21.5312),
+    ("R01710A", "934", "TMT", 1, "Новый туркменский манат", 23.4831),
+    ("R01717", "860", "UZS", 10000, "Узбекских сумов", 63.6187),
+    ("R01720", "980", "UAH", 10, "Гривен", 19.8405),
+    ("R01760", "203", "CZK", 10, "Чешских крон", 37.2741),
+    ("R01770", "752", "SEK", 10, "Шведских крон", 84.6893),
+    ("R01775", "756", "CHF", 1, "Швейцарский франк", 100.5122),
+    ("R01805F", "941", "RSD", 100, "Сербских динаров", 79.8435),
+    ("R01810", "710", "ZAR", 10, "Рэндов", 43.4772),
+    ("R01815", "410", "KRW", 1000, "Вон", 57.7718),
+    ("R01820", "392", "JPY", 100, "Иен", 57.6993),
+)
+
+
+def _decimal(value: float, digits: int = 4) -> str:
+    """Formats a number the way the CBR does, with a comma separator."""
+    return f"{value:.{digits}f}".replace(".", ",")
+
+
+def daily_document(currencies: Optional[int] = None, rates_date: date = date(2025, 4, 20), seed: int = 0) -> bytes:
+    """Builds an `XML_daily.asp` document.
+
+    By default it lists the currencies actually published by the CBR, with rates randomly shifted around their real
+    values; more currencies than that are padded with synthetic ones.
+    """
+    rng = random.Random(seed)
+    count = len(CBR_CURRENCIES) if currencies is None else currencies
+    parts = [
+        f'<?xml version="1.0" encoding="{ENCODING}"?>',
+        f'<ValCurs Date="{rates_date:%d.%m.%Y}" name="Foreign Currency Market">',
+    ]
+
+    for index in range(count):
+        if index < len(CBR_CURRENCIES):
+            cbr_id, num_code, code, nominal, name, value = CBR_CURRENCIES[index]
+            value *= rng.uniform(0.97, 1.03)
+        else:
+            cbr_id, num_code = f"R{1000 + index:05d}", f"{100 + index:03d}"
+            code = chr(65 + index // 26 % 26) + chr(65 + index % 26) + "X"
+            nominal = rng.choice((1, 1, 1, 10, 100, 1000))
+            name = f"Тестовая валюта номер {index}"
+            value = rng.uniform(0.5, 150.0) * (nominal if nominal < 100 else nominal / 100)
+
+        parts.append(
+            f'<Valute ID="{cbr_id}">'
+            f"<NumCode>{num_code}</NumCode>"
+            f"<CharCode>{code}</CharCode>"
+            f"<Nominal>{nominal}</Nominal>"
+            f"<Name>{name}</Name>"
+            f"<Value>{_decimal(value)}</Value>"
+            f"<VunitRate>{_decimal(value / nominal, 6)}</VunitRate>"
+            "</Valute>"
+        )
+
+    parts.append("</ValCurs>")
+    return "".join(parts).encode(ENCODING)
+
+
+def dynamic_document(years: int = 10, end: date = date(2025, 4, 18), seed: int = 0) -> bytes:
+    """Builds an `XML_dynamic.asp` document with one record per business day."""
+    rng = random.Random(seed)
+    start = end - timedelta(days=365 * years)
+    value = 60.0
+    parts = [
+        f'<?xml version="1.0" encoding="{ENCODING}"?>',
+        f'<ValCurs ID="R01235" DateRange1="{start:%d.%m.%Y}" DateRange2="{end:%d.%m.%Y}" '
+        'name="Foreign Currency Market Dynamic">',
+    ]
+
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            value = max(1.0, value + rng.gauss(0, 0.5))
+            parts.append(
+                f'<Record Date="{day:%d.%m.%Y}" Id="R01235">'
+                "<Nominal>1</Nominal>"
+                f"<Value>{_decimal(value)}</Value>"
+                f"<VunitRate>{_decimal(value, 6)}</VunitRate>"
+                "</Record>"
+            )
+        day += timedelta(days=1)
+
+    parts.append("</ValCurs>")
+    return "".join(parts).encode(ENCODING)
@@ -0,0 +1,53 @@
+"""The production application wired to the fake Bot API and CBR server."""
+
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, NamedTuple
+
+from telegram.ext import Application
+
+from benchmarks.fakes import FakeBotAPI, FakeCBRServer
+from app.bot import handlers
+from app.bot.application import build_application
+
+
+class Harness(NamedTuple):
+    application: Application
+    bot_api: FakeBotAPI
+    cbr_server: FakeCBRServer
+
+
+@asynccontextmanager
+async def running_application(
+    bot_latency: float = 0.0, cbr_latency: float = 0.0, throttling: bool = False
+) -> AsyncIterator[Harness]:
+    """Builds the application like `app/__main__.py` and starts the services it needs against the fakes.
+
+    The statistics database lives in a temporary directory for the duration of the block. The flood protection is
+    off by default, since the benchmarks send far more updates than it lets through.
+    """
+    server = FakeCBRServer(latency=cbr_latency)
+    await server.start()
+
+    api = FakeBotAPI(latency=bot_latency)
+    application = build_application(request=api, throttling=throttling)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The services are configured the way post_init would start them, but against the fakes
+        handlers.cbr_client.api_url = server.url("XML_daily.asp")
+        handlers.stats_service.db_path = Path(directory) / "bench_stats.db"
+        handlers.cbr_client.snapshot_path = Path(directory) / "rates_snapshot.json"
+        if application.persistence is not None:
+            application.persistence.db_path = Path(directory) / "bench_stats.db"  # type: ignore[attr-defined]
+        await handlers.stats_service.initialize()
+        await handlers.cbr_client.start()
+        await application.initialize()
+
+        try:
+            yield Harness(application, api, server)
+        finally:
+            await application.shutdown()
+            await handlers.cbr_client.close()
+            await handlers.stats_service.close()
+            await server.close()
@@ -0,0 +1,215 @@
+"""Replays synthetic user traffic against the application to find its capacity.
+
+Updates arrive as a Poisson stream at the requested rate from a pool of simulated users and are dispatched through
+the per-user update processor, exactly as the running bot dispatches updates from Telegram. Latency is measured
+from the moment an update arrives, so it includes the time spent waiting for a free processing slot.
+
+Run with `python -m benchmarks.loadgen --users 5000 --rate 300 --duration 30`.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.ext import Application
+
+from benchmarks.fakes import text_update
+from benchmarks.harness import running_application
+from benchmarks.timing import latency_summary
+from app import metrics
+from app.bot import handlers
+from app.config import settings
+
+# Relative weights of the user actions
+DEFAULT_MIX = {"start": 1.0, "button": 6.0, "custom": 2.0, "stats": 0.2}
+
+# Codes typed after "Ввести свой код", one of them unknown to the CBR
+CUSTOM_CODES = ("AED", "GBP", "JPY", "TRY", "HKD", "QQQ")
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parses weights given as "start=1,button=6,custom=2,stats=0.2"."""
+    mix = {}
+    for part in text.split(","):
+        action, _, weight = part.partition("=")
+        action = action.strip()
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action {action!r}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[action] = float(weight)
+    return mix
+
+
+def action_messages(action: str, rng: random.Random) -> Tuple[str, ...]:
+    """Messages a user sends to perform the action."""
+    if action == "start":
+        return ("/start",)
+    if action == "button":
+        return (rng.choice(settings.base_currencies),)
+    if action == "custom":
+        return ("Ввести свой код", rng.choice(CUSTOM_CODES))
+    return ("/stats",)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a task sleeping for a fixed interval."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self.max_pending_writes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+            self.max_pending_writes = max(self.max_pending_writes, handlers.stats_service.pending_writes)
+
+
+def _histogram_totals(name: str) -> Dict[str, Tuple[int, float]]:
+    """Observation count and sum of every child of a histogram, keyed by the first label value."""
+    histogram = metrics.registry.get(name)
+    if histogram is None:
+        return {}
+    return {values[0]: (sum(child.counts), child.sum) for values, child in histogram.children().items()}
+
+
+def _counter_totals(name: str) -> Dict[str, float]:
+    counter = metrics.registry.get(name)
+    if counter is None:
+        return {}
+    return {values[0]: child.value for values, child in counter.children().items()}
+
+
+def _sqlite_contention(before: Dict[str, Tuple[int, float]], after: Dict[str, Tuple[int, float]]) -> Dict[str, Any]:
+    """Time spent in every statistics query and flush during the run."""
+    report = {}
+    for method, (count, total) in after.items():
+        previous_count, previous_total = before.get(method, (0, 0.0))
+        calls = count - previous_count
+        if calls:
+            spent = total - previous_total
+            report[method] = {"calls": calls, "mean_ms": spent / calls * 1e3, "total_ms": spent * 1e3}
+    return report
+
+
+async def generate(
+    application: Application,
+    users: int,
+    rate: float,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Replays the traffic and returns the measurements."""
+    rng = random.Random(seed)
+    actions = list(mix)
+    weights = [mix[action] for action in actions]
+    processor = application.update_processor
+    update_ids = itertools.count(1)
+
+    latencies: Dict[str, List[float]] = {action: [] for action in actions}
+    errors_before = _counter_totals("handler_errors_total")
+    queries_before = _histogram_totals("stats_query_duration_seconds")
+    monitor = LoopLagMonitor()
+    tasks: List[asyncio.Task] = []
+
+    async def perform(action: str, user_id: int, arrived: float) -> None:
+        for text in action_messages(action, rng):
+            update = text_update(application.bot, next(update_ids), user_id, text)
+            await processor.process_update(update, application.process_update(update))
+        latencies[action].append(time.perf_counter() - arrived)
+
+    monitor.start()
+    started = time.perf_counter()
+    next_arrival = started
+
+    while next_arrival - started < duration:
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        action = rng.choices(actions, weights)[0]
+        user_id = 1_000_000 + rng.randrange(users)
+        tasks.append(asyncio.create_task(perform(action, user_id, next_arrival)))
+        next_arrival += rng.expovariate(rate)
+
+    offered = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await monitor.stop()
+    await handlers.stats_service.flush()
+
+    completed = sum(len(samples) for samples in latencies.values())
+    errors_after = _counter_totals("handler_errors_total")
+
+    return {
+        "config": {"users": users, "rate": rate, "duration": duration, "mix": mix},
+        "actions": completed,
+        "updates": next(update_ids) - 1,
+        "offered_actions_per_s": len(tasks) / offered,
+        "throughput_actions_per_s": completed / elapsed,
+        "drain_s": elapsed - offered,
+        "latency": latency_summary([sample for samples in latencies.values() for sample in samples]),
+        "latency_by_action": {action: latency_summary(samples) for action, samples in latencies.items()},
+        "event_loop_lag": latency_summary(monitor.samples),
+        "sqlite": {
+            "max_pending_writes": monitor.max_pending_writes,
+            "queries": _sqlite_contention(queries_before, _histogram_totals("stats_query_duration_seconds")),
+        },
+        "handler_errors": {
+            name: count - errors_before.get(name, 0)
+            for name, count in errors_after.items()
+            if count > errors_before.get(name, 0)
+        },
+    }
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    async with running_application(args.bot_latency, args.cbr_latency, args.throttling) as harness:
+        results = await generate(harness.application, args.users, args.rate, args.duration, args.mix, args.seed)
+        results["bot_api_calls"] = dict(harness.bot_api.calls)
+        results["cbr_requests"] = harness.cbr_server.requests
+        if args.throttling:
+            stats = handlers.throttle.stats
+            results["throttle"] = {event: getattr(stats, event) for event in type(stats).__slots__}
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="number of simulated users")
+    parser.add_argument("--rate", type=float, default=200.0, help="user actions per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of generated traffic")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. start=1,button=6,custom=2,stats=0.2")
+    parser.add_argument("--bot-latency", type=float, default=0.02, help="simulated Bot API round trip in seconds")
+    parser.add_argument("--cbr-latency", type=float, default=0.1, help="simulated CBR response time in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--throttling", action="store_true", help="keep the flood protection of the bot enabled")
+    parser.add_argument("--output", type=Path, help="also save the report as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(_run(args))
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    print(report)
+
+    if args.output:
+        args.output.write_text(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Summaries of latency samples."""
+
+import statistics
+from typing import Dict, Sequence
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    """Mean and percentiles of latencies given in seconds, in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1e3
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1e3,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1e3,
+    }
@@ -3,6 +3,7 @@ import asyncio
 from unittest.mock import MagicMock
 from pathlib import Path
 import xml.etree.ElementTree as ET
+from telegram import Update
 
 
 @pytest.fixture
@@ -70,3 +71,25 @@ def mock_httpx_client(mock_httpx_response):
     client.__aenter__.return_value = client
     client.get.return_value = mock_httpx_response
     return client
+
+
+@pytest.fixture
+def make_update():
+    """Factory of text message updates from a private chat with the user."""
+
+    def make(update_id: int, user_id: int) -> Update:
+        return Update.de_json(
+            {
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": 0,
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                    "text": "USD",
+                },
+            },
+            None,
+        )
+
+    return make
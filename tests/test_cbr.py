@@ -0,0 +1,333 @@
+import asyncio
+import json
+from datetime import date, datetime
+
+import httpx
+import pytest
+
+from app.api.cbr import CBRClient, MSK, next_publication_time
+from app.api.parser import iter_dynamic, parse_daily, parse_daily_json, parse_dynamic
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+MIRROR_URL = "https://mirror.example/daily_json.js"
+
+DAILY_JSON = {
+    "Date": "2025-04-20T11:30:00+03:00",
+    "Valute": {
+        code: {"ID": cbr_id, "NumCode": num_code, "CharCode": code, "Nominal": nominal, "Name": name, "Value": value}
+        for cbr_id, num_code, code, nominal, name, value in (
+            ("R01235", "840", "USD", 1, "Доллар США", 92.5678),
+            ("R01239", "978", "EUR", 1, "Евро", 99.8765),
+            ("R01820", "392", "JPY", 100, "Японских иен", 61.1234),
+        )
+    },
+}
+
+
+def make_client(handler, **kwargs):
+    """Creates a client whose requests are answered by the given handler, retrying without delays."""
+    requests = []
+
+    def record(request):
+        requests.append(request)
+        return handler(request)
+
+    client = CBRClient(transport=httpx.MockTransport(record), retry_backoff=0, **kwargs)
+    return client, requests
+
+
+def test_parse_rates(cbr_xml_data):
+    table = CBRClient()._parse_rates(cbr_xml_data)
+
+    assert table.date == "20.04.2025"
+    assert table.codes == ("EUR", "JPY", "USD")
+    assert table.get("JPY").as_dict() == {"code": "JPY", "name": "Японских иен", "nominal": 100, "value": 61.1234}
+    assert table.get("392") is table.get("R01820") is table.get("JPY")
+    assert table.get("XXX") is None
+
+
+def test_rates_table_cross_rates(cbr_xml_data):
+    table = CBRClient()._parse_rates(cbr_xml_data)
+
+    assert table.cross_rate("USD", "RUB") == 92.5678
+    assert table.convert(100, "JPY", "RUB") == pytest.approx(61.1234)
+    assert table.convert(100, "USD", "EUR") == pytest.approx(100 * 92.5678 / 99.8765)
+    assert table.cross_rate("USD", "XXX") is None
+
+
+def test_next_publication_time_skips_weekend():
+    friday_evening = datetime(2025, 4, 18, 16, 0, tzinfo=MSK)
+    assert next_publication_time(friday_evening) == datetime(2025, 4, 21, 15, 30, tzinfo=MSK)
+
+    monday_morning = datetime(2025, 4, 21, 9, 0, tzinfo=MSK)
+    assert next_publication_time(monday_morning) == datetime(2025, 4, 21, 15, 30, tzinfo=MSK)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch(cbr_xml_data):
+    client, requests = make_client(lambda request: httpx.Response(200, text=cbr_xml_data))
+
+    results = await asyncio.gather(*(client.get_currency_rate("usd") for _ in range(50)))
+
+    assert len(requests) == 1
+    assert all(result["value"] == 92.5678 for result in results)
+    assert client.cache_stats.as_dict() == {
+        "hits": 0,
+        "misses": 50,
+        "stale": 0,
+        "refreshes": 1,
+        "not_modified": 0,
+        "errors": 0,
+    }
+
+    assert (await client.get_currency_rate("EUR"))["value"] == 99.8765
+    assert client.cache_stats.hits == 1
+    assert client.snapshot.version == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_counted():
+    client, requests = make_client(lambda request: httpx.Response(503), retries=2)
+
+    assert await client.get_currency_rate("USD") is None
+    assert len(requests) == 3
+    assert client.cache_stats.errors == 1
+    assert client.snapshot is None
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_refresh_revalidates_with_etag(cbr_xml_data):
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, text=cbr_xml_data, headers={"ETag": '"v1"'})
+
+    client, requests = make_client(handler)
+    notified = []
+    client.add_snapshot_listener(notified.append)
+
+    first = await client.refresh()
+    second = await client.refresh()
+
+    assert len(requests) == 2
+    assert second is first
+    assert second.version == 1
+    assert client.cache_stats.refreshes == 1
+    assert client.cache_stats.not_modified == 1
+    assert notified == [first]
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_saved_snapshot_is_loaded_without_fetching(cbr_xml_data, tmp_path):
+    path = tmp_path / "rates_snapshot.json"
+    client = CBRClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text=cbr_xml_data, headers={"ETag": '"v1"'})),
+        snapshot_path=path,
+    )
+    saved = await client.refresh()
+    await client.close()
+
+    restarted, requests = make_client(lambda request: httpx.Response(503))
+    restarted.snapshot_path = path
+    notified = []
+    restarted.add_snapshot_listener(notified.append)
+
+    loaded = await restarted.load_snapshot()
+
+    assert notified == [loaded]
+    assert loaded.is_fresh()
+    assert loaded.etag == '"v1"'
+    assert loaded.fetched_at == saved.fetched_at
+    assert loaded.table.records == saved.table.records
+    assert (await restarted.get_currency_rate("JPY"))["nominal"] == 100
+    assert requests == []
+    await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_snapshot_is_served_stale_while_revalidating(cbr_xml_data):
+    release = asyncio.Event()
+
+    async def slow_cbr(request):
+        await release.wait()
+        return httpx.Response(200, text=cbr_xml_data)
+
+    client = CBRClient(transport=httpx.MockTransport(slow_cbr), revalidate_wait=0.01)
+    release.set()
+    expired = await client.refresh()
+    expired.expires_at = 0
+    release.clear()
+
+    assert await client.get_snapshot() is expired
+    assert await client.get_snapshot() is expired
+    assert client.cache_stats.stale == 2
+
+    release.set()
+    refreshed = await client.get_snapshot()
+
+    assert refreshed.version == 2
+    assert refreshed.is_fresh()
+    assert client.cache_stats.refreshes == 2
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_revalidation_serves_stale_snapshot(cbr_xml_data):
+    responses = iter([httpx.Response(200, text=cbr_xml_data)])
+    client, _ = make_client(lambda request: next(responses, httpx.Response(503)))
+    expired = await client.refresh()
+    expired.expires_at = 0
+
+    assert await client.get_snapshot() is expired
+    assert client.cache_stats.stale == 1
+    assert client.cache_stats.errors == 1
+    await client.close()
+
+
+def test_corrupt_snapshot_file_is_ignored(tmp_path):
+    path = tmp_path / "rates_snapshot.json"
+    path.write_text('{"format": 1, "records": [')
+    client = CBRClient(snapshot_path=path)
+
+    assert asyncio.run(client.load_snapshot()) is None
+    assert client.snapshot is None
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(cbr_xml_data):
+    responses = iter([httpx.Response(503), httpx.ConnectError("reset")])
+
+    def handler(request):
+        response = next(responses, None)
+        if isinstance(response, Exception):
+            raise response
+        return response or httpx.Response(200, text=cbr_xml_data)
+
+    client, requests = make_client(handler, retries=2)
+
+    assert (await client.get_currency_rate("USD"))["value"] == 92.5678
+    assert len(requests) == 3
+    assert client.official.breaker.failures == 0
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_json_mirror_answers_when_the_cbr_fails():
+    def handler(request):
+        if request.url.host == "mirror.example":
+            return httpx.Response(200, json=DAILY_JSON)
+        return httpx.Response(500)
+
+    client, requests = make_client(handler, retries=0, mirrors=["json:" + MIRROR_URL])
+    snapshot = await client.refresh()
+
+    assert [request.url.host for request in requests] == ["www.cbr.ru", "mirror.example"]
+    assert snapshot.source == "mirror.example"
+    assert snapshot.date == "20.04.2025"
+    assert snapshot.table.get("JPY").unit_rate == pytest.approx(0.611234)
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_source_is_hedged_with_the_next_one(cbr_xml_data):
+    cbr_answered = asyncio.Event()
+
+    async def handler(request):
+        if request.url.host == "mirror.example":
+            return httpx.Response(200, json=DAILY_JSON)
+        await asyncio.sleep(5)
+        cbr_answered.set()
+        return httpx.Response(200, text=cbr_xml_data)
+
+    client = CBRClient(transport=httpx.MockTransport(handler), mirrors=["json:" + MIRROR_URL], hedge_delay=0.01)
+    snapshot = await asyncio.wait_for(client.refresh(), 1)
+
+    assert snapshot.source == "mirror.example"
+    # The request to the slow source is cancelled once the mirror has answered
+    assert not cbr_answered.is_set()
+    assert client.sources[1].latencies.samples
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_failing_source_is_skipped_by_its_circuit_breaker():
+    client, requests = make_client(lambda request: httpx.Response(503), retries=0)
+    client.official.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    for _ in range(5):
+        assert await client.refresh() is None
+
+    assert len(requests) == 2
+    assert client.cache_stats.errors == 5
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_history_requests_do_not_affect_the_daily_source(cbr_xml_data):
+    def handler(request):
+        if "date_req1" in request.url.params:
+            return httpx.Response(503)
+        return httpx.Response(200, text=cbr_xml_data)
+
+    client, _ = make_client(handler, retries=0)
+    client.archive.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    for _ in range(3):
+        assert await client.fetch_dynamic("R01235", date(2005, 1, 1), date(2025, 1, 1)) is None
+    assert await client.fetch_daily(date(2025, 4, 20)) is None
+
+    assert not client.archive.breaker.closed
+    assert client.official.breaker.failures == 0 and not client.official.latencies.samples
+    assert await client.refresh() is not None
+    await client.close()
+
+
+def test_circuit_breaker_lets_one_trial_through_after_the_timeout():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    assert breaker.record_failure(now=0) is False
+    assert breaker.record_failure(now=1) is True
+    assert not breaker.allow(now=5)
+
+    assert breaker.allow(now=11)
+    assert not breaker.allow(now=12)
+    assert breaker.record_failure(now=12) is True
+    assert not breaker.allow(now=20)
+
+    assert breaker.allow(now=22)
+    breaker.record_success()
+    assert breaker.closed and breaker.allow(now=22)
+
+
+def test_json_feed_matches_xml_document(cbr_xml_data):
+    table = parse_daily_json(json.dumps(DAILY_JSON).encode())
+
+    assert table.date == "20.04.2025"
+    assert table.records == CBRClient()._parse_rates(cbr_xml_data).records
+
+
+def test_streaming_parser_matches_tree_parser(cbr_xml_data):
+    data = cbr_xml_data.replace("utf-8", "windows-1251").encode("windows-1251")
+
+    streamed = parse_daily(data)
+    tree = CBRClient()._parse_rates(cbr_xml_data)
+
+    assert streamed.date == tree.date
+    assert streamed.records == tree.records
+
+
+def test_dynamic_parsers():
+    data = (
+        '<?xml version="1.0" encoding="windows-1251"?>'
+        '<ValCurs ID="R01235" DateRange1="17.04.2025" DateRange2="18.04.2025" name="Foreign Currency Market Dynamic">'
+        '<Record Date="17.04.2025" Id="R01235"><Nominal>1</Nominal><Value>82,2056</Value></Record>'
+        '<Record Date="18.04.2025" Id="R01235"><Nominal>1</Nominal><Value>81,9881</Value></Record>'
+        "</ValCurs>"
+    ).encode("windows-1251")
+
+    assert list(iter_dynamic(data)) == [(date(2025, 4, 17), 1, 82.2056), (date(2025, 4, 18), 1, 81.9881)]
+    assert parse_dynamic(data) == list(iter_dynamic(data))
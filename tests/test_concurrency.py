@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.bot.concurrency import PerUserUpdateProcessor
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_user_stay_ordered_while_users_run_in_parallel(make_update):
+    processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+    events = []
+
+    async def handle(name: str, delay: float) -> None:
+        events.append(f"start {name}")
+        await asyncio.sleep(delay)
+        events.append(f"end {name}")
+
+    await asyncio.gather(
+        processor.process_update(make_update(1, 100), handle("a1", 0.05)),
+        processor.process_update(make_update(2, 100), handle("a2", 0)),
+        processor.process_update(make_update(3, 200), handle("b1", 0)),
+    )
+
+    assert events.index("end a1") < events.index("start a2")
+    assert events.index("end b1") < events.index("end a1")
+    assert processor.active_users == 0
+
+
+@pytest.mark.asyncio
+async def test_burst_of_one_user_does_not_take_every_slot(make_update):
+    processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+    events = []
+
+    async def handle(name: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        events.append(f"end {name}")
+
+    burst = [processor.process_update(make_update(i, 100), handle(f"a{i}", 0.05)) for i in range(1, 11)]
+    await asyncio.gather(*burst, processor.process_update(make_update(11, 200), handle("b", 0)))
+
+    assert events[0] == "end b"
+    assert events[1:] == [f"end a{i}" for i in range(1, 11)]
+    assert processor.active_users == 0
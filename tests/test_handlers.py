@@ -0,0 +1,235 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+
+from app.api.cbr import RatesSnapshot
+from app.api.rates import CurrencyRate, RatesTable
+from app.bot import handlers
+from app.bot.all_rates import (
+    NOOP_CALLBACK,
+    SORT_CHANGE,
+    SORT_CODE,
+    SORT_VALUE,
+    AllRatesCache,
+    AllRatesPages,
+    page_callback,
+    parse_page_callback,
+)
+from app.bot.keyboards import create_currencies_keyboard, personal_currencies
+from app.bot.throttling import GLOBAL_LIMIT, THROTTLED_MESSAGE, USER_LIMIT, Throttle
+
+
+class FakeClient:
+    def __init__(self, snapshot, delay: float):
+        self.snapshot = None
+        self._result = snapshot
+        self._delay = delay
+
+    async def get_snapshot(self):
+        await asyncio.sleep(self._delay)
+        return self._result
+
+
+@pytest.mark.asyncio
+async def test_fast_snapshot_is_answered_without_progress_message(monkeypatch):
+    monkeypatch.setattr(handlers, "cbr_client", FakeClient("snapshot", delay=0))
+    message = MagicMock(reply_text=AsyncMock())
+
+    assert await handlers.get_snapshot_with_progress(message) == ("snapshot", None)
+
+    await handlers.send_reply(message, None, "rate")
+    message.reply_text.assert_awaited_once_with("rate", reply_markup=None)
+
+
+@pytest.mark.asyncio
+async def test_slow_snapshot_shows_progress_message_edited_in_place(monkeypatch):
+    monkeypatch.setattr(handlers, "cbr_client", FakeClient("snapshot", delay=0.1))
+    monkeypatch.setattr(handlers.settings, "progress_message_delay", 0.01)
+    progress = MagicMock(edit_text=AsyncMock())
+    message = MagicMock(reply_text=AsyncMock(return_value=progress))
+
+    assert await handlers.get_snapshot_with_progress(message) == ("snapshot", progress)
+
+    await handlers.send_reply(message, progress, "rate")
+    progress.edit_text.assert_awaited_once_with("rate")
+    message.reply_text.assert_awaited_once_with("⏳ Получаю данные...")
+
+
+def named_rates_snapshot():
+    table = RatesTable(
+        "20.04.2025",
+        [
+            CurrencyRate("R01010", "036", "AUD", 1, "Австралийский доллар", 58.1234),
+            CurrencyRate("R01350", "124", "CAD", 1, "Канадский доллар", 57.4321),
+            CurrencyRate("R01335", "398", "KZT", 100, "Казахстанских тенге", 17.8901),
+        ],
+    )
+    return RatesSnapshot(1, table, fetched_at=time.time(), expires_at=time.time() + 60)
+
+
+@pytest.mark.asyncio
+async def test_inline_query_formats_rates_missing_from_the_reply_cache(monkeypatch):
+    snapshot = named_rates_snapshot()
+    monkeypatch.setattr(handlers, "cbr_client", FakeClient(snapshot, delay=0))
+    # The shared cache holds the replies of another snapshot, so every lookup misses
+    reply_cache = handlers.ReplyCache()
+    reply_cache.render(2, snapshot.table)
+    monkeypatch.setattr(handlers, "reply_cache", reply_cache)
+    monkeypatch.setattr(reply_cache, "render", lambda version, table: None)
+    query = MagicMock(query="тенге", answer=AsyncMock())
+
+    await handlers.inline_query(MagicMock(inline_query=query), MagicMock())
+
+    results = query.answer.await_args.args[0]
+    assert [result.id for result in results] == ["1:KZT"]
+    assert "KZT" in results[0].input_message_content.message_text
+
+
+@pytest.mark.asyncio
+async def test_message_naming_a_currency_gets_its_rate_or_a_choice(monkeypatch):
+    monkeypatch.setattr(handlers, "cbr_client", FakeClient(named_rates_snapshot(), delay=0))
+    monkeypatch.setattr(handlers, "stats_service", MagicMock(record_user_activity=AsyncMock()))
+    get_currency_rate = AsyncMock()
+    monkeypatch.setattr(handlers, "get_currency_rate", get_currency_rate)
+
+    def message_update(text):
+        return MagicMock(message=MagicMock(text=text, reply_text=AsyncMock()), effective_user=MagicMock(id=1))
+
+    update = message_update("тенге")
+    await handlers.handle_message(update, MagicMock(user_data={}))
+    assert get_currency_rate.await_args.args[2] == "KZT"
+
+    # Both dollars match the name equally well, so the user is asked to pick one
+    update = message_update("доллар")
+    await handlers.handle_message(update, MagicMock(user_data={}))
+    choices = update.message.reply_text.await_args.args[0]
+    assert choices.startswith("Уточните валюту") and "AUD" in choices and "CAD" in choices
+
+
+@pytest.mark.asyncio
+async def test_oversized_history_period_is_rejected(monkeypatch):
+    service = MagicMock(get_series=AsyncMock())
+    monkeypatch.setattr(handlers, "history_service", service)
+    update = MagicMock(message=MagicMock(reply_text=AsyncMock()), effective_user=MagicMock(id=1))
+
+    await handlers.history_command(update, MagicMock(args=["USD", "9999y"]))
+
+    update.message.reply_text.assert_awaited_once_with(
+        f"❌ Максимальный период — {handlers.settings.history_max_days} дней."
+    )
+    service.get_series.assert_not_awaited()
+
+
+def test_throttle_limits_each_user_and_all_users_together():
+    throttle = Throttle(rate=1, burst=2, global_rate=2, idle_timeout=60)
+    now = time.monotonic()
+
+    assert throttle.check(1, now) is None
+    assert throttle.check(1, now) is None
+    assert throttle.check(1, now) == USER_LIMIT
+
+    # The global budget of two updates per second is spent, the token of the user is given back
+    assert throttle.check(2, now) == GLOBAL_LIMIT
+    assert throttle.check(2, now + 1) is None
+    assert throttle.check(1, now + 1) is None
+
+    assert (throttle.stats.allowed, throttle.stats.user_dropped, throttle.stats.global_dropped) == (4, 1, 1)
+
+    # Buckets idle for longer than the timeout are evicted on the next update
+    throttle.check(3, now + 100)
+    assert throttle.tracked_users == 1
+
+
+@pytest.mark.asyncio
+async def test_throttled_updates_stop_before_the_handlers():
+    throttle = Throttle(rate=0.001, burst=1, global_rate=100)
+    message = MagicMock(reply_text=AsyncMock())
+    update = MagicMock(spec=Update, inline_query=None, effective_user=MagicMock(id=1), effective_message=message)
+
+    await throttle.handle(update, None)
+
+    for _ in range(2):
+        with pytest.raises(ApplicationHandlerStop):
+            await throttle.handle(update, None)
+
+    # The user is told once per streak of dropped updates
+    message.reply_text.assert_awaited_once_with(THROTTLED_MESSAGE)
+
+
+def test_keyboards_follow_usage_and_are_shared_by_layout():
+    base = ["USD", "EUR", "CNY", "KZT"]
+
+    assert personal_currencies({}, base) == ("USD", "EUR", "CNY", "KZT")
+    # A single lookup of another currency does not earn it a button yet
+    assert personal_currencies({"AED": 1, "KZT": 3}, base) == ("KZT", "USD", "EUR", "CNY")
+    assert personal_currencies({"AED": 5, "KZT": 3}, base) == ("AED", "KZT", "USD", "EUR")
+
+    keyboard = create_currencies_keyboard(("AED", "KZT", "USD", "EUR"))
+    assert create_currencies_keyboard(["AED", "KZT", "USD", "EUR"]) is keyboard
+    assert [[button.text for button in row] for row in keyboard.keyboard] == [
+        ["AED", "KZT"],
+        ["USD", "EUR"],
+        ["Ввести свой код"],
+    ]
+
+
+def test_all_rates_pages_are_sorted_and_paginated():
+    table = RatesTable(
+        "20.04.2025",
+        [CurrencyRate(f"R{index}", f"{index:03}", f"C{index:02}", 1, "Валюта", float(index)) for index in range(1, 21)],
+    )
+    # Only the rate of C01 has doubled since the previous publication
+    previous = RatesTable("19.04.2025", [CurrencyRate("R1", "001", "C01", 1, "Валюта", 0.5)])
+    pages = AllRatesPages(1, table, previous)
+
+    text, keyboard = pages.page(SORT_CODE, 0)
+    assert "стр. 1/2" in text
+    assert text.index("C01") < text.index("C15") and "C16" not in text
+    assert keyboard.inline_keyboard[0][2].callback_data == page_callback(SORT_CODE, 1)
+
+    text, _ = pages.page(SORT_VALUE, 0)
+    assert text.index("C20") < text.index("C19")
+
+    text, _ = pages.page(SORT_CHANGE, 0)
+    assert "C01" in text and "+100.00%" in text
+
+    # Pages past the end show the last one
+    assert pages.page(SORT_CODE, 5) == pages.page(SORT_CODE, 1)
+    assert parse_page_callback(page_callback(SORT_VALUE, 1)) == (SORT_VALUE, 1)
+    assert parse_page_callback(NOOP_CALLBACK) is None
+
+
+@pytest.mark.asyncio
+async def test_all_rates_cache_shares_one_download_of_the_previous_rates():
+    table = RatesTable("20.04.2025", [CurrencyRate("R1", "001", "C01", 1, "Валюта", 1.0)])
+    previous = RatesTable("19.04.2025", [CurrencyRate("R1", "001", "C01", 1, "Валюта", 0.5)])
+    released = asyncio.Event()
+    results = [None, previous]
+
+    async def fetch_daily(day):
+        await released.wait()
+        return results.pop(0)
+
+    cache = AllRatesCache(MagicMock(fetch_daily=AsyncMock(side_effect=fetch_daily)))
+    snapshot = RatesSnapshot(1, table, fetched_at=0, expires_at=0)
+
+    waiting = asyncio.gather(*(cache.get(snapshot) for _ in range(5)))
+    await asyncio.sleep(0)
+    # A newer snapshot without a publication date does not wait for the download
+    newer = await cache.get(RatesSnapshot(2, RatesTable(None, table.records), fetched_at=0, expires_at=0))
+    assert newer.version == 2
+
+    released.set()
+    pages = await waiting
+    assert cache.cbr_client.fetch_daily.await_count == 1
+    assert all(page.version == 1 for page in pages)
+    assert "+100.00%" not in pages[0].page(SORT_CHANGE)[0]
+
+    # The failed download is retried, and the pages of the newer snapshot are kept meanwhile
+    pages = await cache.get(snapshot)
+    assert "+100.00%" in pages.page(SORT_CHANGE)[0]
+    assert await cache.get(RatesSnapshot(2, table, fetched_at=0, expires_at=0)) is newer
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.api.cbr import CBRClient
+from app.history.service import HistoryService
+from app.history.store import HistoryStore
+
+
+def dynamic_response(request):
+    start = datetime.strptime(request.url.params["date_req1"], "%d/%m/%Y").date()
+    end = datetime.strptime(request.url.params["date_req2"], "%d/%m/%Y").date()
+    records = []
+
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            value = f"{day.toordinal() % 100},5000"
+            records.append(
+                f'<Record Date="{day:%d.%m.%Y}" Id="R01235"><Nominal>1</Nominal><Value>{value}</Value></Record>'
+            )
+        day += timedelta(days=1)
+
+    body = f'<?xml version="1.0" encoding="windows-1251"?><ValCurs ID="R01235">{"".join(records)}</ValCurs>'
+    return httpx.Response(200, content=body.encode("windows-1251"))
+
+
+@pytest_asyncio.fixture
+async def history(tmp_path, cbr_xml_data):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if "date_req1" in request.url.params:
+            return dynamic_response(request)
+        return httpx.Response(200, text=cbr_xml_data)
+
+    client = CBRClient(transport=httpx.MockTransport(handler))
+    service = HistoryService(client, HistoryStore(tmp_path / "history.db"), chunk_days=30, concurrency=2)
+    await service.initialize()
+
+    yield service, requests
+
+    await service.close()
+    await client.close()
+
+
+def dynamic_requests(requests):
+    return [request for request in requests if "date_req1" in request.url.params]
+
+
+@pytest.mark.asyncio
+async def test_series_is_downloaded_once(history):
+    service, requests = history
+    end = date.today() - timedelta(days=1)
+    start = end - timedelta(days=89)
+
+    series = await service.get_series("USD", start, end)
+
+    assert len(dynamic_requests(requests)) == 3
+    assert len(series) == sum(1 for offset in range(90) if (start + timedelta(days=offset)).weekday() < 5)
+    assert series.values[-1] == series.days[-1] % 100 + 0.5
+    assert series.minimum()[1] <= series.average <= series.maximum()[1]
+
+    inner = await service.get_series("USD", start + timedelta(days=10), end - timedelta(days=10))
+    assert len(dynamic_requests(requests)) == 3
+    assert 0 < len(inner) < len(series)
+
+
+@pytest.mark.asyncio
+async def test_unknown_currency_has_no_series(history):
+    service, requests = history
+    assert await service.get_series("XXX", date.today() - timedelta(days=5), date.today()) is None
+    assert dynamic_requests(requests) == []
+
+
+@pytest.mark.asyncio
+async def test_store_reports_missing_ranges(tmp_path):
+    store = HistoryStore(tmp_path / "history.db")
+    await store.initialize()
+
+    await store.add([("USD", 15, 90.0)], [("USD", 10, 20), ("USD", 31, 40)])
+    await store.add([], [("USD", 21, 25)])
+
+    assert await store.missing_ranges("USD", 1, 50) == [(1, 9), (26, 30), (41, 50)]
+    assert await store.missing_ranges("USD", 12, 18) == []
+    assert await store.get_last_point("USD", 18) == (15, 90.0)
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_rate_on_date_is_stored_for_every_currency(history):
+    service, requests = history
+
+    assert await service.get_rate_on("usd", date(2025, 4, 21)) == (date(2025, 4, 20), 92.5678)
+    assert len(requests) == 1
+
+    # The daily document covered every currency up to the requested date
+    assert await service.get_rate_on("EUR", date(2025, 4, 21)) == (date(2025, 4, 20), 99.8765)
+    assert len(requests) == 1
+
+    # Currencies missing from the document are not covered and asked for again
+    assert await service.get_rate_on("XXX", date(2025, 4, 20)) is None
+    assert len(requests) == 2
+
+
+@pytest.mark.asyncio
+async def test_overlapping_backfills_merge_their_coverage(tmp_path):
+    store = HistoryStore(tmp_path / "history.db")
+    await store.initialize()
+
+    # Chunks of concurrent downloads finishing at the same time, overlapping and adjacent
+    ranges = [(start, start + 40) for start in range(1, 400, 30)]
+    await asyncio.gather(*(store.add([("USD", start, 90.0)], [("USD", start, end)]) for start, end in ranges))
+
+    assert await store.missing_ranges("USD", 1, 430) == []
+    assert await store._coverage("USD") == [(1, 431)]
+    await store.close()
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+from loguru import logger
+
+from app.bot.concurrency import PerUserUpdateProcessor
+from app.log import Sampler, _json_format, _keep
+
+
+@pytest.fixture
+def records():
+    lines = []
+    sink_id = logger.add(lines.append, level="DEBUG", format=_json_format, filter=_keep)
+    yield lines
+    logger.remove(sink_id)
+
+
+def test_sampling_drops_debug_and_info_of_configured_paths_only(records):
+    sampled = logger.patch(Sampler({f"{__name__}:test_sampling_drops_debug_and_info_of_configured_paths_only": 0}))
+
+    sampled.info("dropped")
+    sampled.warning("kept")
+    logger.info("kept as well")
+
+    assert [json.loads(line)["message"] for line in records] == ["kept", "kept as well"]
+
+
+@pytest.mark.asyncio
+async def test_records_of_an_update_carry_its_id_and_fields_as_json(records, make_update):
+    processor = PerUserUpdateProcessor(max_concurrent_updates=1)
+
+    async def handle() -> None:
+        logger.info("Курс {code} для {user_id}", code="USD", user_id=100)
+
+    await processor.process_update(make_update(42, 100), handle())
+    logger.info("outside")
+
+    inside, outside = (json.loads(line) for line in records)
+    assert inside["message"] == "Курс USD для 100"
+    assert inside["request_id"] == 42
+    assert (inside["code"], inside["user_id"], inside["level"]) == ("USD", 100, "INFO")
+    assert "request_id" not in outside
@@ -0,0 +1,82 @@
+import httpx
+import pytest
+
+from app.metrics import MetricsServer, Registry, timed
+from app.metrics.registry import Counter, Gauge, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("query_seconds", "Query time", ("query",), buckets=(0.1, 1.0)))
+
+    child = histogram.labels("users")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE query_seconds histogram" in lines
+    assert 'query_seconds_bucket{query="users",le="0.1"} 2' in lines
+    assert 'query_seconds_bucket{query="users",le="1"} 3' in lines
+    assert 'query_seconds_bucket{query="users",le="+Inf"} 4' in lines
+    assert 'query_seconds_count{query="users"} 4' in lines
+    assert 'query_seconds_sum{query="users"} 3.65' in lines
+
+
+def test_counters_and_function_gauges():
+    registry = Registry()
+    errors = registry.register(Counter("errors_total", "Errors", ("type",)))
+    pending = [3]
+    registry.register(Gauge("pending", "Pending writes", function=lambda: pending[0]))
+
+    errors.labels("timeout").inc()
+    errors.labels("timeout").inc()
+    errors.labels("http_503").inc()
+    pending[0] = 7
+
+    lines = registry.render().splitlines()
+
+    assert 'errors_total{type="http_503"} 1' in lines
+    assert 'errors_total{type="timeout"} 2' in lines
+    assert "pending 7" in lines
+
+    with pytest.raises(ValueError):
+        registry.register(Counter("errors_total", "Duplicate"))
+
+
+@pytest.mark.asyncio
+async def test_timed_coroutines_are_served_over_http():
+    registry = Registry()
+    handler_seconds = registry.register(Histogram("handler_seconds", "Handler time", ("handler",)))
+
+    @timed(handler_seconds)
+    async def start_command():
+        return "done"
+
+    assert await start_command() == "done"
+
+    server = MetricsServer(registry, "127.0.0.1", 0)
+    await server.start()
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{server.port}") as client:
+            response = await client.get("/metrics")
+            missing = await client.get("/")
+    finally:
+        await server.close()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'handler_seconds_count{handler="start_command"} 1' in response.text
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_busy_port_leaves_the_endpoint_disabled():
+    server = MetricsServer(Registry(), "127.0.0.1", 0)
+    await server.start()
+    try:
+        busy = MetricsServer(Registry(), "127.0.0.1", server.port)
+        await busy.start()
+        await busy.close()
+    finally:
+        await server.close()
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+import pytest_asyncio
+from telegram import Bot
+from telegram.request import BaseRequest
+
+from app.api.cbr import CBRClient, RatesSnapshot
+from app.api.rates import CurrencyRate, RatesTable
+from app.notifications.alerts import AlertIndex, AlertService
+from app.notifications.broadcaster import Broadcaster
+from app.notifications.models import ABOVE, BELOW, Alert
+from app.notifications.service import SubscriptionService
+from app.notifications.store import BroadcastProgress, SubscriptionStore
+from app.utils.rate_limit import TokenBucket
+
+
+class FakeBotAPI(BaseRequest):
+    """Bot API answering like Telegram: flood waits and blocked chats included."""
+
+    def __init__(self, blocked=(), flood=()):
+        self.blocked = set(blocked)
+        self.flood = set(flood)
+        self.sent = []
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        parameters = request_data.parameters if request_data else {}
+        chat_id = parameters.get("chat_id")
+
+        if chat_id in self.flood:
+            self.flood.discard(chat_id)
+            body = {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests",
+                "parameters": {"retry_after": 1},
+            }
+        elif chat_id in self.blocked:
+            body = {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+        else:
+            self.sent.append((chat_id, parameters["text"]))
+            message = {"message_id": len(self.sent), "date": 0, "chat": {"id": chat_id, "type": "private"}}
+            body = {"ok": True, "result": message}
+
+        return 200 if body["ok"] else body["error_code"], json.dumps(body).encode()
+
+
+@pytest_asyncio.fixture
+async def subscriptions(tmp_path, cbr_xml_data):
+    client = CBRClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=cbr_xml_data)))
+    service = SubscriptionService(client, SubscriptionStore(tmp_path / "stats.db"), page_size=2)
+    await service.initialize()
+
+    yield service
+
+    await service.close()
+    await client.close()
+
+
+def fake_bot(api):
+    return Bot("123:TEST", request=api, get_updates_request=api)
+
+
+def start(service, api):
+    service.start(Broadcaster(fake_bot(api), rate=1000, chat_rate=1000))
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=10, capacity=2, now=0.0)
+
+    assert bucket.try_acquire(now=0.0)
+    assert bucket.try_acquire(now=0.0)
+    assert not bucket.try_acquire(now=0.0)
+    assert bucket.delay(now=0.0) == pytest.approx(0.1)
+    assert bucket.try_acquire(now=0.1)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_retries_flood_waits_and_drops_blocked_chats(subscriptions):
+    service = subscriptions
+    await service.subscribe(1, ("USD",))
+    await service.subscribe(2, ("USD", "EUR"))
+    await service.subscribe(3, ("USD",))
+    await service.subscribe(4, ("USD",))
+
+    api = FakeBotAPI(blocked={3}, flood={4})
+    start(service, api)
+    progress = await service.broadcast()
+
+    assert progress.finished
+    assert progress.sent == 3
+    assert progress.failed == 1
+    assert sorted(chat_id for chat_id, _ in api.sent) == [1, 2, 4]
+
+    texts = dict(api.sent)
+    assert texts[1] == texts[4]
+    assert "Курс USD" in texts[2] and "Курс EUR" in texts[2]
+    assert await service.get_codes(3) == ()
+
+    # The snapshot has been delivered, so the next check does not send it again
+    await service.broadcast()
+    assert len(api.sent) == 3
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resumes_from_saved_cursor(subscriptions):
+    service = subscriptions
+    for chat_id in (1, 2, 3, 4):
+        await service.subscribe(chat_id, ("EUR",))
+
+    # A previous run delivered the first page and stopped
+    await service.store.save_progress(BroadcastProgress("20.04.2025", last_chat_id=2, sent=2))
+
+    api = FakeBotAPI()
+    start(service, api)
+    progress = await service.broadcast()
+
+    assert [chat_id for chat_id, _ in api.sent] == [3, 4]
+    assert progress.sent == 4
+
+
+@pytest.mark.asyncio
+async def test_broadcast_keeps_its_snapshot_when_a_new_one_arrives(subscriptions):
+    service = subscriptions
+    for chat_id, codes in enumerate((("USD",), ("EUR",), ("USD", "EUR"), ("USD",)), start=1):
+        await service.subscribe(chat_id, codes)
+
+    client = service.cbr_client
+    first = await client.get_snapshot()
+
+    class RefreshingBotAPI(FakeBotAPI):
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            response = await super().do_request(url, method, request_data, **kwargs)
+            # The rates are reloaded while the first page is being delivered
+            if len(self.sent) == 1:
+                await client.refresh()
+            return response
+
+    api = RefreshingBotAPI()
+    start(service, api)
+    progress = await service.broadcast()
+
+    assert client.snapshot.version > first.version
+    assert progress.sent == 4
+    texts = dict(api.sent)
+    assert texts[1] == texts[4]
+    assert "Курс EUR" in texts[2]
+    assert "Курс USD" in texts[3] and "Курс EUR" in texts[3]
+
+
+def test_alert_index_matches_brute_force():
+    rng = random.Random(7)
+    alerts = [
+        Alert(alert_id, alert_id % 50, rng.choice(("USD", "EUR")), rng.choice((ABOVE, BELOW)), rng.randint(80, 120))
+        for alert_id in range(1, 2001)
+    ]
+
+    index = AlertIndex()
+    for alert in alerts:
+        index.add(alert)
+    for alert in alerts[::3]:
+        index.remove(alert)
+
+    remaining = [alert for position, alert in enumerate(alerts) if position % 3]
+    for rate in (79.5, 95.0, 100.0, 100.5, 121.0):
+        usd = {alert.alert_id for alert in remaining if alert.code == "USD"}
+        expected = {alert.alert_id for alert in remaining if alert.code == "USD" and alert.is_triggered(rate)}
+        assert set(index.triggered("USD", rate)) == expected
+        assert set(index.cleared("USD", rate)) == usd - expected
+
+
+@pytest.mark.asyncio
+async def test_alerts_fire_once_with_one_message_per_chat(tmp_path, cbr_xml_data):
+    client = CBRClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=cbr_xml_data)))
+    store = SubscriptionStore(tmp_path / "stats.db")
+    service = AlertService(client, store)
+    await service.initialize()
+
+    api = FakeBotAPI()
+    start(service, api)
+
+    # USD is 92.5678 and EUR 99.8765 in the fixture, the alerts are created at rates that do not satisfy them
+    await service.add_alert(1, "USD", ABOVE, 90, unit_rate=89.0)
+    await service.add_alert(1, "EUR", BELOW, 100, unit_rate=101.0)
+    await service.add_alert(2, "USD", ABOVE, 95, unit_rate=89.0)
+    await service.add_alert(3, "USD", BELOW, 92.6, unit_rate=93.0)
+
+    await client.get_snapshot()
+    await asyncio.gather(*service._tasks)
+
+    assert sorted(chat_id for chat_id, _ in api.sent) == [1, 3]
+    assert "USD выше" in dict(api.sent)[1] and "EUR ниже" in dict(api.sent)[1]
+    assert [alert.code for alert in service.get_alerts(2)] == ["USD"]
+
+    await service.close()
+
+    # Fired alerts are gone from the store as well
+    reloaded = AlertService(client, SubscriptionStore(tmp_path / "stats.db"))
+    await reloaded.initialize()
+    assert [alert.chat_id for alert in reloaded._alerts.values()] == [2]
+
+    await reloaded.close()
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_alert_satisfied_at_creation_fires_only_after_a_crossing(tmp_path):
+    client = CBRClient()
+    service = AlertService(client, SubscriptionStore(tmp_path / "stats.db"))
+    await service.initialize()
+
+    def snapshot(version: int, usd: float) -> RatesSnapshot:
+        table = RatesTable("20.04.2025", [CurrencyRate("R01235", "840", "USD", 1, "Доллар США", usd)])
+        return RatesSnapshot(version, table, 0, 0)
+
+    alert = await service.add_alert(1, "USD", ABOVE, 90, unit_rate=92.0)
+    assert not alert.armed
+
+    # Still above the threshold: no crossing yet
+    assert await service.check(snapshot(1, 93.0)) == []
+    # Back below it, which arms the alert without firing it
+    assert await service.check(snapshot(2, 89.0)) == []
+    assert [alert.armed for alert in await service.store.get_alerts()] == [True]
+
+    assert [alert.alert_id for alert in await service.check(snapshot(3, 91.0))] == [alert.alert_id]
+    assert service.get_alerts(1) == []
+
+    await service.close()
+    await client.close()
@@ -0,0 +1,84 @@
+import time
+
+import aiosqlite
+import pytest
+from telegram.ext import Application
+
+from app.bot.persistence import SQLitePersistence
+
+
+async def stored_rows(db_path):
+    async with aiosqlite.connect(db_path) as conn:
+        async with conn.execute("SELECT user_id, data FROM user_data ORDER BY user_id") as cursor:
+            return await cursor.fetchall()
+
+
+@pytest.mark.asyncio
+async def test_user_data_is_loaded_lazily_and_written_in_batches(tmp_path):
+    db_path = tmp_path / "stats.db"
+    persistence = SQLitePersistence(db_path, update_interval=60)
+
+    assert await persistence.get_user_data() == {}
+
+    first, second = {}, {}
+    await persistence.refresh_user_data(1, first)
+    await persistence.refresh_user_data(2, second)
+    first["waiting_for_custom_code"] = True
+    second["lang"] = "ru"
+
+    await persistence.update_user_data(1, first)
+    await persistence.update_user_data(2, second)
+    await persistence.flush()
+
+    assert await stored_rows(db_path) == [(1, '{"waiting_for_custom_code":true}'), (2, '{"lang":"ru"}')]
+
+    restarted = SQLitePersistence(db_path, update_interval=60)
+    assert await restarted.get_user_data() == {}
+
+    loaded = {}
+    await restarted.refresh_user_data(1, loaded)
+    assert loaded == {"waiting_for_custom_code": True}
+
+    # Unchanged data is not written again, cleared data deletes the row
+    await restarted.update_user_data(1, loaded)
+    assert restarted.users.pending == {}
+
+    loaded.clear()
+    await restarted.update_user_data(1, loaded)
+    await restarted.flush()
+
+    assert await stored_rows(db_path) == [(2, '{"lang":"ru"}')]
+
+
+@pytest.mark.asyncio
+async def test_idle_users_are_evicted_from_memory_and_reloaded(tmp_path):
+    persistence = SQLitePersistence(tmp_path / "stats.db", update_interval=10, idle_timeout=100)
+    application = Application.builder().token("123:TEST").persistence(persistence).build()
+
+    for user_id in (1, 2):
+        data = application.user_data[user_id]
+        await persistence.refresh_user_data(user_id, data)
+        data["code"] = f"USD{user_id}"
+        await persistence.update_user_data(user_id, data)
+    await persistence.flush()
+
+    assert persistence.evict_idle(application, now=time.monotonic() + 50) == 0
+    assert persistence.evict_idle(application, now=time.monotonic() + 150) == 2
+    assert 1 not in application.user_data
+
+    reloaded = application.user_data[1]
+    await persistence.refresh_user_data(1, reloaded)
+    assert reloaded == {"code": "USD1"}
+    await persistence.flush()
+
+
+@pytest.mark.asyncio
+async def test_conversations_round_trip(tmp_path):
+    persistence = SQLitePersistence(tmp_path / "stats.db")
+
+    await persistence.update_conversation("custom_code", (10, 20), 1)
+    await persistence.update_conversation("custom_code", (10, 30), 2)
+    await persistence.update_conversation("custom_code", (10, 30), None)
+
+    assert await persistence.get_conversations("custom_code") == {(10, 20): 1}
+    await persistence.flush()
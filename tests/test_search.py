@@ -0,0 +1,53 @@
+from app.api.rates import CurrencyRate, RatesTable
+from app.api.search import CurrencyIndex
+
+NAMES = {
+    "AUD": ("036", "Австралийский доллар"),
+    "CAD": ("124", "Канадский доллар"),
+    "CNY": ("156", "Китайский юань"),
+    "DKK": ("208", "Датская крона"),
+    "KZT": ("398", "Тенге"),
+    "SEK": ("752", "Шведская крона"),
+    "USD": ("840", "Доллар США"),
+}
+
+
+def make_index() -> CurrencyIndex:
+    table = RatesTable(
+        "20.04.2025",
+        [CurrencyRate(f"R{num_code}", num_code, code, 1, name, 10.0) for code, (num_code, name) in NAMES.items()],
+    )
+    index = CurrencyIndex()
+    index.rebuild(1, table)
+    return index
+
+
+def codes(records):
+    return [record.char_code for record in records]
+
+
+def test_currencies_are_resolved_by_code_and_name():
+    index = make_index()
+
+    assert codes(index.resolve("usd")) == ["USD"]
+    assert codes(index.resolve("840")) == ["USD"]
+    assert codes(index.resolve("Доллар")) == ["USD"]
+    assert codes(index.resolve("юан")) == ["CNY"]
+    assert codes(index.resolve("тенге")) == ["KZT"]
+    assert codes(index.resolve("канадский доллар")) == ["CAD"]
+
+    # Inflected and misspelled names fall back to the trigrams
+    assert codes(index.resolve("долларов")) == ["USD"]
+    assert codes(index.resolve("юаня")) == ["CNY"]
+    assert codes(index.resolve("долар")) == ["USD"]
+
+    assert codes(index.resolve("крона")) == ["DKK", "SEK"]
+    assert index.resolve("привет") == []
+
+
+def test_search_ranks_prefix_matches_and_limits_results():
+    index = make_index()
+
+    assert codes(index.search("дол")) == ["USD", "AUD", "CAD"]
+    assert codes(index.search("дол", limit=2)) == ["USD", "AUD"]
+    assert index.search("") == []
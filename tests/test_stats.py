@@ -0,0 +1,168 @@
+from datetime import date, timedelta
+
+import aiosqlite
+import pytest
+
+from app.stats.service import StatsService
+from app.stats.user_sets import decode_user_ids, encode_user_ids
+
+
+@pytest.fixture
+def stats_db(tmp_path):
+    return tmp_path / "stats.db"
+
+
+@pytest.mark.asyncio
+async def test_activity_is_written_behind(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    for _ in range(3):
+        await service.record_user_activity(1, "alice", "Alice")
+    await service.record_user_activity(2, None, "Bob")
+
+    assert service.pending_writes == 2
+
+    today = await service.get_daily_stats()
+    assert service.pending_writes == 0
+    assert (today.active_users, today.total_requests, today.new_users) == (2, 4, 2)
+    assert await service.get_total_users() == 2
+
+    await service.record_user_activity(1, "alice_new", "Alice")
+    await service.close()
+
+    async with aiosqlite.connect(stats_db) as conn:
+        cursor = await conn.execute("SELECT username, total_requests FROM users WHERE user_id = 1")
+        assert await cursor.fetchone() == ("alice_new", 4)
+
+
+@pytest.mark.asyncio
+async def test_returning_user_counts_as_active_once(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    async with aiosqlite.connect(stats_db) as conn:
+        await conn.execute(
+            "INSERT INTO users (user_id, last_activity, total_requests) VALUES (1, ?, 5)",
+            (yesterday,),
+        )
+        await conn.commit()
+
+    await service.record_user_activity(1)
+    await service.flush()
+    await service.record_user_activity(1)
+
+    today = await service.get_daily_stats()
+    assert (today.active_users, today.total_requests, today.new_users) == (1, 2, 0)
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_threshold_triggers_flush(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600, flush_threshold=10)
+    await service.initialize()
+
+    for user_id in range(10):
+        await service.record_user_activity(user_id)
+
+    assert service._flush_task is not None
+    await service._flush_task
+    assert service.pending_writes == 0
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_database_uses_wal_journal(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    async with aiosqlite.connect(stats_db) as conn:
+        cursor = await conn.execute("PRAGMA journal_mode")
+        assert (await cursor.fetchone())[0] == "wal"
+
+    await service.close()
+
+    with pytest.raises(RuntimeError):
+        await service.get_total_users()
+
+
+def test_user_ids_round_trip():
+    user_ids = {7, 123456789, 5000000000, 42}
+    assert decode_user_ids(encode_user_ids(user_ids)) == user_ids
+    assert decode_user_ids(encode_user_ids([])) == set()
+
+
+@pytest.mark.asyncio
+async def test_unique_users_are_distinct_across_days(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    yesterday = (date.today() - timedelta(days=1)).isoformat()
+    async with aiosqlite.connect(stats_db) as conn:
+        await conn.execute(
+            "INSERT INTO daily_active_users (date, segment, user_ids) VALUES (?, 0, ?), (?, 1, ?)",
+            (yesterday, encode_user_ids([1, 2]), yesterday, encode_user_ids([3])),
+        )
+        await conn.commit()
+
+    await service.record_user_activity(1)
+    await service.record_user_activity(4)
+    await service.flush()
+    await service.record_user_activity(1)
+    await service.record_user_activity(5)
+
+    assert await service.get_recent_unique_users(days=7) == 5
+    assert await service.get_unique_users(date.today(), date.today()) == 3
+    await service.close()
+
+    async with aiosqlite.connect(stats_db) as conn:
+        cursor = await conn.execute("SELECT date, COUNT(*) FROM daily_active_users GROUP BY date ORDER BY date")
+        assert await cursor.fetchall() == [(yesterday, 1), (date.today().isoformat(), 2)]
+
+    reopened = StatsService(db_path=stats_db, flush_interval=3600)
+    await reopened.initialize()
+    assert await reopened.get_recent_unique_users(days=30) == 5
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_currency_usage_combines_stored_and_buffered_lookups(stats_db):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    service.record_currency_use(1, "USD")
+    service.record_currency_use(1, "AED")
+    await service.flush()
+    service.record_currency_use(1, "AED")
+    service.record_currency_use(2, "EUR")
+
+    assert await service.get_currency_usage(1) == {"USD": 1, "AED": 2}
+    await service.close()
+
+    async with aiosqlite.connect(stats_db) as conn:
+        cursor = await conn.execute("SELECT user_id, code, uses FROM currency_usage ORDER BY user_id, code")
+        assert await cursor.fetchall() == [(1, "AED", 2), (1, "USD", 1), (2, "EUR", 1)]
+
+
+@pytest.mark.asyncio
+async def test_failed_compaction_does_not_write_the_batch_twice(stats_db, monkeypatch):
+    service = StatsService(db_path=stats_db, flush_interval=3600)
+    await service.initialize()
+
+    async def fail(conn, before):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(service, "_compact_active_sets", fail)
+    await service.record_user_activity(1)
+    service.record_currency_use(1, "USD")
+    await service.flush()
+
+    assert service.pending_writes == 0
+    await service.record_user_activity(1)
+    monkeypatch.undo()
+
+    today = await service.get_daily_stats()
+    assert (today.active_users, today.total_requests) == (1, 2)
+    assert await service.get_currency_usage(1) == {"USD": 1}
+    await service.close()
@@ -1,4 +1,11 @@
-from app.utils.text_utils import get_unit_word, format_currency_message
+from app.api.rates import CurrencyRate, RatesTable
+from app.utils.text_utils import (
+    ReplyCache,
+    format_conversion_message,
+    format_currency_message,
+    get_unit_word,
+    parse_conversion_query,
+)
 
 
 def test_get_unit_word():
@@ -28,3 +35,36 @@ def test_format_currency_message():
     assert "1 единицу: 92.5678 RUB" in message
     assert "1 USD: 92.5678 RUB" in message
     assert "1 RUB: 0.010803" in message
+
+
+def test_parse_conversion_query():
+    assert parse_conversion_query("100 USD в EUR") == (100.0, "USD", "EUR")
+    assert parse_conversion_query("5 000 kzt to cny") == (5000.0, "KZT", "CNY")
+    assert parse_conversion_query("1,5 eur") == (1.5, "EUR", "RUB")
+    assert parse_conversion_query("USD") is None
+    assert parse_conversion_query("100 долларов") is None
+
+
+def test_format_conversion_message():
+    message = format_conversion_message(100000, "USD", "EUR", 92678.1234, 0.926781, "20.04.2025")
+
+    assert "100 000.00 USD = 92 678.12 EUR" in message
+    assert "1 USD: 0.9268 EUR" in message
+    assert "20.04.2025" in message
+
+
+def test_reply_cache_renders_every_currency_once():
+    table = RatesTable(
+        "20.04.2025",
+        [
+            CurrencyRate("R01235", "840", "USD", 1, "Доллар США", 92.5678),
+            CurrencyRate("R01820", "392", "JPY", 100, "Японских иен", 61.1234),
+        ],
+    )
+    cache = ReplyCache()
+    cache.render(1, table)
+
+    assert cache.get(1, "USD") == format_currency_message(table.get("USD").as_dict())
+    assert "за 100 единиц: 61.1234 RUB" in cache.get(1, "JPY")
+    assert cache.get(2, "USD") is None
+    assert cache.get(1, "EUR") is None